@@ -0,0 +1,227 @@
+"""Admission control: per-endpoint concurrency caps with bounded wait queues.
+
+Every API POST (and every GET in ``GET_ROUTES``) belongs to an endpoint
+class (``ROUTE_CLASSES``).  A class
+serves at most *concurrency* requests at once and queues at most *queue*
+more; all classes together are capped by ``ADMISSION_GLOBAL_LIMIT``.  Freed
+slots go to waiting requests of the highest-priority class first, so cheap
+text calls are not stuck behind image generation.
+
+A request is shed at once (``Overloaded`` -> 503 with ``Retry-After``) when
+its class queue is full, or when the expected wait plus the class's typical
+service time does not fit its deadline (see deadline.py); otherwise it waits
+at most ``ADMISSION_MAX_WAIT``.  Queued requests have not read their body
+yet, so a backlog of vision uploads does not sit in memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from .config import ADMISSION_ENABLED, ADMISSION_GLOBAL_LIMIT, ADMISSION_MAX_WAIT, ADMISSION_POLICY
+from .deadline import remaining
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_SHED, ADMISSION_WAIT
+
+logger = logging.getLogger("kitchen-ai")
+
+# Higher wins when a slot frees up.
+PRIORITIES: dict[str, int] = {"text": 3, "bundle": 2, "vision": 1, "image": 0}
+# Path prefix -> class (longest prefix wins); everything else is "text".
+ROUTE_CLASSES: dict[str, str] = {
+    "/api/vision": "vision",
+    "/api/image": "image",
+    "/api/image/jobs": "text",  # only enqueues; the job workers do the generation
+    "/api/bundle": "bundle",
+}
+DEFAULT_CLASS = "text"
+# GET variants that do upstream work (routes.py, "Cacheable GET variants").
+GET_ROUTES = frozenset({"/api/recipe-detail", "/api/drinks", "/api/meal-plan", "/api/image"})
+_BODYLESS_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "DELETE"})
+
+
+class Overloaded(Exception):
+    """The request was shed instead of queued."""
+
+    def __init__(self, name: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{name} shed ({reason}), retry after {retry_after:.1f}s")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_policy(spec: str) -> dict[str, tuple[int, int]]:
+    """``"text=32/64,image=6/12"`` -> ``{"text": (32, 64), "image": (6, 12)}``."""
+    policy: dict[str, tuple[int, int]] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, limits = item.partition("=")
+        concurrency, _, queue = limits.partition("/")
+        name = name.strip()
+        if name not in PRIORITIES:
+            raise ValueError(f"unknown admission class {name!r} (expected one of {', '.join(PRIORITIES)})")
+        policy[name] = (max(1, int(concurrency)), max(0, int(queue or 0)))
+    return policy
+
+
+class _Class:
+    ALPHA = 0.2
+
+    def __init__(self, name: str, concurrency: int, queue: int) -> None:
+        self.name = name
+        self.priority = PRIORITIES[name]
+        self.concurrency = concurrency
+        self.queue_limit = queue
+        self.active = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        self.service_time = 0.0  # EWMA of admitted request durations
+        self.admitted = 0
+        self.shed = 0
+
+    def observe(self, elapsed: float) -> None:
+        if self.service_time == 0.0:
+            self.service_time = elapsed
+        else:
+            self.service_time += self.ALPHA * (elapsed - self.service_time)
+
+    def expected_wait(self) -> float:
+        """Rough time until a request joining the queue now is admitted."""
+        return (len(self.waiters) + 1) * self.service_time / self.concurrency
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "concurrency": self.concurrency,
+            "queueLimit": self.queue_limit,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "serviceTime": round(self.service_time, 3),
+        }
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        policy: dict[str, tuple[int, int]],
+        *,
+        global_limit: int,
+        max_wait: float,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.global_limit = max(1, global_limit)
+        self.max_wait = max_wait
+        self.active = 0
+        self._classes = {name: _Class(name, *limits) for name, limits in policy.items()}
+        self._by_priority = sorted(self._classes.values(), key=lambda c: c.priority, reverse=True)
+
+    def class_for(self, method: str, path: str) -> str | None:
+        """The admission class of a request, or None when it is not admission-controlled."""
+        if method in _BODYLESS_METHODS and path not in GET_ROUTES:
+            return None
+        name = DEFAULT_CLASS
+        matched = 0
+        for prefix, cls in ROUTE_CLASSES.items():
+            if len(prefix) > matched and (path == prefix or path.startswith(prefix + "/")):
+                name, matched = cls, len(prefix)
+        return name if self.enabled and name in self._classes else None
+
+    def _has_room(self, cls: _Class) -> bool:
+        return cls.active < cls.concurrency and self.active < self.global_limit
+
+    def _admit(self, cls: _Class) -> None:
+        cls.active += 1
+        cls.admitted += 1
+        self.active += 1
+        ADMISSION_IN_FLIGHT.labels(cls.name).inc()
+
+    def _shed(self, cls: _Class, reason: str, retry_after: float) -> Overloaded:
+        cls.shed += 1
+        ADMISSION_SHED.labels(cls.name, reason).inc()
+        logger.warning(
+            "[admission] shed %s (%s): active=%d queued=%d", cls.name, reason, cls.active, len(cls.waiters)
+        )
+        return Overloaded(cls.name, reason, max(1.0, retry_after))
+
+    async def acquire(self, name: str) -> None:
+        """Wait for a slot in class *name*, or raise ``Overloaded``."""
+        cls = self._classes[name]
+        if not cls.waiters and self._has_room(cls):
+            self._admit(cls)
+            ADMISSION_WAIT.labels(name).observe(0.0)
+            return
+
+        expected = cls.expected_wait()
+        if len(cls.waiters) >= cls.queue_limit:
+            raise self._shed(cls, "queue_full", expected)
+        timeout = self.max_wait
+        left = remaining()
+        if left is not None:
+            timeout = min(timeout, left - cls.service_time)
+        if expected > timeout:
+            raise self._shed(cls, "deadline", expected)
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        cls.waiters.append(waiter)
+        ADMISSION_QUEUED.labels(name).inc()
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except TimeoutError:
+            if waiter.cancelled() or not waiter.done():  # (the timeout cancels the waiter too)
+                raise self._shed(cls, "timeout", cls.expected_wait()) from None
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(name)  # admitted just as we were cancelled
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            if waiter in cls.waiters:
+                cls.waiters.remove(waiter)
+            ADMISSION_QUEUED.labels(name).dec()
+        ADMISSION_WAIT.labels(name).observe(time.monotonic() - started)
+
+    def release(self, name: str, elapsed: float | None = None) -> None:
+        cls = self._classes[name]
+        cls.active -= 1
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.labels(name).dec()
+        if elapsed is not None:
+            cls.observe(elapsed)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for cls in self._by_priority:
+            while cls.waiters and self._has_room(cls):
+                waiter = cls.waiters.popleft()
+                if not waiter.done():
+                    self._admit(cls)
+                    waiter.set_result(None)
+            if self.active >= self.global_limit:
+                return
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "globalLimit": self.global_limit,
+            "active": self.active,
+            "maxWait": self.max_wait,
+            "classes": {name: cls.as_dict() for name, cls in self._classes.items()},
+        }
+
+
+admission = AdmissionController(
+    parse_policy(ADMISSION_POLICY),
+    global_limit=ADMISSION_GLOBAL_LIMIT,
+    max_wait=ADMISSION_MAX_WAIT,
+    enabled=ADMISSION_ENABLED,
+)
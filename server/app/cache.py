@@ -0,0 +1,309 @@
+"""Response cache for deterministic AI endpoints.
+
+Two tiers:
+
+* ``MemoryTier`` — per-process LRU with TTL, bounded by entry count and bytes.
+* ``SharedTier`` — optional Redis-compatible store shared across workers and
+  replicas.  ``FakeRedis`` implements the tiny subset of the redis client API
+  we use, so the shared path can be exercised without a Redis server.
+
+Values are stored as already-serialized JSON bytes, so a hit can be written to
+the socket without re-encoding.  ``ResponseCache.encoded`` keeps compressed
+copies (br / zstd / gzip) in a separate ``MemoryTier``, keyed by content, so
+a hit is sent precompressed without the copies crowding out answers.  A miss is compressed at the on-the-fly level; the best-level
+copy is built in the background and served from the next hit on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any
+
+from pydantic import BaseModel
+
+from .config import (
+    CACHE_ENABLED,
+    CACHE_ENCODED_MAX_BYTES,
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_REDIS_URL,
+    CACHE_TTL,
+)
+from .compression import ENCODINGS, compress_async
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger("kitchen-ai")
+
+KEY_PREFIX = "kai:v2"  # bump when the shape of cached responses changes
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ── Key normalization ────────────────────────────────────────────────────
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip().casefold()
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        if all(isinstance(i, str) for i in items):
+            # Ingredient lists are order-insensitive and may contain duplicates.
+            return sorted({i for i in items if i})
+        return items
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def cache_key(endpoint: str, body: BaseModel) -> str:
+    """Build a stable cache key from the endpoint and a normalized request model."""
+    canonical = json.dumps(
+        _normalize(body.model_dump()),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{endpoint}:{digest}"
+
+
+def encoded_key(encoding: str, value: bytes) -> str:
+    """Key of the *encoding*-compressed copy of *value* (shared by every entry with these bytes)."""
+    digest = hashlib.blake2b(value, digest_size=16).hexdigest()
+    return f"{KEY_PREFIX}:encoded:{encoding}:{digest}"
+
+
+# ── Tiers ────────────────────────────────────────────────────────────────
+
+class MemoryTier:
+    """In-process LRU with per-entry TTL and a total byte budget."""
+
+    def __init__(self, *, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self.bytes += len(value)
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.bytes -= len(value)
+
+
+class FakeRedis:
+    """In-process stand-in for ``redis.asyncio.Redis`` (get/set/aclose only)."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[float | None, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> bool:
+        self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    async def aclose(self) -> None:
+        self._data.clear()
+
+
+class SharedTier:
+    """Redis-compatible shared tier.  Errors are logged and treated as misses."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str) -> SharedTier:
+        if url.startswith("fake://"):
+            return cls(FakeRedis())
+        import redis.asyncio as aioredis
+
+        return cls(aioredis.from_url(url))
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            return await self.client.get(key)
+        except Exception as exc:
+            self.errors += 1
+            logger.error("[cache] shared tier get failed: %s", exc)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            await self.client.set(key, value, ex=ttl)
+        except Exception as exc:
+            self.errors += 1
+            logger.error("[cache] shared tier set failed: %s", exc)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+# ── Facade ───────────────────────────────────────────────────────────────
+
+class ResponseCache:
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        ttl: int = CACHE_TTL,
+        local: MemoryTier | None = None,
+        encoded_local: MemoryTier | None = None,
+        shared: SharedTier | None = None,
+    ) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.local = local or MemoryTier(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES)
+        # Compressed copies, at most one per encoding per answer.
+        self.encoded_local = encoded_local or MemoryTier(
+            max_entries=CACHE_MAX_ENTRIES * max(len(ENCODINGS), 1), max_bytes=CACHE_ENCODED_MAX_BYTES
+        )
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.encoded_stored = 0
+        self._precompressing: dict[str, asyncio.Task[None]] = {}
+
+    async def get(self, key: str, *, count: bool = True) -> bytes | None:
+        """Look *key* up in both tiers; *count* False keeps it out of the hit/miss stats."""
+        if not self.enabled:
+            return None
+        value = await self._lookup(self.local, key)
+        if not count:
+            return value
+        endpoint = key.split(":")[2]
+        if value is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels(endpoint, "miss").inc()
+        else:
+            self.hits += 1
+            CACHE_LOOKUPS.labels(endpoint, "hit").inc()
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        if not self.enabled:
+            return
+        await self._store(self.local, key, value)
+
+    async def _lookup(self, local: MemoryTier, key: str) -> bytes | None:
+        value = local.get(key)
+        if value is None and self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                self.shared_hits += 1
+                local.set(key, value, self.ttl)
+        return value
+
+    async def _store(self, local: MemoryTier, key: str, value: bytes) -> None:
+        local.set(key, value, self.ttl)
+        if self.shared is not None:
+            await self.shared.set(key, value, self.ttl)
+
+    async def encoded(self, value: bytes, encoding: str) -> bytes:
+        """*value* compressed with *encoding*.
+
+        A stored best-level copy when there is one; otherwise compressed at
+        the on-the-fly level, while the best-level copy is built off the
+        request path for later hits.
+        """
+        key = encoded_key(encoding, value)
+        if not self.enabled:
+            return await compress_async(value, encoding)
+        encoded = await self._lookup(self.encoded_local, key)
+        if encoded is not None:
+            return encoded
+        if key not in self._precompressing:
+            task = asyncio.create_task(self._precompress(key, value, encoding))
+            self._precompressing[key] = task
+            task.add_done_callback(lambda _: self._precompressing.pop(key, None))
+        return await compress_async(value, encoding)
+
+    async def _precompress(self, key: str, value: bytes, encoding: str) -> None:
+        try:
+            await self._store(self.encoded_local, key, await compress_async(value, encoding, best=True))
+            self.encoded_stored += 1
+        except Exception as exc:
+            logger.warning("[cache] precompressing %s failed: %s", encoding, exc)
+
+    async def close(self) -> None:
+        tasks = list(self._precompressing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.shared is not None:
+            await self.shared.close()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "encodedStored": self.encoded_stored,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.local),
+            "bytes": self.local.bytes,
+            "evictions": self.local.evictions,
+            "encodedEntries": len(self.encoded_local),
+            "encodedBytes": self.encoded_local.bytes,
+            "shared": self.shared is not None,
+            "sharedErrors": self.shared.errors if self.shared is not None else 0,
+        }
+
+
+def _build_cache() -> ResponseCache:
+    shared = None
+    if CACHE_ENABLED and CACHE_REDIS_URL:
+        try:
+            shared = SharedTier.from_url(CACHE_REDIS_URL)
+        except Exception as exc:
+            logger.error("[cache] shared tier disabled: %s", exc)
+    return ResponseCache(enabled=CACHE_ENABLED, shared=shared)
+
+
+response_cache = _build_cache()
@@ -0,0 +1,178 @@
+"""Per-model client-side rate limiting and circuit breaking for upstream calls.
+
+Every worker keeps one ``ModelGuard`` per upstream model.  It combines:
+
+* an adaptive token bucket — the refill rate is halved on every 429 and
+  creeps back up on success (AIMD), so the worker learns the quota instead
+  of hammering it; a ``Retry-After`` from Google pauses the bucket for that
+  long (callers wait, or fail fast when the pause exceeds their queue wait);
+* a circuit breaker — after ``CIRCUIT_FAILURE_THRESHOLD`` consecutive
+  throttles / 5xx / network errors, or a failed half-open probe, the circuit
+  opens and calls fail fast with ``UpstreamUnavailable`` for
+  ``CIRCUIT_OPEN_SECONDS`` (or the ``Retry-After``, when one was given); then
+  a single probe decides whether to close it again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from .config import (
+    BACKOFF_BASE,
+    BACKOFF_CAP,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    UPSTREAM_BURST,
+    UPSTREAM_MAX_QUEUE_WAIT,
+    UPSTREAM_MIN_RATE,
+    UPSTREAM_RATE,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling a model whose circuit is open or quota is exhausted."""
+
+    def __init__(self, model: str, retry_after: float) -> None:
+        super().__init__(f"{model} unavailable, retry after {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a ``Retry-After`` header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than *retry_after*."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+    return max(delay, retry_after or 0.0)
+
+
+class ModelGuard:
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.rate = UPSTREAM_RATE
+        self.tokens = float(UPSTREAM_BURST)
+        self.updated = time.monotonic()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.paused_until = 0.0  # Retry-After from the last throttle / 5xx
+        self.probing = False
+        self.throttled = 0
+        self.rejected = 0
+
+    # ── Circuit ──────────────────────────────────────────────────────────
+
+    def _check_circuit(self) -> None:
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self.opened_until:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.model, self.opened_until - now)
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN:
+            if self.probing:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.model, CIRCUIT_OPEN_SECONDS)
+            self.probing = True
+
+    def _open(self, cooldown: float) -> None:
+        self.state = OPEN
+        self.probing = False
+        self.opened_until = time.monotonic() + cooldown
+
+    # ── Token bucket ─────────────────────────────────────────────────────
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(float(UPSTREAM_BURST), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait for permission to send one request, or raise ``UpstreamUnavailable``."""
+        self._check_circuit()
+        self._refill()
+        wait = (1.0 - self.tokens) / self.rate if self.tokens < 1.0 else 0.0
+        wait = max(wait, self.paused_until - time.monotonic())
+        if wait > UPSTREAM_MAX_QUEUE_WAIT:
+            self.rejected += 1
+            if self.state == HALF_OPEN:
+                self.probing = False
+            raise UpstreamUnavailable(self.model, wait)
+        # Reserve the token now (the balance may go negative) so concurrent
+        # callers queue behind each other instead of all waking at once.
+        self.tokens -= 1.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    # ── Outcomes ─────────────────────────────────────────────────────────
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.state = CLOSED
+        self.probing = False
+        self.rate = min(UPSTREAM_RATE, self.rate + UPSTREAM_RATE * 0.05)
+
+    def on_throttle(self, retry_after: float | None) -> None:
+        self.throttled += 1
+        self.rate = max(UPSTREAM_MIN_RATE, self.rate / 2)
+        self.on_failure(retry_after)
+
+    def on_failure(self, retry_after: float | None = None) -> None:
+        self.failures += 1
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        if self.state == HALF_OPEN or self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self._open(retry_after or CIRCUIT_OPEN_SECONDS)
+
+    def release(self) -> None:
+        """The call ended without a verdict on the model (e.g. cancelled)."""
+        if self.state == HALF_OPEN:
+            self.probing = False
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "rate": round(self.rate, 3),
+            "tokens": round(self.tokens, 2),
+            "consecutiveFailures": self.failures,
+            "openFor": round(max(0.0, self.opened_until - time.monotonic()), 1) if self.state == OPEN else 0,
+            "pausedFor": round(max(0.0, self.paused_until - time.monotonic()), 1),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+_guards: dict[str, ModelGuard] = {}
+
+
+def guard_for(model: str) -> ModelGuard:
+    guard = _guards.get(model)
+    if guard is None:
+        guard = _guards[model] = ModelGuard(model)
+    return guard
+
+
+def circuit_stats() -> dict[str, Any]:
+    return {model: guard.as_dict() for model, guard in _guards.items()}
@@ -0,0 +1,231 @@
+"""Response compression: br / zstd / gzip by content negotiation.
+
+``CompressionMiddleware`` replaces Starlette's ``GZipMiddleware``, which
+gzipped every response on the event loop.  It picks the client's preferred
+encoding from ``Accept-Encoding`` (ties go to the order of
+``COMPRESSION_ENCODINGS``) and sends the body as-is when:
+
+* it is under ``COMPRESSION_MIN_SIZE``, streamed, or already carries a
+  ``Content-Encoding`` (cache hits are stored precompressed, see
+  ``ResponseCache.encoded``);
+* its media type is already compressed (images, archives, …) or is an
+  SSE / NDJSON stream;
+* it is large and a sample of it barely shrinks (inline base64 images).
+
+Bodies of ``COMPRESSION_OFFLOAD_SIZE`` or more are compressed in a worker
+thread.  brotli and zstd are optional (the Brotli / zstandard packages, or
+``compression.zstd`` on Python 3.14+); without them only gzip is offered.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import zlib
+from functools import lru_cache
+from typing import Any, Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import (
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_MAX_RATIO,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_OFFLOAD_SIZE,
+    COMPRESSION_PROBE_SIZE,
+)
+from .metrics import HTTP_COMPRESSED_RESPONSES, HTTP_COMPRESSION_SAVED
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is in requirements.txt
+    brotli = None  # type: ignore[assignment]
+
+# Media types that are compressed already (or must reach the client unbuffered).
+_INCOMPRESSIBLE = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+    "text/event-stream",
+    "application/x-ndjson",
+)
+_NO_BODY_STATUSES = frozenset({204, 206, 304})
+_SAMPLE = 16 * 1024
+
+
+def _zstd_codec() -> Callable[[bytes, int], bytes] | None:
+    try:
+        from compression import zstd  # Python 3.14+
+
+        return lambda data, level: zstd.compress(data, level=level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _codecs() -> dict[str, tuple[Callable[[bytes, int], bytes], int, int]]:
+    """Encoding -> (compress, on-the-fly level, precompressed level)."""
+    codecs: dict[str, tuple[Callable[[bytes, int], bytes], int, int]] = {
+        "gzip": (lambda data, level: gzip.compress(data, compresslevel=level, mtime=0), 6, 9),
+    }
+    if brotli is not None:
+        codecs["br"] = (lambda data, level: brotli.compress(data, quality=level), 4, 11)
+    zstd = _zstd_codec()
+    if zstd is not None:
+        codecs["zstd"] = (zstd, 3, 19)
+    return codecs
+
+
+_CODECS = _codecs()
+ENCODINGS: tuple[str, ...] = tuple(
+    name for name in (e.strip().lower() for e in COMPRESSION_ENCODINGS.split(",")) if name in _CODECS
+)
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str) -> str | None:
+    """Best of ``ENCODINGS`` for an ``Accept-Encoding`` header, or None for identity."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in ENCODINGS:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def etag_for_encoding(etag: str, encoding: str) -> str:
+    """A strong ETag for the *encoding*-compressed bytes (``"abc"`` -> ``"abc-br"``)."""
+    if etag.startswith('"') and etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def strip_etag_encoding(etag: str) -> str:
+    """Inverse of ``etag_for_encoding``."""
+    for encoding in _CODECS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+def compressible_type(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return not content_type.startswith(_INCOMPRESSIBLE) or content_type.startswith("image/svg")
+
+
+def worth_compressing(body: bytes) -> bool:
+    """Whether a large *body* shrinks enough; judged by a sample from its middle."""
+    if len(body) < COMPRESSION_PROBE_SIZE:
+        return True
+    start = (len(body) - _SAMPLE) // 2
+    sample = body[start:start + _SAMPLE]
+    return len(zlib.compress(sample, 1)) <= len(sample) * COMPRESSION_MAX_RATIO
+
+
+def compress(data: bytes, encoding: str, *, best: bool = False) -> bytes:
+    codec, fast, slow = _CODECS[encoding]
+    return codec(data, slow if best else fast)
+
+
+async def compress_async(data: bytes, encoding: str, *, best: bool = False) -> bytes:
+    """``compress``, in a worker thread for large bodies and for the (slow) best level."""
+    if best or len(data) >= COMPRESSION_OFFLOAD_SIZE:
+        return await asyncio.to_thread(compress, data, encoding, best=best)
+    return compress(data, encoding)
+
+
+def compression_stats() -> dict[str, Any]:
+    return {
+        "encodings": list(ENCODINGS),
+        "minSize": COMPRESSION_MIN_SIZE,
+        "offloadSize": COMPRESSION_OFFLOAD_SIZE,
+    }
+
+
+class CompressionMiddleware:
+    """Compress complete response bodies with the negotiated encoding.
+
+    ``Vary: Accept-Encoding`` is added to every response of a compressible
+    type, compressed or not, so shared caches keep the variants apart.
+    """
+
+    def __init__(self, app: ASGIApp, *, minimum_size: int = COMPRESSION_MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start: Message | None = None
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            response_start, start = start, None
+            headers = MutableHeaders(raw=list(response_start["headers"]))
+            body = message.get("body", b"")
+            candidate = self._plan(response_start["status"], headers, body, message.get("more_body", False))
+            if candidate and encoding is not None:
+                mode = "offloaded" if len(body) >= COMPRESSION_OFFLOAD_SIZE else "inline"
+                if not worth_compressing(body):
+                    mode = "skipped"
+                else:
+                    encoded = await compress_async(body, encoding)
+                    if len(encoded) < len(body):
+                        HTTP_COMPRESSION_SAVED.labels(encoding).inc(len(body) - len(encoded))
+                        body = encoded
+                        headers["content-encoding"] = encoding
+                        headers["content-length"] = str(len(body))
+                        if "etag" in headers:
+                            headers["etag"] = etag_for_encoding(headers["etag"], encoding)
+                HTTP_COMPRESSED_RESPONSES.labels(encoding, mode).inc()
+            await send({**response_start, "headers": headers.raw})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, compressing_send)
+
+    def _plan(self, status: int, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        """Fix up *headers*; True when *body* is a candidate for compression."""
+        if "content-encoding" in headers:
+            return False
+        if status in _NO_BODY_STATUSES or "content-range" in headers:
+            return False
+        if not compressible_type(headers.get("content-type", "")):
+            return False
+        headers.add_vary_header("Accept-Encoding")
+        return not more_body and len(body) >= self.minimum_size
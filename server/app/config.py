@@ -3,13 +3,21 @@
 from __future__ import annotations
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # ── API keys ─────────────────────────────────────────────────────────────
-GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or ""
+# GEMINI_API_KEYS (comma-separated, e.g. one key per Google Cloud project) forms
+# a pool: each upstream call goes to the least-loaded healthy key.
+GEMINI_API_KEYS: list[str] = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
+GEMINI_API_KEY: str = (
+    os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or (GEMINI_API_KEYS[0] if GEMINI_API_KEYS else "")
+)
+if not GEMINI_API_KEYS and GEMINI_API_KEY:
+    GEMINI_API_KEYS = [GEMINI_API_KEY]
 
 # ── Model names ──────────────────────────────────────────────────────────
 GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
@@ -23,13 +31,182 @@ IMAGEN_MODELS: list[str] = [
 # ── Server ───────────────────────────────────────────────────────────────
 PORT: int = int(os.getenv("PORT", "5050"))
 CORS_ORIGIN: str = os.getenv("CORS_ORIGIN", "")
+# Per-IP request limits (slowapi).  Disable only for local load tests.
+RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+# redis://… shares limit counters across workers/replicas; empty or fake:// keeps them per process.
+RATE_LIMIT_STORAGE_URL: str = os.getenv("RATE_LIMIT_STORAGE_URL", "")
+RATE_LIMIT_STRATEGY: str = os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+# Proxies (IPs / CIDRs) whose X-Forwarded-For is trusted, e.g. Traefik's network.
+TRUSTED_PROXIES: str = os.getenv(
+    "TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+)
 
 # ── Limits / timeouts ───────────────────────────────────────────────────
-BODY_LIMIT: int = 12 * 1024 * 1024  # 12 MB
+BODY_LIMIT: int = 12 * 1024 * 1024  # 12 MB – /api/vision*
+TEXT_BODY_LIMIT: int = int(os.getenv("TEXT_BODY_LIMIT", str(64 * 1024)))  # every other route
 MODEL_TIMEOUT: float = 15.0  # seconds – image model calls
 FETCH_TIMEOUT: float = 60.0  # seconds – text endpoints
 MAX_RETRIES: int = 5
 
+# End-to-end budget per API request (kept under the proxy's 60 s timeout):
+# attempts are cut off and retries / fallbacks skipped once it runs out (504).
+REQUEST_DEADLINE: float = float(os.getenv("REQUEST_DEADLINE", "45"))  # seconds
+IMAGE_REQUEST_DEADLINE: float = float(os.getenv("IMAGE_REQUEST_DEADLINE", "55"))  # /api/image, /api/bundle
+IMAGE_JOB_DEADLINE: float = float(os.getenv("IMAGE_JOB_DEADLINE", "150"))  # background image jobs
+DEADLINE_MIN_ATTEMPT: float = float(os.getenv("DEADLINE_MIN_ATTEMPT", "2"))  # don't start an attempt with less left
+
+# Binary uploads to /api/vision/upload: kept in memory up to VISION_SPOOL_MEMORY,
+# spilled to a temp file beyond that.
+VISION_UPLOAD_MAX_BYTES: int = BODY_LIMIT
+VISION_SPOOL_MEMORY: int = int(os.getenv("VISION_SPOOL_MEMORY", str(1024 * 1024)))
+
+# Vision preprocessing: downscale to VISION_MAX_EDGE px, strip EXIF and
+# re-encode before the photo is sent to Gemini.  Runs in a thread or process pool.
+VISION_PREPROCESS: bool = os.getenv("VISION_PREPROCESS", "1") not in ("0", "false", "no")
+VISION_MAX_EDGE: int = int(os.getenv("VISION_MAX_EDGE", "1536"))
+VISION_OUTPUT_FORMAT: str = os.getenv("VISION_OUTPUT_FORMAT", "jpeg").lower()  # jpeg | webp
+VISION_OUTPUT_QUALITY: int = int(os.getenv("VISION_OUTPUT_QUALITY", "80"))
+VISION_PREPROCESS_EXECUTOR: str = os.getenv("VISION_PREPROCESS_EXECUTOR", "thread").lower()  # thread | process
+VISION_PREPROCESS_WORKERS: int = int(os.getenv("VISION_PREPROCESS_WORKERS", "2"))
+
+# Vision result cache: photos are matched by exact pixel hash, then by a
+# perceptual hash within VISION_CACHE_MAX_DISTANCE bits (of 64), per language.
+VISION_CACHE_ENABLED: bool = os.getenv("VISION_CACHE_ENABLED", "1") not in ("0", "false", "no")
+VISION_CACHE_MAX_DISTANCE: int = int(os.getenv("VISION_CACHE_MAX_DISTANCE", "6"))
+VISION_CACHE_MAX_ENTRIES: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "20000"))
+
+# ── Admission control (per worker) ───────────────────────────────────────
+# Concurrency and wait-queue length per endpoint class ("class=concurrency/queue";
+# classes: text, bundle, vision, image — in priority order).  Requests that
+# would wait longer than ADMISSION_MAX_WAIT or their deadline get 503 at once.
+ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "1") not in ("0", "false", "no")
+ADMISSION_POLICY: str = os.getenv("ADMISSION_POLICY", "text=32/64,bundle=4/8,vision=4/8,image=6/12")
+ADMISSION_GLOBAL_LIMIT: int = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "40"))
+ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "10"))  # seconds
+
+# ── Upstream rate limiting / circuit breaker (per model, per worker) ────
+UPSTREAM_RATE: float = float(os.getenv("UPSTREAM_RATE", "10"))  # requests / second
+UPSTREAM_MIN_RATE: float = float(os.getenv("UPSTREAM_MIN_RATE", "0.5"))
+UPSTREAM_BURST: int = int(os.getenv("UPSTREAM_BURST", "20"))
+UPSTREAM_MAX_QUEUE_WAIT: float = float(os.getenv("UPSTREAM_MAX_QUEUE_WAIT", "5"))  # seconds
+CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+# Cluster-wide cap on upstream calls (shared through RATE_LIMIT_STORAGE_URL); 0 disables.
+UPSTREAM_GLOBAL_RATE: float = float(os.getenv("UPSTREAM_GLOBAL_RATE", "15"))  # requests / second
+UPSTREAM_GLOBAL_BURST: int = int(os.getenv("UPSTREAM_GLOBAL_BURST", "30"))
+BACKOFF_BASE: float = 1.0  # seconds
+BACKOFF_CAP: float = 16.0  # seconds
+# API key pool: a key answering 429 is ejected for its Retry-After (or
+# KEY_QUOTA_COOLDOWN) while other keys are healthy; a rejected key for longer.
+KEY_QUOTA_COOLDOWN: float = float(os.getenv("KEY_QUOTA_COOLDOWN", "60"))  # seconds
+KEY_AUTH_EJECT_SECONDS: float = float(os.getenv("KEY_AUTH_EJECT_SECONDS", "600"))
+
+# ── Image generation strategy ────────────────────────────────────────────
+# sequential: try models one after another (legacy behaviour)
+# hedge:      start the next model if the current one has not answered
+#             within IMAGE_HEDGE_DELAY seconds (or as soon as it fails)
+# race:       start every model at once and keep the first image
+IMAGE_STRATEGY_MODE: str = os.getenv("IMAGE_STRATEGY_MODE", "hedge").lower()
+IMAGE_HEDGE_DELAY: float = float(os.getenv("IMAGE_HEDGE_DELAY", "5.0"))
+# Reorder models by observed success rate / latency instead of the fixed list.
+IMAGE_ADAPTIVE_ORDER: bool = os.getenv("IMAGE_ADAPTIVE_ORDER", "1") not in ("0", "false", "no")
+
+# ── Generated image store ────────────────────────────────────────────────
+# Images from /api/image are stored content-addressed and served by URL.
+IMAGE_STORE_BACKEND: str = os.getenv("IMAGE_STORE_BACKEND", "local").lower()
+IMAGE_STORE_DIR: str = os.getenv(
+    "IMAGE_STORE_DIR", os.path.join(tempfile.gettempdir(), "kitchen-ai-images")
+)
+# Also return the legacy inline data: URI (for clients that predate imageUrl).
+IMAGE_INLINE_BASE64: bool = os.getenv("IMAGE_INLINE_BASE64", "0") not in ("0", "false", "no")
+
+# ── Image jobs (POST /api/image/jobs) ────────────────────────────────────
+# SQLite file shared by all workers on the host; keep it on the image volume.
+IMAGE_JOBS_DB: str = os.getenv("IMAGE_JOBS_DB", os.path.join(IMAGE_STORE_DIR, "jobs.sqlite3"))
+IMAGE_JOB_WORKERS: int = int(os.getenv("IMAGE_JOB_WORKERS", "2"))  # per process
+IMAGE_JOB_MAX_ATTEMPTS: int = int(os.getenv("IMAGE_JOB_MAX_ATTEMPTS", "3"))
+IMAGE_JOB_LEASE: float = float(os.getenv("IMAGE_JOB_LEASE", "180"))  # seconds before a stuck job is retried
+IMAGE_JOB_POLL_INTERVAL: float = float(os.getenv("IMAGE_JOB_POLL_INTERVAL", "1.0"))
+IMAGE_JOB_RETENTION: float = float(os.getenv("IMAGE_JOB_RETENTION", str(24 * 60 * 60)))
+
+# ── Cache warmer ─────────────────────────────────────────────────────────
+# Dish popularity is recorded by every worker (WARMER_RECORD); one worker
+# pre-generates answers for the top dishes during the off-peak window
+# (WARMER_WINDOW, local hours "start-end") when WARMER_ENABLED is set.
+WARMER_RECORD: bool = os.getenv("WARMER_RECORD", "1") not in ("0", "false", "no")
+WARMER_ENABLED: bool = os.getenv("WARMER_ENABLED", "0") not in ("0", "false", "no")
+WARMER_DB: str = os.getenv("WARMER_DB", os.path.join(IMAGE_STORE_DIR, "warmer.sqlite3"))
+WARMER_WINDOW: str = os.getenv("WARMER_WINDOW", "2-6")
+WARMER_ENDPOINTS: str = os.getenv("WARMER_ENDPOINTS", "recipe-detail,drinks,meal-plan,image")
+WARMER_LANGUAGES: str = os.getenv("WARMER_LANGUAGES", "en,ru")
+WARMER_TOP_N: int = int(os.getenv("WARMER_TOP_N", "200"))
+WARMER_MIN_COUNT: float = float(os.getenv("WARMER_MIN_COUNT", "5"))  # decayed requests
+WARMER_MAX_GENERATIONS: int = int(os.getenv("WARMER_MAX_GENERATIONS", "300"))  # upstream spend per pass
+WARMER_CONCURRENCY: int = int(os.getenv("WARMER_CONCURRENCY", "2"))
+WARMER_MAX_LIVE: int = int(os.getenv("WARMER_MAX_LIVE", "2"))  # pause while serving more live requests
+WARMER_HALF_LIFE: float = float(os.getenv("WARMER_HALF_LIFE", str(7 * 24 * 60 * 60)))  # seconds
+WARMER_FLUSH_INTERVAL: float = float(os.getenv("WARMER_FLUSH_INTERVAL", "60"))  # seconds
+WARMER_TRACKED_MAX: int = int(os.getenv("WARMER_TRACKED_MAX", "10000"))
+
+# ── Upstream connection pool ────────────────────────────────────────────
+# One long-lived httpx client per worker; connections to Google (or the
+# proxy) are reused across requests and retries instead of re-handshaking.
+UPSTREAM_HTTP2: bool = os.getenv("UPSTREAM_HTTP2", "1") not in ("0", "false", "no")
+UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE: int = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+
+# ── Diagnostics ──────────────────────────────────────────────────────────
+# Bearer token for /api/debug/* (sampling profiler, tracemalloc); unset = off.
+DIAGNOSTICS_TOKEN: str = os.getenv("DIAGNOSTICS_TOKEN", "")
+LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.5"))  # seconds
+# Log the event loop's stack when it has not run for this long (blocking call).
+LOOP_BLOCK_WARN: float = float(os.getenv("LOOP_BLOCK_WARN", "1.0"))  # seconds
+# /api/health/ready fails while the average event-loop lag is above this.
+READY_MAX_LOOP_LAG: float = float(os.getenv("READY_MAX_LOOP_LAG", "1.0"))  # seconds
+PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+TRACEMALLOC_FRAMES: int = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+# ── Response compression ─────────────────────────────────────────────────
+# Offered in this order when the client accepts several equally (br and zstd
+# need the Brotli / zstandard packages; gzip is always available).
+COMPRESSION_ENCODINGS: str = os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))  # bytes
+# Bodies this large are compressed in a worker thread, off the event loop.
+COMPRESSION_OFFLOAD_SIZE: int = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", str(64 * 1024)))
+# Bodies this large are sampled first and sent as-is when the sample does not
+# shrink below COMPRESSION_MAX_RATIO (inline base64 images, …).
+COMPRESSION_PROBE_SIZE: int = int(os.getenv("COMPRESSION_PROBE_SIZE", str(32 * 1024)))
+COMPRESSION_MAX_RATIO: float = float(os.getenv("COMPRESSION_MAX_RATIO", "0.6"))
+
+# ── Response cache ───────────────────────────────────────────────────────
+# In-process LRU/TTL tier, optionally backed by a shared Redis-compatible
+# tier (CACHE_REDIS_URL=redis://… or fake:// for an in-process stand-in).
+CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "1") not in ("0", "false", "no")
+CACHE_TTL: int = int(os.getenv("CACHE_TTL", str(24 * 60 * 60)))  # seconds
+CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Precompressed (br / zstd / gzip) copies of cached answers get their own
+# in-process LRU, so warming them never evicts answers.
+CACHE_ENCODED_MAX_BYTES: int = int(os.getenv("CACHE_ENCODED_MAX_BYTES", str(CACHE_MAX_BYTES // 4)))
+CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "")
+# Cache-Control of the GET variants (/api/recipe-detail, /drinks, /meal-plan,
+# /image) for nginx / CDN: fresh for GET_CACHE_MAX_AGE, then served stale
+# while revalidating (or on upstream errors) for GET_CACHE_STALE.
+GET_CACHE_MAX_AGE: int = int(os.getenv("GET_CACHE_MAX_AGE", str(60 * 60)))  # seconds
+GET_CACHE_STALE: int = int(os.getenv("GET_CACHE_STALE", str(24 * 60 * 60)))  # seconds
+# Near-duplicate lookup (/api/recipes by ingredients, /api/recipe-detail by
+# title): serve a cached answer whose Jaccard similarity reaches the threshold
+# and that passes the same-dish checks in similarity.py (no extra ingredients;
+# same title words up to typos).
+# An entry (~1 KB) is only useful while its answer is cached, so the index is
+# sized like the response cache by default.
+SIMILARITY_ENABLED: bool = os.getenv("SIMILARITY_ENABLED", "1") not in ("0", "false", "no")
+SIMILARITY_MAX_ENTRIES: int = int(os.getenv("SIMILARITY_MAX_ENTRIES", str(CACHE_MAX_ENTRIES)))
+SIMILARITY_THRESHOLD_INGREDIENTS: float = float(os.getenv("SIMILARITY_THRESHOLD_INGREDIENTS", "0.7"))
+SIMILARITY_THRESHOLD_TITLE: float = float(os.getenv("SIMILARITY_THRESHOLD_TITLE", "0.6"))
+
 MAX_INGREDIENTS: int = 50
 MAX_INGREDIENT_LENGTH: int = 100
 MAX_TITLE_LENGTH: int = 200
@@ -58,12 +235,16 @@ def gemini_url(model: str) -> str:
     return f"{GOOGLE_AI_BASE}/{model}:generateContent"
 
 
+def gemini_stream_url(model: str) -> str:
+    return f"{GOOGLE_AI_BASE}/{model}:streamGenerateContent?alt=sse"
+
+
 def imagen_url(model: str) -> str:
     return f"{GOOGLE_AI_BASE}/{model}:predict"
 
 
-def google_api_headers() -> dict[str, str]:
+def google_api_headers(api_key: str = GEMINI_API_KEY) -> dict[str, str]:
     return {
         "Content-Type": "application/json",
-        "x-goog-api-key": GEMINI_API_KEY,
+        "x-goog-api-key": api_key,
     }
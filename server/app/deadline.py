@@ -0,0 +1,55 @@
+"""Per-request deadline budget, carried in a context variable.
+
+``RequestLifecycleMiddleware`` (middleware.py) opens a budget for every API
+request; background jobs open their own with ``deadline_scope``.  Upstream
+code reads it: each attempt is bounded by the time left, and retries, backoff
+sleeps and image fallbacks are only started when they fit.  Tasks created
+while a budget is open (single-flight calls, hedged image attempts) inherit it.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_deadline: ContextVar[float | None] = ContextVar("kitchen_ai_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the upstream work could finish."""
+
+    def __init__(self, what: str) -> None:
+        super().__init__(f"deadline exceeded: {what}")
+        self.what = what
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Limit everything inside to *seconds* (never extends an enclosing budget)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current budget, or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def fits(seconds: float) -> bool:
+    """Whether *seconds* of work still fit in the budget."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def bounded(timeout: float) -> float:
+    """*timeout* capped by the time left (never below zero)."""
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
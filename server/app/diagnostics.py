@@ -0,0 +1,379 @@
+"""Runtime diagnostics: memory, GC, event-loop lag and on-demand profiling.
+
+``/api/health`` includes ``runtime_stats()``.  ``/api/health/live`` only
+answers (a wedged event loop cannot); ``/api/health/ready`` also fails
+before startup has finished, once shutdown has begun, and while the
+event loop lags (``readiness()``).
+
+``LoopMonitor`` measures how late a timer on the event loop fires.  A
+watchdog thread logs the loop's stack when it has not run for
+``LOOP_BLOCK_WARN`` seconds, so a blocking call shows up in the logs with
+its location.
+
+The ``/api/debug/*`` endpoints (routes.py) require ``DIAGNOSTICS_TOKEN``:
+
+* ``profile`` samples the event-loop thread's stack for a few seconds and
+  returns folded stacks (input for flamegraph.pl or speedscope);
+* ``tracemalloc`` starts tracing Python allocations, reports the top
+  allocation sites and the growth since the previous report, and stops.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gc
+import linecache
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter, deque
+from typing import Any
+
+from .config import (
+    GEMINI_API_KEY,
+    LOOP_BLOCK_WARN,
+    LOOP_MONITOR_INTERVAL,
+    READY_MAX_LOOP_LAG,
+    TRACEMALLOC_FRAMES,
+)
+from .metrics import EVENT_LOOP_LAG, GC_PAUSE
+from .upstream import pool_stats
+
+logger = logging.getLogger("kitchen-ai")
+
+_MB = 1024 * 1024
+
+
+# ── Memory / GC / tasks ──────────────────────────────────────────────────
+
+def current_rss() -> int | None:
+    """Resident set size now, in bytes (Linux only)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    """Highest resident set size so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024  # Linux reports KB
+
+
+def _open_fds() -> int | None:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class _GcTimer:
+    """Times collector pauses through ``gc.callbacks``."""
+
+    def __init__(self) -> None:
+        self.pause_time = [0.0, 0.0, 0.0]
+        self.max_pause = 0.0
+        self._started = 0.0
+
+    def __call__(self, phase: str, info: dict[str, Any]) -> None:
+        if phase == "start":
+            self._started = time.perf_counter()
+            return
+        elapsed = time.perf_counter() - self._started
+        generation = info["generation"]
+        self.pause_time[generation] += elapsed
+        self.max_pause = max(self.max_pause, elapsed)
+        GC_PAUSE.labels(str(generation)).observe(elapsed)
+
+    def install(self) -> None:
+        if self not in gc.callbacks:
+            gc.callbacks.append(self)
+
+    def uninstall(self) -> None:
+        if self in gc.callbacks:
+            gc.callbacks.remove(self)
+
+
+gc_timer = _GcTimer()
+
+
+def gc_stats() -> dict[str, Any]:
+    return {
+        "enabled": gc.isenabled(),
+        "counts": list(gc.get_count()),
+        "thresholds": list(gc.get_threshold()),
+        "generations": [
+            {
+                "collections": stats["collections"],
+                "collected": stats["collected"],
+                "uncollectable": stats["uncollectable"],
+                "pauseSeconds": round(gc_timer.pause_time[generation], 4),
+            }
+            for generation, stats in enumerate(gc.get_stats())
+        ],
+        "maxPause": round(gc_timer.max_pause, 4),
+        "garbage": len(gc.garbage),
+    }
+
+
+def _task_name(task: asyncio.Task[Any]) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or type(coro).__name__
+
+
+def task_stats(top: int = 10) -> dict[str, Any]:
+    """Tasks on the running loop, with the most common coroutines."""
+    tasks = asyncio.all_tasks()
+    names = Counter(_task_name(task) for task in tasks)
+    return {"total": len(tasks), "byCoroutine": dict(names.most_common(top))}
+
+
+# ── Event loop ───────────────────────────────────────────────────────────
+
+class LoopMonitor:
+    """Event-loop lag from a periodic timer, plus a watchdog for blocking calls."""
+
+    ALPHA = 0.2
+    WINDOW = 120  # samples kept for the recent maximum / p99
+    STACK_FRAMES = 12  # innermost frames logged for a blocked loop
+
+    def __init__(self, *, interval: float, block_warn: float) -> None:
+        self.interval = interval
+        self.block_warn = block_warn
+        self.lag = 0.0  # EWMA
+        self.last_lag = 0.0
+        self.blocked = 0  # times the watchdog found the loop stuck
+        self._recent: deque[float] = deque(maxlen=self.WINDOW)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        if self.block_warn > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.observe(max(0.0, now - started - self.interval))
+
+    def observe(self, lag: float) -> None:
+        self.last_lag = lag
+        self.lag += self.ALPHA * (lag - self.lag)
+        self._recent.append(lag)
+        EVENT_LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported = 0.0
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.block_warn or heartbeat == reported or self._loop_thread is None:
+                continue
+            reported = heartbeat  # once per stall
+            self.blocked += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=self.STACK_FRAMES)) if frame is not None else "  (unavailable)\n"
+            logger.warning("[diagnostics] event loop blocked for %.1fs in:\n%s", stalled, stack.rstrip())
+
+    def stats(self) -> dict[str, Any]:
+        recent = sorted(self._recent)
+        return {
+            "running": self._task is not None,
+            "lag": round(self.lag, 4),
+            "lastLag": round(self.last_lag, 4),
+            "maxLag": round(recent[-1], 4) if recent else 0.0,
+            "p99Lag": round(recent[int(len(recent) * 0.99)], 4) if recent else 0.0,
+            "blocked": self.blocked,
+        }
+
+
+loop_monitor = LoopMonitor(interval=LOOP_MONITOR_INTERVAL, block_warn=LOOP_BLOCK_WARN)
+
+
+# ── Liveness / readiness ─────────────────────────────────────────────────
+
+_lifecycle = {"started": False, "draining": False}
+
+
+def mark_started() -> None:
+    _lifecycle["started"] = True
+
+
+def mark_draining() -> None:
+    """Shutdown has begun: fail readiness so the proxy stops sending traffic."""
+    _lifecycle["draining"] = True
+
+
+def readiness() -> tuple[bool, dict[str, bool]]:
+    checks = {
+        "started": _lifecycle["started"],
+        "notDraining": not _lifecycle["draining"],
+        "eventLoop": loop_monitor.lag <= READY_MAX_LOOP_LAG,
+        "upstreamClient": pool_stats()["open"],
+        "apiKey": bool(GEMINI_API_KEY),
+    }
+    return all(checks.values()), checks
+
+
+def runtime_stats() -> dict[str, Any]:
+    """Process-level part of ``/api/health``."""
+    rss = current_rss()
+    return {
+        "pid": os.getpid(),
+        "memory": {
+            "rss": f"{rss / _MB:.1f} MB" if rss is not None else None,
+            "peakRss": f"{peak_rss() / _MB:.1f} MB",
+            "tracemalloc": tracemalloc.is_tracing(),
+        },
+        "gc": gc_stats(),
+        "eventLoop": loop_monitor.stats(),
+        "tasks": task_stats(),
+        "threads": threading.active_count(),
+        "openFiles": _open_fds(),
+    }
+
+
+# ── Sampling profiler ────────────────────────────────────────────────────
+
+class ProfilerBusy(Exception):
+    """Another profile is already being taken in this process."""
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+def _fold(frame: Any) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> tuple[Counter[str], int]:
+    """Sample *thread_id*'s stack every *interval* for *seconds* (blocking; run it in a thread).
+
+    Returns folded stacks with their sample counts, and the number of samples.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        stacks: Counter[str] = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[_fold(frame)] += 1
+                samples += 1
+            del frame
+            time.sleep(interval)
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def folded(stacks: Counter[str]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# ── tracemalloc ──────────────────────────────────────────────────────────
+
+_previous: tracemalloc.Snapshot | None = None
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+)
+
+
+def tracemalloc_start(frames: int = TRACEMALLOC_FRAMES) -> bool:
+    """Start tracing; False when it already was."""
+    global _previous
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    _previous = None
+    logger.info("[diagnostics] tracemalloc started (%d frames)", frames)
+    return True
+
+
+def tracemalloc_stop() -> bool:
+    """Stop tracing and drop the last snapshot; False when it was not running."""
+    global _previous
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    _previous = None
+    logger.info("[diagnostics] tracemalloc stopped")
+    return True
+
+
+def _stat(stat: Any, growth: bool = False) -> dict[str, Any]:
+    frame = stat.traceback[0]
+    entry = {
+        "where": f"{frame.filename}:{frame.lineno}",
+        "size": stat.size,
+        "count": stat.count,
+    }
+    if growth:
+        entry["sizeDiff"] = stat.size_diff
+        entry["countDiff"] = stat.count_diff
+    return entry
+
+
+def tracemalloc_report(limit: int) -> dict[str, Any]:
+    """Top allocation sites now, and the growth since the previous report (blocking)."""
+    global _previous
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+    current, peak = tracemalloc.get_traced_memory()
+    previous, _previous = _previous, snapshot
+    report: dict[str, Any] = {
+        "tracing": True,
+        "traced": current,
+        "tracedPeak": peak,
+        "overhead": tracemalloc.get_tracemalloc_memory(),
+        "top": [_stat(stat) for stat in snapshot.statistics("lineno")[:limit]],
+    }
+    if previous is not None:
+        report["growth"] = [
+            _stat(stat, growth=True) for stat in snapshot.compare_to(previous, "lineno")[:limit]
+        ]
+    return report
@@ -3,74 +3,230 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
-from typing import Any
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable
 
 import httpx
 
+from .circuit import (
+    OPEN,
+    ModelGuard,
+    UpstreamUnavailable,
+    backoff_delay,
+    guard_for,
+    parse_retry_after,
+)
 from .config import (
+    DEADLINE_MIN_ATTEMPT,
     FETCH_TIMEOUT,
     GEMINI_IMAGE_MODEL,
     GEMINI_MODEL,
+    IMAGE_ADAPTIVE_ORDER,
+    IMAGE_HEDGE_DELAY,
+    IMAGE_STRATEGY_MODE,
     IMAGEN_MODELS,
     MAX_RETRIES,
     MODEL_TIMEOUT,
+    gemini_stream_url,
     gemini_url,
     google_api_headers,
     imagen_url,
 )
+from .deadline import DeadlineExceeded, bounded, fits, remaining
+from .keys import ApiKey, is_key_rejection, key_pool
+from .metrics import (
+    IMAGE_MODEL_RESULTS,
+    UPSTREAM_ATTEMPTS,
+    UPSTREAM_DURATION,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_RESPONSE_SIZE,
+    UPSTREAM_RETRIES,
+)
+from .ratelimit import upstream_budget
+from .singleflight import SingleFlight, flight_key
+from .uploads import SpooledImage
+from .upstream import get_client
 
 logger = logging.getLogger("kitchen-ai")
 
+# Identical concurrent text / image generations share one upstream call.
+_text_flight = SingleFlight("text")
+_image_flight = SingleFlight("image")
+
+
+ImageStrategy = Callable[[str, str], Awaitable["dict[str, str] | None"]]
+
+
+def coalescing_stats() -> dict[str, dict[str, int]]:
+    return {"text": _text_flight.stats(), "image": _image_flight.stats()}
+
 
 async def fetch_with_retry(
     url: str,
     *,
-    json_body: dict[str, Any],
+    json_body: dict[str, Any] | None = None,
+    body_stream: Callable[[], AsyncIterator[bytes]] | None = None,
+    content_length: int | None = None,
     timeout: float = FETCH_TIMEOUT,
     max_retries: int = MAX_RETRIES,
     label: str = "",
 ) -> dict[str, Any] | None:
-    """POST *url* with *json_body*, retrying on 429 / 5xx with exponential backoff."""
-    delay = 1.0
-    headers = google_api_headers()
+    """POST *url* with *json_body*, retrying on 429 / 5xx with jittered exponential backoff.
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                resp = await client.post(url, headers=headers, json=json_body)
+    Large bodies can be sent as *body_stream* instead: a factory returning a
+    fresh async byte iterator per attempt, with its exact *content_length*.
 
-            if resp.is_success:
-                return resp.json()
+    Each attempt passes through the model's ``ModelGuard``; when its circuit
+    is open (or its token bucket is drained) ``UpstreamUnavailable`` is
+    raised immediately instead of queueing more work against a failing quota.
+    Attempts go out on the least-loaded pooled API key; a key that is
+    throttled or rejected is ejected and the call moves to another key at once.
 
-            status = resp.status_code
-            body_preview = resp.text[:500]
-            logger.error(
-                "[fetchWithRetry] %s attempt %d/%d — HTTP %d: %s",
-                label, attempt, max_retries, status, body_preview,
-            )
-
-            if status == 429 or status >= 500:
-                await asyncio.sleep(delay)
-                delay *= 2
-                continue
+    Within a request deadline (see deadline.py) every attempt is cut off when
+    the budget runs out, and a retry is only made if its backoff plus
+    ``DEADLINE_MIN_ATTEMPT`` still fits; ``DeadlineExceeded`` is raised when
+    no attempt can be started.
+    """
+    model = _model_from_url(url)
+    guard = guard_for(model)
+    client = get_client()
 
-            # Non-retryable 4xx (400, 403, 451 …)
-            return None
+    for attempt in range(1, max_retries + 1):
+        if not fits(DEADLINE_MIN_ATTEMPT):
+            raise DeadlineExceeded(label or model)
+        if attempt > 1:
+            UPSTREAM_RETRIES.labels(model, label).inc()
+        try:
+            key = await _acquire(guard)
+        except UpstreamUnavailable:
+            UPSTREAM_ATTEMPTS.labels(model, label, "rejected").inc()
+            raise
+        headers = google_api_headers(key.secret)
 
+        started = time.perf_counter()
+        UPSTREAM_IN_FLIGHT.labels(model).inc()
+        try:
+            # httpx timeouts are per read / write; the deadline bounds the whole attempt.
+            async with asyncio.timeout(remaining()):
+                if body_stream is not None:
+                    resp = await client.post(
+                        url,
+                        headers={**headers, "Content-Length": str(content_length)},
+                        content=body_stream(),
+                        timeout=bounded(timeout),
+                    )
+                else:
+                    resp = await client.post(url, headers=headers, json=json_body, timeout=bounded(timeout))
         except (httpx.TimeoutException, httpx.ConnectError, httpx.HTTPError) as exc:
+            _observe_attempt(model, label, "network", started)
+            guard.on_failure()
             logger.error(
                 "[fetchWithRetry] %s attempt %d/%d — network error: %s",
                 label, attempt, max_retries, exc,
             )
-            if attempt == max_retries:
+            delay = _retry_delay(attempt)
+            if attempt == max_retries or delay is None:
                 raise
             await asyncio.sleep(delay)
-            delay *= 2
+            continue
+        except TimeoutError:
+            _observe_attempt(model, label, "deadline", started)
+            guard.release()
+            raise DeadlineExceeded(label or model) from None
+        except BaseException:
+            guard.release()
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.labels(model).dec()
+            key_pool.release(key)
+
+        status = resp.status_code
+        _observe_attempt(model, label, _outcome(status), started)
+        UPSTREAM_RESPONSE_SIZE.labels(model).observe(len(resp.content))
+
+        if resp.is_success:
+            guard.on_success()
+            return resp.json()
+
+        body_preview = resp.text[:500]
+        logger.error(
+            "[fetchWithRetry] %s attempt %d/%d (%s) — HTTP %d: %s",
+            label, attempt, max_retries, key.name, status, body_preview,
+        )
+
+        if _switch_key(key, status, resp.headers, body_preview):
+            guard.release()  # the key's quota, not the model's health
+            continue
+
+        if status == 429 or status >= 500:
+            retry_after = parse_retry_after(resp.headers.get("retry-after"))
+            if status == 429:
+                guard.on_throttle(retry_after)
+            else:
+                guard.on_failure(retry_after)
+            # If the circuit just opened, the next acquire() fails fast — no point sleeping.
+            if attempt < max_retries and guard.state != OPEN:
+                delay = _retry_delay(attempt, retry_after)
+                if delay is None:
+                    logger.warning("[fetchWithRetry] %s — no time left in the deadline to retry", label)
+                    return None
+                await asyncio.sleep(delay)
+            continue
+
+        # Non-retryable 4xx (400, 403, 451 …) — says nothing about the model's health.
+        guard.release()
+        return None
 
     return None
 
 
+def _retry_delay(attempt: int, retry_after: float | None = None) -> float | None:
+    """Backoff before the next attempt, or None when sleeping it would overrun the deadline."""
+    delay = backoff_delay(attempt, retry_after)
+    return delay if fits(delay + DEADLINE_MIN_ATTEMPT) else None
+
+
+async def _acquire(guard: ModelGuard) -> ApiKey:
+    """Pass the model guard and the global upstream budget, then take a pooled API key."""
+    await guard.acquire()
+    try:
+        await upstream_budget.acquire()
+        return key_pool.acquire()
+    except BaseException:  # rejected, or cancelled while waiting for the budget
+        guard.release()
+        raise
+
+
+def _switch_key(key: ApiKey, status: int, headers: httpx.Headers, body: str) -> bool:
+    """Record a failed response against *key*; True if the call should retry on another key now."""
+    if status == 429:
+        return key_pool.on_throttle(key, parse_retry_after(headers.get("retry-after")))
+    if is_key_rejection(status, body):
+        logger.error("[keys] %s rejected (HTTP %d) — ejecting", key.name, status)
+        return key_pool.on_rejection(key)
+    return False
+
+
+def _outcome(status: int) -> str:
+    if status < 400:
+        return "ok"
+    if status == 429:
+        return "http_429"
+    return "http_5xx" if status >= 500 else "http_4xx"
+
+
+def _observe_attempt(model: str, label: str, outcome: str, started: float) -> None:
+    UPSTREAM_ATTEMPTS.labels(model, label, outcome).inc()
+    UPSTREAM_DURATION.labels(model, label, outcome).observe(time.perf_counter() - started)
+
+
+def _model_from_url(url: str) -> str:
+    """``…/models/<model>:generateContent`` → ``<model>``."""
+    return url.rsplit("/", 1)[-1].split(":", 1)[0]
+
+
 # ── High-level helpers ───────────────────────────────────────────────────
 
 async def generate_text(
@@ -85,14 +241,16 @@ async def generate_text(
     if system_instruction:
         body["systemInstruction"] = system_instruction
     body["generationConfig"] = generation_config or {"responseMimeType": "application/json"}
+    url = gemini_url(GEMINI_MODEL)
 
-    data = await fetch_with_retry(
-        gemini_url(GEMINI_MODEL),
-        json_body=body,
-        timeout=FETCH_TIMEOUT,
-        label=label,
+    data = await _text_flight.do(
+        flight_key(url, body),
+        lambda: fetch_with_retry(url, json_body=body, timeout=FETCH_TIMEOUT, label=label),
     )
+    return _extract_text(data)
 
+
+def _extract_text(data: dict[str, Any] | None) -> str:
     return (
         data.get("candidates", [{}])[0]
         .get("content", {})
@@ -103,6 +261,163 @@ async def generate_text(
     )
 
 
+_INLINE_DATA_PLACEHOLDER = "__KITCHEN_AI_INLINE_DATA__"
+
+
+async def generate_text_with_image(
+    *,
+    prompt: str,
+    image: SpooledImage,
+    generation_config: dict[str, Any] | None = None,
+    label: str = "",
+) -> str:
+    """``generate_text`` for a prompt plus one uploaded image.
+
+    The request JSON is streamed: the base64 image is encoded chunk by chunk
+    between a pre-serialized prefix and suffix, so neither the base64 string
+    nor the full JSON body is ever held in memory.  Not coalesced — the
+    upload's file handle belongs to the calling request.
+    """
+    body = {
+        "contents": [
+            {
+                "parts": [
+                    {"text": prompt},
+                    {"inlineData": {"mimeType": image.mime, "data": _INLINE_DATA_PLACEHOLDER}},
+                ]
+            }
+        ],
+        "generationConfig": generation_config or {"responseMimeType": "application/json"},
+    }
+    encoded = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    prefix, suffix = encoded.split(_INLINE_DATA_PLACEHOLDER.encode("ascii"))
+
+    async def body_stream() -> AsyncIterator[bytes]:
+        yield prefix
+        async for chunk in image.iter_base64():
+            yield chunk
+        yield suffix
+
+    data = await fetch_with_retry(
+        gemini_url(GEMINI_MODEL),
+        body_stream=body_stream,
+        content_length=len(prefix) + image.base64_length + len(suffix),
+        timeout=FETCH_TIMEOUT,
+        label=label,
+    )
+    return _extract_text(data)
+
+
+async def stream_text(
+    *,
+    contents: list[dict[str, Any]],
+    system_instruction: dict[str, Any] | None = None,
+    generation_config: dict[str, Any] | None = None,
+    label: str = "",
+) -> AsyncIterator[str]:
+    """Call Gemini streamGenerateContent and yield text deltas as they arrive.
+
+    Retries 429 / 5xx like ``fetch_with_retry`` until the first byte is
+    received; once streaming has started, errors propagate to the caller.
+    """
+    body: dict[str, Any] = {"contents": contents}
+    if system_instruction:
+        body["systemInstruction"] = system_instruction
+    body["generationConfig"] = generation_config or {"responseMimeType": "application/json"}
+
+    url = gemini_stream_url(GEMINI_MODEL)
+    guard = guard_for(GEMINI_MODEL)
+    client = get_client()
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        if not fits(DEADLINE_MIN_ATTEMPT):
+            raise DeadlineExceeded(label or GEMINI_MODEL)
+        key = await _acquire(guard)
+        request = client.build_request(
+            "POST", url, headers=google_api_headers(key.secret), json=body, timeout=bounded(FETCH_TIMEOUT)
+        )
+        try:
+            async with asyncio.timeout(remaining()):
+                resp = await client.send(request, stream=True)
+        except httpx.HTTPError as exc:
+            key_pool.release(key)
+            guard.on_failure()
+            logger.error(
+                "[streamText] %s attempt %d/%d — network error: %s",
+                label, attempt, MAX_RETRIES, exc,
+            )
+            delay = _retry_delay(attempt)
+            if attempt == MAX_RETRIES or delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        except TimeoutError:
+            key_pool.release(key)
+            guard.release()
+            raise DeadlineExceeded(label or GEMINI_MODEL) from None
+        except BaseException:
+            key_pool.release(key)
+            guard.release()
+            raise
+
+        try:
+            if not resp.is_success:
+                status = resp.status_code
+                body_preview = (await resp.aread())[:500].decode("utf-8", "replace")
+                logger.error(
+                    "[streamText] %s attempt %d/%d (%s) — HTTP %d: %s",
+                    label, attempt, MAX_RETRIES, key.name, status, body_preview,
+                )
+                if _switch_key(key, status, resp.headers, body_preview) and attempt < MAX_RETRIES:
+                    guard.release()
+                    continue
+                if status == 429 or status >= 500:
+                    retry_after = parse_retry_after(resp.headers.get("retry-after"))
+                    if status == 429:
+                        guard.on_throttle(retry_after)
+                    else:
+                        guard.on_failure(retry_after)
+                    if attempt < MAX_RETRIES:
+                        if guard.state != OPEN:
+                            delay = _retry_delay(attempt, retry_after)
+                            if delay is not None:
+                                await asyncio.sleep(delay)
+                                continue
+                        else:
+                            continue
+                else:
+                    guard.release()
+                raise httpx.HTTPStatusError(
+                    f"HTTP {status} from {label or url}", request=request, response=resp,
+                )
+
+            guard.on_success()
+            lines = resp.aiter_lines()
+            while True:
+                # Bounded per line (not across the yield below, which belongs to the consumer).
+                try:
+                    async with asyncio.timeout(remaining()):
+                        line = await anext(lines)
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    raise DeadlineExceeded(label or GEMINI_MODEL) from None
+                if not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[5:])
+                for part in (
+                    chunk.get("candidates", [{}])[0]
+                    .get("content", {})
+                    .get("parts", [])
+                ):
+                    if part.get("text"):
+                        yield part["text"]
+            return
+        finally:
+            await resp.aclose()
+            key_pool.release(key)
+
+
 async def _try_gemini_image(model: str, prompt: str) -> dict[str, str] | None:
     """Try generating an image via Gemini generateContent with IMAGE modality."""
     body = {
@@ -155,20 +470,133 @@ async def _try_imagen(model: str, prompt: str) -> dict[str, str] | None:
 
 
 async def generate_image(prompt: str) -> dict[str, str] | None:
-    """Sequential fallback across image models. Returns {base64, mime} or None."""
-    strategies = [
-        lambda: _try_gemini_image(GEMINI_IMAGE_MODEL, prompt),
-        lambda: _try_imagen(IMAGEN_MODELS[0], prompt),
-        lambda: _try_imagen(IMAGEN_MODELS[1], prompt),
-        lambda: _try_imagen(IMAGEN_MODELS[2], prompt),
+    """Generate an image for *prompt*, coalescing identical concurrent requests."""
+    return await _image_flight.do(flight_key("image", prompt), lambda: _generate_image(prompt))
+
+
+class _ModelStats:
+    """Exponentially weighted success rate and latency for one image model."""
+
+    ALPHA = 0.2
+
+    def __init__(self) -> None:
+        self.attempts = 0
+        self.successes = 0
+        self.success_rate = 1.0  # optimistic prior so untried models keep their slot
+        self.latency = MODEL_TIMEOUT / 3
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        self.attempts += 1
+        self.success_rate += self.ALPHA * ((1.0 if ok else 0.0) - self.success_rate)
+        if ok:
+            self.successes += 1
+            self.latency += self.ALPHA * (elapsed - self.latency)
+
+    def expected_cost(self) -> float:
+        """Expected seconds until this model yields an image."""
+        return self.latency / max(self.success_rate, 0.05)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "successRate": round(self.success_rate, 3),
+            "latency": round(self.latency, 3),
+        }
+
+
+_image_model_stats: dict[str, _ModelStats] = {}
+
+
+def image_model_stats() -> dict[str, Any]:
+    return {
+        "mode": IMAGE_STRATEGY_MODE,
+        "hedgeDelay": IMAGE_HEDGE_DELAY,
+        "models": {model: st.as_dict() for model, st in _image_model_stats.items()},
+    }
+
+
+def _image_strategies() -> list[tuple[str, ImageStrategy]]:
+    strategies: list[tuple[str, ImageStrategy]] = [
+        (GEMINI_IMAGE_MODEL, _try_gemini_image),
+        *((model, _try_imagen) for model in IMAGEN_MODELS),
     ]
+    if IMAGE_ADAPTIVE_ORDER:
+        # Stable sort: ties (e.g. no data yet) keep the configured order.
+        strategies.sort(
+            key=lambda s: _image_model_stats.setdefault(s[0], _ModelStats()).expected_cost()
+        )
+    return strategies
 
-    for try_model in strategies:
-        try:
-            result = await try_model()
-            if result:
-                return result
-        except Exception as exc:
-            logger.error("[generate_image] model error: %s", exc)
+
+async def _timed_attempt(model: str, attempt: ImageStrategy, prompt: str) -> dict[str, str] | None:
+    stats = _image_model_stats.setdefault(model, _ModelStats())
+    started = time.monotonic()
+    try:
+        result = await attempt(model, prompt)
+    except asyncio.CancelledError:
+        IMAGE_MODEL_RESULTS.labels(model, "cancelled").inc()
+        raise  # lost the race — says nothing about the model
+    except UpstreamUnavailable as exc:
+        IMAGE_MODEL_RESULTS.labels(model, "skipped").inc()
+        logger.warning("[generate_image] skipping %s: %s", model, exc)
+        return None
+    except DeadlineExceeded:
+        IMAGE_MODEL_RESULTS.labels(model, "skipped").inc()
+        raise  # the request ran out of time, not the model
+    except Exception as exc:
+        logger.error("[generate_image] %s error: %s", model, exc)
+        result = None
+    stats.record(result is not None, time.monotonic() - started)
+    IMAGE_MODEL_RESULTS.labels(model, "succeeded" if result else "failed").inc()
+    return result
+
+
+async def _generate_image(prompt: str) -> dict[str, str] | None:
+    """Fallback across image models (sequential, hedged or raced). Returns {base64, mime} or None.
+
+    Fallbacks whose typical latency no longer fits the request deadline are
+    not started.
+    """
+    pending = iter(_image_strategies())
+    running: set[asyncio.Task[dict[str, str] | None]] = set()
+    launched = 0
+
+    def launch_next() -> bool:
+        nonlocal launched
+        for model, attempt in pending:
+            latency = _image_model_stats.setdefault(model, _ModelStats()).latency
+            if launched and not fits(latency):
+                IMAGE_MODEL_RESULTS.labels(model, "skipped").inc()
+                logger.warning(
+                    "[generate_image] skipping %s: ~%.1fs does not fit the deadline", model, latency
+                )
+                continue
+            running.add(asyncio.create_task(_timed_attempt(model, attempt, prompt)))
+            launched += 1
+            return True
+        return False
+
+    launch_next()
+    if IMAGE_STRATEGY_MODE == "race":
+        while launch_next():
+            pass
+
+    try:
+        while running:
+            wait = IMAGE_HEDGE_DELAY if IMAGE_STRATEGY_MODE == "hedge" else None
+            done, running = await asyncio.wait(
+                running, timeout=wait, return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                result = task.result()
+                if result:
+                    return result
+            # Either the hedge delay elapsed or the running attempts failed.
+            if IMAGE_STRATEGY_MODE != "race":
+                launch_next()
+    finally:
+        for task in running:
+            task.cancel()
 
     return None
@@ -0,0 +1,125 @@
+"""Content-addressed store for generated images.
+
+Generated pictures are saved once, named by the SHA-256 of their bytes, and
+served from ``GET /api/images/<sha256>.<ext>`` with a strong ETag and an
+immutable ``Cache-Control`` so browsers, nginx and CDNs can keep them.  A
+small prompt index maps a normalized prompt hash to the stored image, so a
+repeat prompt is answered without calling Gemini / Imagen at all.
+
+``LocalImageStore`` (files under ``IMAGE_STORE_DIR``) is the default; other
+backends implement the ``ImageStore`` interface.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from .config import IMAGE_STORE_BACKEND, IMAGE_STORE_DIR
+
+logger = logging.getLogger("kitchen-ai")
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+MIME_TYPES = {ext: mime for mime, ext in EXTENSIONS.items()}
+NAME_RE = re.compile(r"^([0-9a-f]{64})\.(png|jpg|webp)$")
+
+
+def prompt_key(prompt: str) -> str:
+    """Hash a prompt after collapsing whitespace and case-folding it."""
+    return hashlib.sha256(" ".join(prompt.split()).casefold().encode("utf-8")).hexdigest()
+
+
+def image_url(name: str) -> str:
+    return f"/api/images/{name}"
+
+
+class ImageStore:
+    """Backend interface.  ``name`` is always ``<sha256>.<ext>``."""
+
+    async def lookup(self, key: str) -> str | None:
+        """Return the stored image name for prompt *key*, if any."""
+        raise NotImplementedError
+
+    async def put(self, key: str, data: bytes, mime: str) -> str:
+        """Store *data* for prompt *key* and return its name."""
+        raise NotImplementedError
+
+    async def read(self, name: str) -> bytes | None:
+        raise NotImplementedError
+
+    def local_path(self, name: str) -> Path | None:
+        """Filesystem path for zero-copy serving, when the backend has one."""
+        return None
+
+
+class LocalImageStore(ImageStore):
+    """Files under *root*: ``blobs/ab/<sha>.<ext>`` and ``prompts/ab/<key>``."""
+
+    def __init__(self, root: str | os.PathLike[str]) -> None:
+        self.root = Path(root)
+
+    def _blob_path(self, name: str) -> Path:
+        return self.root / "blobs" / name[:2] / name
+
+    def _prompt_path(self, key: str) -> Path:
+        return self.root / "prompts" / key[:2] / key
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _lookup(self, key: str) -> str | None:
+        try:
+            name = self._prompt_path(key).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return name if NAME_RE.match(name) and self._blob_path(name).is_file() else None
+
+    def _put(self, key: str, data: bytes, mime: str) -> str:
+        name = f"{hashlib.sha256(data).hexdigest()}.{EXTENSIONS.get(mime, 'png')}"
+        blob = self._blob_path(name)
+        if not blob.is_file():
+            self._write_atomic(blob, data)
+        self._write_atomic(self._prompt_path(key), name.encode("ascii"))
+        return name
+
+    def _read(self, name: str) -> bytes | None:
+        try:
+            return self._blob_path(name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def lookup(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._lookup, key)
+
+    async def put(self, key: str, data: bytes, mime: str) -> str:
+        return await asyncio.to_thread(self._put, key, data, mime)
+
+    async def read(self, name: str) -> bytes | None:
+        return await asyncio.to_thread(self._read, name)
+
+    def local_path(self, name: str) -> Path | None:
+        path = self._blob_path(name)
+        return path if path.is_file() else None
+
+
+def _build_store() -> ImageStore:
+    if IMAGE_STORE_BACKEND != "local":
+        logger.warning("[image-store] unknown backend %r — using local", IMAGE_STORE_BACKEND)
+    return LocalImageStore(IMAGE_STORE_DIR)
+
+
+image_store = _build_store()
@@ -0,0 +1,212 @@
+"""Vision image preprocessing: downscale, strip metadata and re-encode.
+
+Phone photos are far larger than Gemini needs to list the food in them.
+Before inference we decode the image (first frame for GIFs), apply the EXIF
+orientation, shrink it so its longest edge is at most ``VISION_MAX_EDGE`` and
+re-encode it as JPEG or WebP without any metadata.  Decoding and encoding are
+CPU-bound, so they run in a worker pool rather than on the event loop.
+
+The same pass fingerprints the decoded image for the vision result cache
+(vision_cache.py): an exact hash of its pixels and a 64-bit difference hash
+that survives re-encoding and resizing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from .config import (
+    ALLOWED_MIME_TYPES,
+    VISION_CACHE_ENABLED,
+    VISION_MAX_EDGE,
+    VISION_OUTPUT_FORMAT,
+    VISION_OUTPUT_QUALITY,
+    VISION_PREPROCESS,
+    VISION_PREPROCESS_EXECUTOR,
+    VISION_PREPROCESS_WORKERS,
+)
+from .uploads import SpooledImage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is in requirements.txt
+    Image = None  # type: ignore[assignment]
+    ImageOps = None  # type: ignore[assignment]
+
+logger = logging.getLogger("kitchen-ai")
+
+_PIL_FORMATS = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+_OUTPUT = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+_executor: Executor | None = None
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+class ImageFingerprint(NamedTuple):
+    exact: str  # hash of the decoded pixels (ignores metadata and container)
+    dhash: int  # 64-bit difference hash (perceptual)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if VISION_PREPROCESS_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=VISION_PREPROCESS_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=VISION_PREPROCESS_WORKERS, thread_name_prefix="vision-preprocess",
+            )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _fingerprint(frame: Image.Image) -> ImageFingerprint:
+    exact = hashlib.blake2b(digest_size=16)
+    exact.update(b"%dx%d:" % frame.size)
+    exact.update(frame.tobytes())
+    # dHash: 9x8 grayscale, one bit per horizontally adjacent pair.
+    small = frame.convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return ImageFingerprint(exact.hexdigest(), bits)
+
+
+def _decode(img: Image.Image) -> Image.Image:
+    """Validated, oriented, flattened RGB frame of an open image, shrunk to VISION_MAX_EDGE."""
+    if _PIL_FORMATS.get(img.format or "") not in ALLOWED_MIME_TYPES:
+        raise ImageDecodeError(f"unsupported format {img.format}")
+    img.seek(0)  # GIF / animated WebP: first frame only
+    if img.format == "JPEG":
+        # Let libjpeg decode at a reduced scale — much cheaper than a full decode.
+        img.draft("RGB", (VISION_MAX_EDGE, VISION_MAX_EDGE))
+    frame = ImageOps.exif_transpose(img)
+    if frame.mode in ("RGBA", "LA") or (frame.mode == "P" and "transparency" in frame.info):
+        rgba = frame.convert("RGBA")
+        frame = Image.new("RGB", rgba.size, (255, 255, 255))
+        frame.paste(rgba, mask=rgba.getchannel("A"))
+    elif frame.mode != "RGB":
+        frame = frame.convert("RGB")
+    frame.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE), Image.Resampling.LANCZOS)
+    return frame
+
+
+def _fingerprint_only(data: bytes) -> ImageFingerprint:
+    """Decode and fingerprint *data* without re-encoding it (preprocessing disabled)."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return _fingerprint(_decode(img))
+    except ImageDecodeError:
+        raise
+    except Exception as exc:
+        raise ImageDecodeError(str(exc)) from exc
+
+
+def _downscale(data: bytes) -> tuple[bytes, str, ImageFingerprint]:
+    """Decode *data* and return ``(encoded_bytes, mime, fingerprint)``.  Runs in the worker pool."""
+    pil_format, out_mime = _OUTPUT.get(VISION_OUTPUT_FORMAT, _OUTPUT["jpeg"])
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            frame = _decode(img)
+            out = io.BytesIO()
+            # No exif= / icc_profile= arguments: metadata is dropped.
+            frame.save(out, format=pil_format, quality=VISION_OUTPUT_QUALITY)
+            return out.getvalue(), out_mime, _fingerprint(frame)
+    except ImageDecodeError:
+        raise
+    except Exception as exc:  # Pillow raises a zoo of types for bad input
+        raise ImageDecodeError(str(exc)) from exc
+
+
+async def _run(data: bytes, label: str) -> tuple[bytes, str, ImageFingerprint]:
+    started = time.monotonic()
+    out, mime, fingerprint = await asyncio.get_running_loop().run_in_executor(_get_executor(), _downscale, data)
+    saved = len(data) - len(out)
+    logger.info(
+        "[%s] preprocessed image %d → %d bytes (%+.0f%%, %.0f ms)",
+        label, len(data), len(out),
+        -100.0 * saved / len(data) if data else 0.0,
+        (time.monotonic() - started) * 1000,
+    )
+    return out, mime, fingerprint
+
+
+def enabled() -> bool:
+    return VISION_PREPROCESS and Image is not None
+
+
+def _fingerprints() -> bool:
+    return VISION_CACHE_ENABLED and Image is not None
+
+
+async def _fingerprint_raw(data: bytes) -> ImageFingerprint | None:
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), _fingerprint_only, data)
+    except ImageDecodeError:
+        return None  # not preprocessing: leave validation to the model, as before
+
+
+def _b64decode(image_base64: str) -> bytes:
+    try:
+        return base64.b64decode(image_base64, validate=False)
+    except (binascii.Error, ValueError) as exc:
+        raise ImageDecodeError("invalid base64") from exc
+
+
+async def preprocess_base64(
+    image_base64: str, mime: str, *, label: str = "vision"
+) -> tuple[str, str, ImageFingerprint | None]:
+    """Preprocess a base64 payload; returns ``(base64, mime, fingerprint)``."""
+    if not enabled():
+        if not _fingerprints():
+            return image_base64, mime, None
+        try:
+            raw = _b64decode(image_base64)
+        except ImageDecodeError:
+            return image_base64, mime, None
+        return image_base64, mime, await _fingerprint_raw(raw)
+    out, out_mime, fingerprint = await _run(_b64decode(image_base64), label)
+    return base64.b64encode(out).decode("ascii"), out_mime, fingerprint
+
+
+async def preprocess_upload(
+    image: SpooledImage, *, label: str = "vision-upload"
+) -> tuple[SpooledImage, ImageFingerprint | None]:
+    """Preprocess a spooled upload; returns a new in-memory ``SpooledImage`` and its fingerprint."""
+    if not enabled() and not _fingerprints():
+        return image, None
+    image.file.seek(0)
+    raw = image.file.read()
+    if not enabled():
+        image.file.seek(0)
+        return image, await _fingerprint_raw(raw)
+    out, out_mime, fingerprint = await _run(raw, label)
+    image.close()
+    return SpooledImage(io.BytesIO(out), len(out), hashlib.sha256(out).hexdigest(), out_mime), fingerprint
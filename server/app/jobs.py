@@ -0,0 +1,409 @@
+"""Persistent background queue for image generation jobs.
+
+``POST /api/image/jobs`` returns a job id at once; a bounded pool of worker
+tasks (``IMAGE_JOB_WORKERS`` per process) generates the image and clients
+poll ``GET /api/image/jobs/{id}`` or subscribe to ``…/events`` (SSE).
+
+Jobs live in a SQLite database (``IMAGE_JOBS_DB``, WAL mode), which is also
+the queue: workers claim the highest-priority, oldest runnable job in one
+transaction, so several uvicorn workers on one host share it safely.  A
+running job holds a lease (``IMAGE_JOB_LEASE``); if its process dies the
+lease expires and another worker picks the job up again, so a restart loses
+nothing.  At most one queued/running job exists per normalized prompt —
+submitting the same prompt again returns the existing job.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from .circuit import UpstreamUnavailable
+from .config import (
+    IMAGE_JOB_DEADLINE,
+    IMAGE_JOB_LEASE,
+    IMAGE_JOB_MAX_ATTEMPTS,
+    IMAGE_JOB_POLL_INTERVAL,
+    IMAGE_JOB_RETENTION,
+    IMAGE_JOB_WORKERS,
+    IMAGE_JOBS_DB,
+)
+from .deadline import DeadlineExceeded, deadline_scope
+from .metrics import IMAGE_JOB_QUEUE_DEPTH, IMAGE_JOB_RESULTS, IMAGE_JOB_WAIT
+
+logger = logging.getLogger("kitchen-ai")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+PRIORITIES = {"low": 0, "normal": 1, "high": 2}
+
+JobHandler = Callable[[str], Awaitable[dict[str, Any]]]
+
+_RETRY_DELAY = 5.0  # seconds per attempt before an empty result is retried
+
+
+class NoResult(Exception):
+    """The handler finished without producing anything; retried, then the job fails."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_jobs (
+    id          TEXT PRIMARY KEY,
+    prompt      TEXT NOT NULL,
+    prompt_key  TEXT NOT NULL,
+    priority    INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    run_after   REAL NOT NULL DEFAULT 0,
+    lease_until REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS image_jobs_active
+    ON image_jobs (prompt_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS image_jobs_queue
+    ON image_jobs (status, priority DESC, created_at);
+"""
+
+_COLUMNS = "id, prompt, prompt_key, priority, status, attempts, result, error, created_at, started_at, finished_at"
+
+
+class JobStore:
+    """SQLite-backed job table.  Methods are synchronous; ``JobQueue`` runs them in threads."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM image_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def submit(
+        self, prompt: str, key: str, priority: int, result: dict[str, Any] | None = None
+    ) -> tuple[dict[str, Any], bool]:
+        """Insert a job (already ``done`` when *result* is given); return it and whether it is new.
+
+        A queued/running job for the same prompt is returned instead, its
+        priority raised if the new request asks for more.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM image_jobs WHERE prompt_key = ? AND status IN (?, ?)",
+                    (key, QUEUED, RUNNING),
+                ).fetchone()
+                if row is not None:
+                    if priority > row["priority"]:
+                        self._db.execute("UPDATE image_jobs SET priority = ? WHERE id = ?", (priority, row["id"]))
+                    self._db.execute("COMMIT")
+                    return {**dict(row), "priority": max(priority, row["priority"])}, False
+                job = {
+                    "id": uuid.uuid4().hex,
+                    "prompt": prompt,
+                    "prompt_key": key,
+                    "priority": priority,
+                    "status": DONE if result is not None else QUEUED,
+                    "attempts": 0,
+                    "result": json.dumps(result) if result is not None else None,
+                    "error": None,
+                    "created_at": now,
+                    "started_at": now if result is not None else None,
+                    "finished_at": now if result is not None else None,
+                }
+                self._db.execute(
+                    f"INSERT INTO image_jobs ({_COLUMNS}) VALUES "
+                    "(:id, :prompt, :prompt_key, :priority, :status, :attempts, :result, :error, "
+                    ":created_at, :started_at, :finished_at)",
+                    job,
+                )
+                self._db.execute("COMMIT")
+                return job, True
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def claim(self) -> dict[str, Any] | None:
+        """Take the next runnable job (or one whose worker's lease ran out)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM image_jobs "
+                    "WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?) "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE image_jobs SET status = ?, attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?), lease_until = ? WHERE id = ?",
+                    (RUNNING, now, now + IMAGE_JOB_LEASE, row["id"]),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return {**dict(row), "status": RUNNING, "attempts": row["attempts"] + 1}
+
+    def finish(self, job_id: str, *, result: dict[str, Any] | None = None, error: str | None = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE image_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ?",
+                (FAILED if error else DONE, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE image_jobs SET status = ?, run_after = ?, lease_until = NULL WHERE id = ?",
+                (QUEUED, time.time() + delay, job_id),
+            )
+
+    def position(self, job: dict[str, Any]) -> int:
+        """Number of queued jobs ahead of *job*."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM image_jobs WHERE status = ? AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (QUEUED, job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()[0]
+
+    def depth(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM image_jobs WHERE status IN (?, ?) GROUP BY status", (QUEUED, RUNNING)
+            ).fetchall()
+        return {QUEUED: 0, RUNNING: 0, **{status: count for status, count in rows}}
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM image_jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, older_than)
+            ).rowcount
+
+
+def public_view(job: dict[str, Any], position: int | None = None) -> dict[str, Any]:
+    """The job as returned to clients."""
+    view: dict[str, Any] = {
+        "jobId": job["id"],
+        "status": job["status"],
+        "priority": next(name for name, value in PRIORITIES.items() if value == job["priority"]),
+        "createdAt": job["created_at"],
+        "startedAt": job["started_at"],
+        "finishedAt": job["finished_at"],
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "error": job["error"],
+    }
+    if position is not None:
+        view["queuePosition"] = position
+    return view
+
+
+class JobQueue:
+    def __init__(self, path: str, *, workers: int) -> None:
+        self.path = path
+        self.workers = workers
+        self.store: JobStore | None = None
+        self._handler: JobHandler | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._changed = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+        self.deduped = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    async def start(self, handler: JobHandler) -> None:
+        self._handler = handler
+        try:
+            self.store = await asyncio.to_thread(JobStore, self.path)
+        except (OSError, sqlite3.Error) as exc:
+            logger.error("[jobs] job store %s unavailable — image jobs disabled: %s", self.path, exc)
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+        await self._update_depth()
+        logger.info("[jobs] %d image workers on %s", self.workers, self.path)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    @property
+    def available(self) -> bool:
+        return self.store is not None
+
+    # ── Client side ──────────────────────────────────────────────────────
+
+    async def submit(
+        self, prompt: str, key: str, priority: int, result: dict[str, Any] | None = None
+    ) -> tuple[dict[str, Any], bool]:
+        job, created = await asyncio.to_thread(self._require_store().submit, prompt, key, priority, result)
+        IMAGE_JOB_RESULTS.labels("submitted" if created else "deduped").inc()
+        if not created:
+            self.deduped += 1
+        self._notify()
+        await self._update_depth()
+        return job, created
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        return await asyncio.to_thread(self._require_store().get, job_id)
+
+    async def view(self, job: dict[str, Any]) -> dict[str, Any]:
+        position = await asyncio.to_thread(self._require_store().position, job) if job["status"] == QUEUED else None
+        return public_view(job, position)
+
+    async def wait_for_change(self, timeout: float) -> None:
+        """Return when a job changes in this process, or after *timeout* (other processes)."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _require_store(self) -> JobStore:
+        if self.store is None:
+            raise RuntimeError("job queue is not running")
+        return self.store
+
+    # ── Workers ──────────────────────────────────────────────────────────
+
+    async def _worker(self, index: int) -> None:
+        store = self._require_store()
+        while True:
+            try:
+                job = await asyncio.to_thread(store.claim)
+            except sqlite3.Error as exc:
+                logger.error("[jobs] claim failed: %s", exc)
+                job = None
+            if job is None:
+                await self.wait_for_change(IMAGE_JOB_POLL_INTERVAL)
+                continue
+            if job["attempts"] == 1:
+                IMAGE_JOB_WAIT.observe(time.time() - job["created_at"])
+            self._notify()
+            try:
+                await self._update_depth()
+                if job["attempts"] > IMAGE_JOB_MAX_ATTEMPTS:
+                    # Reclaimed after its lease ran out too often (e.g. it keeps killing the worker).
+                    await self._fail(store, job, "Image request failed")
+                else:
+                    await self._run(store, job)
+                self._notify()
+                await self._update_depth()
+            except sqlite3.Error as exc:
+                # The job keeps its lease and is reclaimed when it runs out; the worker goes on.
+                logger.error("[jobs] %s: job store error: %s", job["id"], exc)
+
+    async def _run(self, store: JobStore, job: dict[str, Any]) -> None:
+        assert self._handler is not None
+        try:
+            # Finish (or give up) well inside the lease, so no other worker picks it up meanwhile.
+            with deadline_scope(IMAGE_JOB_DEADLINE):
+                result = await self._handler(job["prompt"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back for the next worker / restart.
+            await asyncio.shield(asyncio.to_thread(store.requeue, job["id"]))
+            raise
+        except UpstreamUnavailable as exc:
+            if job["attempts"] < IMAGE_JOB_MAX_ATTEMPTS:
+                logger.warning("[jobs] %s deferred %.1fs: %s", job["id"], exc.retry_after, exc)
+                await asyncio.to_thread(store.requeue, job["id"], exc.retry_after)
+                IMAGE_JOB_RESULTS.labels("deferred").inc()
+                return
+            await self._fail(store, job, "AI service is temporarily unavailable, please retry later")
+            return
+        except DeadlineExceeded as exc:
+            if job["attempts"] < IMAGE_JOB_MAX_ATTEMPTS:
+                logger.warning("[jobs] %s timed out, requeued: %s", job["id"], exc)
+                await asyncio.to_thread(store.requeue, job["id"])
+                IMAGE_JOB_RESULTS.labels("deferred").inc()
+                return
+            await self._fail(store, job, "Image request timed out")
+            return
+        except NoResult as exc:
+            if job["attempts"] < IMAGE_JOB_MAX_ATTEMPTS:
+                logger.warning("[jobs] %s produced nothing, retrying: %s", job["id"], exc)
+                await asyncio.to_thread(store.requeue, job["id"], _RETRY_DELAY * job["attempts"])
+                IMAGE_JOB_RESULTS.labels("deferred").inc()
+                return
+            await self._fail(store, job, "Image generation failed")
+            return
+        except Exception as exc:
+            logger.error("[jobs] %s failed: %s", job["id"], exc)
+            await self._fail(store, job, "Image request failed")
+            return
+        await asyncio.to_thread(store.finish, job["id"], result=result)
+        self.completed += 1
+        IMAGE_JOB_RESULTS.labels("done").inc()
+
+    async def _fail(self, store: JobStore, job: dict[str, Any], error: str) -> None:
+        await asyncio.to_thread(store.finish, job["id"], error=error)
+        self.failed += 1
+        IMAGE_JOB_RESULTS.labels("failed").inc()
+
+    async def _housekeeping(self) -> None:
+        while True:
+            await asyncio.sleep(max(60.0, IMAGE_JOB_RETENTION / 24))
+            try:
+                removed = await asyncio.to_thread(self._require_store().purge, time.time() - IMAGE_JOB_RETENTION)
+                if removed:
+                    logger.info("[jobs] purged %d finished jobs", removed)
+            except sqlite3.Error as exc:
+                logger.error("[jobs] purge failed: %s", exc)
+
+    async def _update_depth(self) -> dict[str, int]:
+        depth = await asyncio.to_thread(self._require_store().depth)
+        for status, count in depth.items():
+            IMAGE_JOB_QUEUE_DEPTH.labels(status).set(count)
+        return depth
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "available": self.available,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "deduped": self.deduped,
+        }
+
+
+image_jobs = JobQueue(IMAGE_JOBS_DB, workers=IMAGE_JOB_WORKERS)
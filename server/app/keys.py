@@ -0,0 +1,128 @@
+"""Pool of Gemini API keys with least-loaded routing and temporary ejection.
+
+Configured with ``GEMINI_API_KEYS`` (falls back to the single
+``GEMINI_API_KEY``).  Every upstream attempt takes the healthy key with the
+fewest calls in flight.  A key is ejected:
+
+* on 429 — for its ``Retry-After`` (or ``KEY_QUOTA_COOLDOWN``), but only while
+  another key is healthy; with one key left the model's ``ModelGuard``
+  handles backoff exactly as with a single key;
+* on an auth / key-level rejection (401, invalid / blocked / suspended key) —
+  for ``KEY_AUTH_EJECT_SECONDS``.
+
+Keys are only ever reported by name (``key1``…) and a fingerprint (a sha256
+prefix, to match against a known key), never by any part of the key itself.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any
+
+from .circuit import UpstreamUnavailable
+from .config import GEMINI_API_KEYS, KEY_AUTH_EJECT_SECONDS, KEY_QUOTA_COOLDOWN
+from .metrics import API_KEY_EJECTIONS, API_KEY_REQUESTS, API_KEY_THROTTLES
+
+# Error reasons Google returns when the key itself (not the request) is bad.
+_KEY_REJECTION_MARKERS = (
+    "API_KEY_INVALID",
+    "API key not valid",
+    "API key expired",
+    "API_KEY_SERVICE_BLOCKED",
+    "CONSUMER_SUSPENDED",
+    "SERVICE_DISABLED",
+)
+
+
+def is_key_rejection(status: int, body: str) -> bool:
+    return status == 401 or (status in (400, 403) and any(m in body for m in _KEY_REJECTION_MARKERS))
+
+
+class ApiKey:
+    def __init__(self, index: int, secret: str) -> None:
+        self.name = f"key{index}"
+        self.secret = secret
+        self.fingerprint = hashlib.sha256(secret.encode("utf-8")).hexdigest()[:8]
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.quota_resets = 0
+        self.ejected_until = 0.0
+        self.reason = ""
+        self.last_used = 0.0
+
+    def healthy(self, now: float) -> bool:
+        if self.ejected_until and now >= self.ejected_until:
+            if self.reason == "quota":
+                self.quota_resets += 1  # cooldown over: the quota window has (presumably) reset
+            self.ejected_until = 0.0
+            self.reason = ""
+        return not self.ejected_until
+
+    def as_dict(self, now: float) -> dict[str, Any]:
+        ejected = not self.healthy(now)
+        return {
+            "fingerprint": self.fingerprint,
+            "state": "ejected" if ejected else "healthy",
+            "reason": self.reason or None,
+            "ejectedFor": round(self.ejected_until - now, 1) if ejected else 0,
+            "inFlight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "quotaResets": self.quota_resets,
+        }
+
+
+class KeyPool:
+    def __init__(self, secrets: list[str]) -> None:
+        self.keys = [ApiKey(i, secret) for i, secret in enumerate(secrets, start=1)]
+
+    def _healthy(self, now: float, exclude: ApiKey | None = None) -> list[ApiKey]:
+        return [k for k in self.keys if k is not exclude and k.healthy(now)]
+
+    def acquire(self) -> ApiKey:
+        """Take the least-loaded healthy key, or raise ``UpstreamUnavailable``."""
+        now = time.monotonic()
+        healthy = self._healthy(now)
+        if not healthy:
+            wait = min((k.ejected_until - now for k in self.keys), default=KEY_AUTH_EJECT_SECONDS)
+            raise UpstreamUnavailable("api-keys", max(wait, 0.0))
+        key = min(healthy, key=lambda k: (k.in_flight, k.last_used))
+        key.in_flight += 1
+        key.requests += 1
+        key.last_used = now
+        API_KEY_REQUESTS.labels(key.name).inc()
+        return key
+
+    def release(self, key: ApiKey) -> None:
+        key.in_flight -= 1
+
+    def _eject(self, key: ApiKey, seconds: float, reason: str) -> None:
+        key.ejected_until = time.monotonic() + seconds
+        key.reason = reason
+        API_KEY_EJECTIONS.labels(key.name, reason).inc()
+
+    def on_throttle(self, key: ApiKey, retry_after: float | None) -> bool:
+        """Record a 429; True if *key* was ejected and the call can move to another key."""
+        key.throttled += 1
+        API_KEY_THROTTLES.labels(key.name).inc()
+        if not self._healthy(time.monotonic(), exclude=key):
+            return False
+        self._eject(key, retry_after or KEY_QUOTA_COOLDOWN, "quota")
+        return True
+
+    def on_rejection(self, key: ApiKey) -> bool:
+        """Record an auth / key-level rejection; True if another key is available."""
+        key.rejected += 1
+        self._eject(key, KEY_AUTH_EJECT_SECONDS, "auth")
+        return bool(self._healthy(time.monotonic()))
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        now = time.monotonic()
+        return {key.name: key.as_dict(now) for key in self.keys}
+
+
+key_pool = KeyPool(GEMINI_API_KEYS)
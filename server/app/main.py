@@ -3,19 +3,43 @@
 from __future__ import annotations
 
 import logging
+import math
 import sys
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from starlette.middleware.base import BaseHTTPMiddleware
 
-from .config import BODY_LIMIT, CORS_ORIGIN, GEMINI_API_KEY, GOOGLE_AI_BASE, PORT
-from .routes import limiter, router
+from .config import (
+    BODY_LIMIT,
+    CORS_ORIGIN,
+    GEMINI_API_KEY,
+    GOOGLE_AI_BASE,
+    IMAGE_REQUEST_DEADLINE,
+    PORT,
+    REQUEST_DEADLINE,
+    TEXT_BODY_LIMIT,
+)
+from .admission import admission
+from .cache import response_cache
+from .circuit import UpstreamUnavailable
+from .compression import CompressionMiddleware
+from .deadline import DeadlineExceeded
+from .diagnostics import gc_timer, loop_monitor, mark_draining, mark_started
+from .imaging import shutdown_executor
+from .jobs import image_jobs
+from .middleware import AdmissionMiddleware, BodySizeLimitMiddleware, RequestLifecycleMiddleware
+from .metrics import MetricsMiddleware, mark_worker_dead, metrics_endpoint
+from .ratelimit import limiter, upstream_budget
+from .routes import router, run_image_job, warm_dish
+from .structured import MalformedOutput
+from .upstream import close_client, start_client
+from .warmer import warmer
 
 # ── Logging ──────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -25,28 +49,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger("kitchen-ai")
 
+# ── Lifespan ─────────────────────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if not GEMINI_API_KEY:
+        logger.warning("GEMINI_API_KEY is not set — AI endpoints will fail")
+    if "googleapis.com" not in GOOGLE_AI_BASE:
+        logger.info("Gemini API proxied via: %s", GOOGLE_AI_BASE)
+    else:
+        logger.info("Gemini API: direct access to googleapis.com")
+
+    gc_timer.install()
+    await loop_monitor.start()
+    await start_client()
+    await image_jobs.start(run_image_job)
+    await warmer.start(warm_dish)
+    mark_started()
+    logger.info("API server listening on %d", PORT)
+    try:
+        yield
+    finally:
+        mark_draining()
+        await warmer.stop()
+        await image_jobs.stop()
+        await close_client()
+        await response_cache.close()
+        await upstream_budget.close()
+        shutdown_executor()
+        await loop_monitor.stop()
+        gc_timer.uninstall()
+        mark_worker_dead()
+
 # ── App ──────────────────────────────────────────────────────────────────
-app = FastAPI(title="Kitchen AI API", version="0.1.0")
+app = FastAPI(title="Kitchen AI API", version="0.1.0", lifespan=lifespan)
 
-# Body size limit middleware (equivalent to express.json({ limit: '12mb' }))
-class LimitBodySizeMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > BODY_LIMIT:
-            return JSONResponse(
-                status_code=413,
-                content={"error": "Request body too large"},
-            )
-        return await call_next(request)
+# Body size limits: photos only on /api/vision*, small JSON everywhere else
+app.add_middleware(BodySizeLimitMiddleware, default=TEXT_BODY_LIMIT, limits={"/api/vision": BODY_LIMIT})
 
-app.add_middleware(LimitBodySizeMiddleware)
+# Admission control: per-endpoint concurrency caps, shed with 503 before the body is read
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Per-request deadline (admission waits count against it); upstream work is cancelled when the client disconnects
+app.add_middleware(
+    RequestLifecycleMiddleware,
+    default=REQUEST_DEADLINE,
+    deadlines={"/api/image": IMAGE_REQUEST_DEADLINE, "/api/bundle": IMAGE_REQUEST_DEADLINE},
+)
 
 # Rate limiter
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# GZip compression (equivalent to express compression())
-app.add_middleware(GZipMiddleware, minimum_size=500)
+# br / zstd / gzip by Accept-Encoding; large bodies are compressed off the event loop
+app.add_middleware(CompressionMiddleware)
 
 # CORS
 if CORS_ORIGIN:
@@ -63,6 +118,10 @@ else:
         "Set CORS_ORIGIN env var for cross-origin access."
     )
 
+# Prometheus metrics — outermost, so timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 # Validation error handler — return structured JSON matching Express behaviour
 @app.exception_handler(RequestValidationError)
 async def validation_error_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
@@ -70,7 +129,7 @@ async def validation_error_handler(request: Request, exc: RequestValidationError
     errors = exc.errors()
     if errors:
         msg = errors[0].get("msg", "Validation error")
-        field = ".".join(str(l) for l in errors[0].get("loc", []) if l != "body")
+        field = ".".join(str(l) for l in errors[0].get("loc", []) if l not in ("body", "query"))
         detail = f"{field}: {msg}" if field else msg
     else:
         detail = "Validation error"
@@ -79,6 +138,34 @@ async def validation_error_handler(request: Request, exc: RequestValidationError
         content={"error": detail},
     )
 
+# Upstream circuit open / quota exhausted — tell the client when to come back
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable) -> JSONResponse:
+    logger.warning("Upstream unavailable: %s", exc)
+    return JSONResponse(
+        status_code=503,
+        content={"error": "AI service is temporarily unavailable, please retry later"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+# Model answered, but not with JSON matching the response schema (after repair)
+@app.exception_handler(MalformedOutput)
+async def malformed_output_handler(request: Request, exc: MalformedOutput) -> JSONResponse:
+    logger.error("Malformed model output: %s", exc)
+    return JSONResponse(
+        status_code=502,
+        content={"error": "AI model returned an invalid response, please retry"},
+    )
+
+# Request deadline ran out before the upstream answered
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded) -> JSONResponse:
+    logger.warning("Deadline exceeded on %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=504,
+        content={"error": "AI service took too long to respond, please retry"},
+    )
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception) -> JSONResponse:
@@ -90,14 +177,3 @@ async def global_exception_handler(request: Request, exc: Exception) -> JSONResp
 
 # Routes
 app.include_router(router)
-
-# Startup log
-@app.on_event("startup")
-async def _startup() -> None:
-    if not GEMINI_API_KEY:
-        logger.warning("GEMINI_API_KEY is not set — AI endpoints will fail")
-    if "googleapis.com" not in GOOGLE_AI_BASE:
-        logger.info("Gemini API proxied via: %s", GOOGLE_AI_BASE)
-    else:
-        logger.info("Gemini API: direct access to googleapis.com")
-    logger.info("API server listening on %d", PORT)
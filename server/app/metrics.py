@@ -0,0 +1,283 @@
+"""Prometheus metrics and the ``/metrics`` endpoint.
+
+Works with a single process or with ``uvicorn --workers N``: when
+``PROMETHEUS_MULTIPROC_DIR`` is set, every worker writes its samples to
+mmap-backed files in that directory and ``/metrics`` aggregates them, so any
+worker can answer a scrape.  The directory must be emptied before the server
+starts.
+
+Recording a sample is a local, uncontended operation (each worker runs a
+single event-loop thread); nothing here takes a cross-process lock on the
+request path.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Latency buckets spanning cache hits (ms) to slow image generations (~1 min).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120)
+SIZE_BUCKETS = tuple(2 ** i for i in range(8, 26, 2))  # 256 B … 32 MB
+PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# ── HTTP ─────────────────────────────────────────────────────────────────
+HTTP_REQUEST_DURATION = Histogram(
+    "kitchen_http_request_duration_seconds",
+    "Time to serve a request, by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "kitchen_http_requests_in_flight",
+    "Requests currently being served.",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_SIZE = Histogram(
+    "kitchen_http_request_size_bytes", "Request body size.", ["route"], buckets=SIZE_BUCKETS,
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "kitchen_http_response_size_bytes", "Response body size.", ["route"], buckets=SIZE_BUCKETS,
+)
+HTTP_CLIENT_DISCONNECTS = Counter(
+    "kitchen_http_client_disconnects_total",
+    "Requests whose client went away mid-flight; their upstream work was cancelled.",
+    ["route"],
+)
+HTTP_COMPRESSED_RESPONSES = Counter(
+    "kitchen_http_compressed_responses_total",
+    "Compressed responses by encoding and mode (inline, offloaded = worker thread, "
+    "cached = precompressed cache entry, skipped = sample did not compress).",
+    ["encoding", "mode"],
+)
+HTTP_COMPRESSION_SAVED = Counter(
+    "kitchen_http_compression_saved_bytes_total", "Response bytes saved by compression.", ["encoding"],
+)
+
+# ── Upstream (Gemini / Imagen) ───────────────────────────────────────────
+UPSTREAM_DURATION = Histogram(
+    "kitchen_upstream_request_duration_seconds",
+    "Duration of one upstream attempt.",
+    ["model", "label", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ATTEMPTS = Counter(
+    "kitchen_upstream_attempts_total",
+    "Upstream attempts by outcome (ok, http_4xx, http_429, http_5xx, network, rejected).",
+    ["model", "label", "outcome"],
+)
+UPSTREAM_RETRIES = Counter(
+    "kitchen_upstream_retries_total", "Upstream attempts that were retries.", ["model", "label"],
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "kitchen_upstream_requests_in_flight",
+    "Upstream requests currently awaiting a response.",
+    ["model"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_RESPONSE_SIZE = Histogram(
+    "kitchen_upstream_response_size_bytes",
+    "Upstream response body size.",
+    ["model"],
+    buckets=SIZE_BUCKETS,
+)
+API_KEY_REQUESTS = Counter(
+    "kitchen_api_key_requests_total", "Upstream attempts routed to each pooled API key.", ["key"],
+)
+API_KEY_THROTTLES = Counter(
+    "kitchen_api_key_throttles_total", "429 responses per pooled API key.", ["key"],
+)
+API_KEY_EJECTIONS = Counter(
+    "kitchen_api_key_ejections_total", "Temporary key ejections (quota, auth).", ["key", "reason"],
+)
+UPSTREAM_BUDGET_WAITS = Counter(
+    "kitchen_upstream_budget_total",
+    "Upstream calls held back by the global budget (delayed, rejected).",
+    ["outcome"],
+)
+IMAGE_MODEL_RESULTS = Counter(
+    "kitchen_image_model_results_total",
+    "Image strategy outcomes per model (succeeded, failed, cancelled, skipped).",
+    ["model", "result"],
+)
+
+# ── Parsing / caching / coalescing ───────────────────────────────────────
+JSON_PARSE_DURATION = Histogram(
+    "kitchen_json_parse_duration_seconds",
+    "Time spent cleaning and parsing model JSON output.",
+    ["endpoint"],
+    buckets=PARSE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "kitchen_cache_lookups_total", "Response cache lookups.", ["endpoint", "result"],
+)
+IMAGE_JOB_QUEUE_DEPTH = Gauge(
+    "kitchen_image_jobs",
+    "Image jobs waiting or being generated (shared job store).",
+    ["status"],
+    multiprocess_mode="max",
+)
+IMAGE_JOB_WAIT = Histogram(
+    "kitchen_image_job_wait_seconds",
+    "Time image jobs spent queued before a worker picked them up.",
+    buckets=LATENCY_BUCKETS,
+)
+IMAGE_JOB_RESULTS = Counter(
+    "kitchen_image_job_events_total",
+    "Image job lifecycle events (submitted, deduped, deferred, done, failed).",
+    ["result"],
+)
+VISION_CACHE_LOOKUPS = Counter(
+    "kitchen_vision_cache_lookups_total",
+    "Vision result cache lookups (exact, similar, miss).",
+    ["result"],
+)
+VISION_CACHE_SAVED = Counter(
+    "kitchen_vision_cache_saved_seconds_total",
+    "Upstream vision time saved by cache hits (estimated from recent misses).",
+)
+VISION_CACHE_DISTANCE = Histogram(
+    "kitchen_vision_cache_distance_bits",
+    "Hamming distance of the nearest cached photo per perceptual lookup.",
+    buckets=(0, 1, 2, 4, 6, 8, 10, 12, 16, 24, 32),
+)
+SIMILARITY_SCORE = Histogram(
+    "kitchen_similarity_best_score",
+    "Best near-duplicate similarity found per fuzzy cache lookup (for tuning thresholds).",
+    ["endpoint"],
+    buckets=(0.2, 0.3, 0.4, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0),
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "kitchen_admission_in_flight",
+    "Requests admitted and being served, by admission class.",
+    ["class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "kitchen_admission_queued",
+    "Requests waiting for admission, by admission class.",
+    ["class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "kitchen_admission_wait_seconds",
+    "Time admitted requests waited in the admission queue.",
+    ["class"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_SHED = Counter(
+    "kitchen_admission_shed_total",
+    "Requests shed with 503 by admission control (queue_full, deadline, timeout).",
+    ["class", "reason"],
+)
+WARMER_RESULTS = Counter(
+    "kitchen_warmer_answers_total",
+    "Cache warmer answers by endpoint and result (generated, fresh = already cached, failed).",
+    ["endpoint", "result"],
+)
+COALESCED_CALLS = Counter(
+    "kitchen_coalesced_calls_total",
+    "Single-flight calls by role (leader = upstream call made, follower = collapsed).",
+    ["flight", "role"],
+)
+
+# ── Runtime ──────────────────────────────────────────────────────────────
+EVENT_LOOP_LAG = Histogram(
+    "kitchen_event_loop_lag_seconds",
+    "How late the event loop ran a timer (time spent blocked by other work).",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+GC_PAUSE = Histogram(
+    "kitchen_gc_pause_seconds",
+    "Garbage collector pauses by generation.",
+    ["generation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+
+# ── Exposition ───────────────────────────────────────────────────────────
+
+async def metrics_endpoint(request: Request) -> Response:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        from prometheus_client import REGISTRY
+
+        data = generate_latest(REGISTRY)
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges on shutdown (multiprocess mode)."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# ── Middleware ───────────────────────────────────────────────────────────
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, sizes and in-flight counts."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state: dict[str, Any] = {"status": 500, "in": 0, "out": 0}
+        # The route template is only known after routing, so the in-flight
+        # gauge is keyed on the path prefix (low cardinality) instead.
+        flight_key = "/api" if scope["path"].startswith("/api") else "other"
+        HTTP_IN_FLIGHT.labels(flight_key).inc()
+
+        async def counting_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                state["in"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_IN_FLIGHT.labels(flight_key).dec()
+            route = route_template(scope)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(state["status"])).observe(
+                time.perf_counter() - started
+            )
+            HTTP_REQUEST_SIZE.labels(route).observe(state["in"])
+            HTTP_RESPONSE_SIZE.labels(route).observe(state["out"])
@@ -0,0 +1,234 @@
+"""Pure ASGI middleware (no stream wrapping by Starlette)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .admission import AdmissionController, Overloaded
+from .deadline import deadline_scope
+from .metrics import HTTP_CLIENT_DISCONNECTS, route_template
+
+logger = logging.getLogger("kitchen-ai")
+
+_BODYLESS_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "DELETE"})
+_TOO_LARGE_BODY = b'{"error":"Request body too large"}'
+_OVERLOADED_BODY = b'{"error":"Server is busy, please retry later"}'
+
+
+class BodyTooLarge(Exception):
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"request body exceeds {limit} bytes")
+        self.limit = limit
+
+
+def _match_prefix(table: list[tuple[str, float]], path: str, default: float) -> float:
+    for prefix, value in table:
+        if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+            return value
+    return default
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over a per-route limit with 413.
+
+    ``Content-Length`` is checked up front; chunked bodies are counted as they
+    arrive and reading stops at the first chunk past the limit, so an
+    oversized upload is never buffered.  *limits* maps path prefixes to byte
+    limits (longest prefix wins); other paths get *default*.
+    """
+
+    def __init__(self, app: ASGIApp, *, default: int, limits: dict[str, int] | None = None) -> None:
+        self.app = app
+        self.default = default
+        self.limits = sorted((limits or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def limit_for(self, path: str) -> int:
+        return int(_match_prefix(self.limits, path, self.default))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in _BODYLESS_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await _reject(send)
+                    return
+                break
+
+        state = {"received": 0, "exceeded": False, "started": False, "replaced": False}
+
+        async def limited_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["exceeded"] = True
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if state["exceeded"] and not state["started"]:
+                # The app turned BodyTooLarge into its own error (FastAPI answers
+                # 400 for any body read failure); answer 413 instead.
+                if message["type"] == "http.response.start":
+                    state["started"] = state["replaced"] = True
+                    await _reject(send)
+                return
+            if state["replaced"]:
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except BodyTooLarge:
+            if not state["started"]:
+                await _reject(send)
+
+
+class RequestLifecycleMiddleware:
+    """Deadline budget per request, and cancellation when the client goes away.
+
+    Every API request runs inside ``deadline_scope`` (*deadlines* maps
+    path prefixes to seconds, longest prefix wins; other paths get *default*),
+    which the upstream calls read.  Once the body has been read (at once for
+    requests without one), a watcher keeps listening for ``http.disconnect``; when it arrives the request's
+    task is cancelled, which aborts in-flight httpx calls and backoff sleeps
+    instead of finishing work nobody will read.  Such requests are recorded
+    with status 499.
+    """
+
+    def __init__(self, app: ASGIApp, *, default: float, deadlines: dict[str, float] | None = None) -> None:
+        self.app = app
+        self.default = default
+        self.deadlines = sorted((deadlines or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def deadline_for(self, path: str) -> float:
+        return _match_prefix(self.deadlines, path, self.default)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        assert task is not None
+        state = {"body_done": False, "started": False, "finished": False, "disconnected": False}
+        disconnected = asyncio.Event()
+        watcher: asyncio.Task[None] | None = None
+
+        async def watch() -> None:
+            message = await receive()
+            while message["type"] != "http.disconnect":
+                message = await receive()
+            state["disconnected"] = True
+            disconnected.set()
+            if not state["finished"]:
+                task.cancel()
+
+        async def watched_receive() -> Message:
+            nonlocal watcher
+            if state["body_done"]:
+                # The watcher owns receive() now; relay the disconnect to the app.
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                state["body_done"] = True
+                watcher = asyncio.create_task(watch())
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        if scope["method"] in _BODYLESS_METHODS:
+            state["body_done"] = True
+            watcher = asyncio.create_task(watch())
+
+        try:
+            with deadline_scope(self.deadline_for(scope["path"])):
+                await self.app(scope, watched_receive, tracking_send)
+        except asyncio.CancelledError:
+            # Ours (client gone) unless someone else cancelled the task too.
+            if not state["disconnected"] or task.uncancel() > 0:
+                raise
+            HTTP_CLIENT_DISCONNECTS.labels(route_template(scope)).inc()
+            logger.info("[disconnect] %s %s — client went away, work cancelled", scope["method"], scope["path"])
+            if not state["started"]:
+                # Never delivered (the server drops it); lets the metrics record 499.
+                await send({"type": "http.response.start", "status": 499, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            state["finished"] = True
+            if watcher is not None:
+                watcher.cancel()
+
+
+class AdmissionMiddleware:
+    """Admit API requests through ``AdmissionController`` before routing.
+
+    Shed requests get 503 with ``Retry-After`` without their body being read.
+    """
+
+    def __init__(self, app: ASGIApp, *, controller: AdmissionController) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = None
+        if scope["type"] == "http":
+            name = self.controller.class_for(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(name)
+        except Overloaded as exc:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(_OVERLOADED_BODY)).encode("latin-1")),
+                        (b"retry-after", str(math.ceil(exc.retry_after)).encode("latin-1")),
+                        (b"connection", b"close"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": _OVERLOADED_BODY})
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name, time.monotonic() - started)
+
+
+async def _reject(send: Send) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_TOO_LARGE_BODY)).encode("latin-1")),
+                # The rest of the body was never read; don't reuse the connection.
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": _TOO_LARGE_BODY})
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import re
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, field_validator
 
@@ -153,7 +153,48 @@ class ImageRequest(BaseModel):
         return v
 
 
-# ── Response models (for documentation) ─────────────────────────────────
+class ImageJobRequest(ImageRequest):
+    priority: Literal["low", "normal", "high"] = "normal"
+
+
+BUNDLE_SECTIONS: tuple[str, ...] = ("recipe", "drinks", "mealPlan", "image")
+
+
+class BundleRequest(BaseModel):
+    title: str
+    language: Optional[str] = "en"
+    diet: Optional[str] = "none"
+    imagePrompt: Optional[str] = None
+    sections: Optional[list[str]] = None  # default: all of BUNDLE_SECTIONS
+
+    @field_validator("title")
+    @classmethod
+    def validate_title(cls, v: str) -> str:
+        t = sanitize_text(v)
+        if not t or len(t) > MAX_TITLE_LENGTH:
+            raise ValueError(f"title is required (max {MAX_TITLE_LENGTH} chars)")
+        return t
+
+    @field_validator("imagePrompt")
+    @classmethod
+    def validate_image_prompt(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None:
+            return sanitize_text(str(v))[:MAX_PROMPT_LENGTH]
+        return v
+
+    @field_validator("sections")
+    @classmethod
+    def validate_sections(cls, v: Optional[list[str]]) -> Optional[list[str]]:
+        if v is not None:
+            unknown = [s for s in v if s not in BUNDLE_SECTIONS]
+            if unknown or not v:
+                raise ValueError(f"sections must be a non-empty subset of {', '.join(BUNDLE_SECTIONS)}")
+            return list(dict.fromkeys(v))
+        return v
+
+
+# ── Response models ──────────────────────────────────────────────────────
+# Also the source of the Gemini ``responseSchema`` (see structured.py).
 
 class Nutrition(BaseModel):
     calories: int | float
@@ -0,0 +1,211 @@
+"""Request limits shared across workers and replicas.
+
+* Per-client limits (``@limiter.limit("30/minute")``) are slowapi's, backed by
+  ``RATE_LIMIT_STORAGE_URL``: ``redis://…`` shares the counters between every
+  worker and replica (sliding-window counter, one Lua round trip per check);
+  empty or ``fake://`` keeps them in-process.
+* ``upstream_budget`` caps the calls *all* processes together make to Google
+  (``UPSTREAM_GLOBAL_RATE``), on top of the per-worker ``ModelGuard``.  It is
+  a GCRA reservation on the same store: one round trip reserves the next slot
+  and says how long to wait for it.
+* ``client_ip`` keys the per-client limits on the real client address behind
+  Traefik, trusting ``X-Forwarded-For`` only as far as ``TRUSTED_PROXIES``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import logging
+import time
+from typing import Any
+
+from slowapi import Limiter
+from starlette.requests import Request
+
+from .circuit import UpstreamUnavailable
+from .config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_STORAGE_URL,
+    RATE_LIMIT_STRATEGY,
+    TRUSTED_PROXIES,
+    UPSTREAM_GLOBAL_BURST,
+    UPSTREAM_GLOBAL_RATE,
+    UPSTREAM_MAX_QUEUE_WAIT,
+)
+from .deadline import bounded
+from .metrics import UPSTREAM_BUDGET_WAITS
+
+logger = logging.getLogger("kitchen-ai")
+
+KEY_PREFIX = "kai:rl"
+_SHARED = RATE_LIMIT_STORAGE_URL.startswith(("redis://", "rediss://", "redis+unix://"))
+
+
+# ── Client address ───────────────────────────────────────────────────────
+
+def _parse_networks(spec: str) -> list[ipaddress.IPv4Network | ipaddress.IPv6Network]:
+    networks = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item:
+            networks.append(ipaddress.ip_network(item, strict=False))
+    return networks
+
+
+_trusted = _parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted)
+
+
+def client_ip(request: Request) -> str:
+    """The first untrusted hop, reading ``X-Forwarded-For`` right to left.
+
+    Entries left of the first untrusted hop were written by the client and
+    can be forged, so they are never used.
+    """
+    peer = request.client.host if request.client else "127.0.0.1"
+    if not _is_trusted(peer):
+        return peer
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+# ── Per-client limits (slowapi) ──────────────────────────────────────────
+
+limiter = Limiter(
+    key_func=client_ip,
+    enabled=RATE_LIMIT_ENABLED,
+    storage_uri=RATE_LIMIT_STORAGE_URL if _SHARED else "memory://",
+    strategy=RATE_LIMIT_STRATEGY,
+    key_prefix=KEY_PREFIX,
+    # Redis down: log it and keep limiting per process rather than failing requests.
+    in_memory_fallback_enabled=_SHARED,
+    swallow_errors=True,
+)
+
+
+# ── Global upstream budget (GCRA) ────────────────────────────────────────
+
+# KEYS[1] = bucket, ARGV = interval, burst, max_wait (seconds).
+# Returns the wait before the reserved slot, or -retry_after when the wait
+# would exceed max_wait (nothing is reserved then).  Uses the server clock so
+# replicas with skewed clocks share one timeline.
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval
+local wait = new_tat - now - burst * interval
+if wait > max_wait then return tostring(-wait) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+if wait < 0 then wait = 0 end
+return tostring(wait)
+"""
+
+
+class MemoryGcra:
+    """In-process GCRA with the same semantics as the Redis script."""
+
+    def __init__(self) -> None:
+        self._tat: dict[str, float] = {}
+
+    async def reserve(self, key: str, interval: float, burst: int, max_wait: float) -> float:
+        now = time.monotonic()
+        new_tat = max(self._tat.get(key, now), now) + interval
+        wait = new_tat - now - burst * interval
+        if wait > max_wait:
+            return -wait
+        self._tat[key] = new_tat
+        return max(wait, 0.0)
+
+    async def close(self) -> None:
+        self._tat.clear()
+
+
+class RedisGcra:
+    def __init__(self, url: str) -> None:
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.from_url(url)
+        self._script = self.client.register_script(_GCRA_SCRIPT)
+
+    async def reserve(self, key: str, interval: float, burst: int, max_wait: float) -> float:
+        result = await self._script(keys=[key], args=[interval, burst, max_wait])
+        return float(result)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class UpstreamBudget:
+    """Cluster-wide cap on upstream calls per second (0 disables it)."""
+
+    def __init__(self, store: Any, *, rate: float, burst: int) -> None:
+        self.store = store
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.delayed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def acquire(self) -> None:
+        """Wait for a slot in the global budget, or raise ``UpstreamUnavailable``."""
+        if self.rate <= 0:
+            return
+        try:
+            wait = await self.store.reserve(
+                f"{KEY_PREFIX}:upstream", 1.0 / self.rate, self.burst, bounded(UPSTREAM_MAX_QUEUE_WAIT)
+            )
+        except Exception as exc:
+            # The per-worker ModelGuard still applies; don't fail calls over a store outage.
+            self.errors += 1
+            logger.error("[ratelimit] upstream budget check failed: %s", exc)
+            return
+        if wait < 0:
+            self.rejected += 1
+            UPSTREAM_BUDGET_WAITS.labels("rejected").inc()
+            raise UpstreamUnavailable("upstream-budget", -wait)
+        if wait > 0:
+            self.delayed += 1
+            UPSTREAM_BUDGET_WAITS.labels("delayed").inc()
+            await asyncio.sleep(wait)
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "storage": "redis" if isinstance(self.store, RedisGcra) else "memory",
+            "upstreamRate": self.rate,
+            "upstreamBurst": self.burst,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def _build_budget() -> UpstreamBudget:
+    store: Any = MemoryGcra()
+    if _SHARED:
+        try:
+            store = RedisGcra(RATE_LIMIT_STORAGE_URL)
+        except Exception as exc:
+            logger.error("[ratelimit] shared upstream budget disabled: %s", exc)
+    return UpstreamBudget(store, rate=UPSTREAM_GLOBAL_RATE, burst=UPSTREAM_GLOBAL_BURST)
+
+
+upstream_budget = _build_budget()
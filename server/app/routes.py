@@ -1,34 +1,98 @@
 """API route handlers — mirrors the Express endpoints 1:1."""
 
+import asyncio
+import base64
+import hashlib
+import hmac
 import json
 import logging
-import resource
-from typing import Any, Optional
+import threading
+import time
+from typing import Annotated, Any, AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import quote, urlencode
 
-from fastapi import APIRouter, Body, HTTPException, Request
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.datastructures import UploadFile
 
-from .config import MAX_PROMPT_LENGTH, MAX_TITLE_LENGTH
-from .google_ai import generate_image, generate_text
+from .admission import admission
+from .cache import cache_key, response_cache
+from .circuit import UpstreamUnavailable, circuit_stats
+from .compression import compression_stats, etag_for_encoding, negotiate, strip_etag_encoding
+from .deadline import DeadlineExceeded
+from .diagnostics import (
+    ProfilerBusy,
+    folded,
+    readiness,
+    runtime_stats,
+    sample_stacks,
+    tracemalloc_report,
+    tracemalloc_start,
+    tracemalloc_stop,
+)
+from .config import (
+    COMPRESSION_MIN_SIZE,
+    DIAGNOSTICS_TOKEN,
+    GET_CACHE_MAX_AGE,
+    GET_CACHE_STALE,
+    IMAGE_INLINE_BASE64,
+    IMAGE_JOB_POLL_INTERVAL,
+    MAX_PROMPT_LENGTH,
+    MAX_TITLE_LENGTH,
+    PROFILE_MAX_SECONDS,
+)
+from .google_ai import (
+    coalescing_stats,
+    generate_image,
+    generate_text,
+    generate_text_with_image,
+    image_model_stats,
+    stream_text,
+)
+from .image_store import MIME_TYPES, NAME_RE, image_store, image_url, prompt_key
+from .imaging import ImageDecodeError, ImageFingerprint, preprocess_base64, preprocess_upload
+from .jobs import FINISHED, PRIORITIES, NoResult, image_jobs
+from .keys import key_pool
+from .metrics import HTTP_COMPRESSED_RESPONSES
+from .ratelimit import limiter, upstream_budget
+from .similarity import similarity_index
+from .uploads import SpooledImage, UploadError, inspect_file, spool_stream
+from .upstream import pool_stats
+from .vision_cache import vision_index, vision_key
+from .warmer import warmer
 from .models import (
+    BUNDLE_SECTIONS,
+    BundleRequest,
+    DrinkSuggestion,
     DrinksRequest,
+    ImageJobRequest,
     ImageRequest,
+    MealPlanItem,
     MealPlanRequest,
+    Recipe,
     RecipeDetailRequest,
     RecipeRequest,
     RecipesRequest,
     VisionRequest,
     sanitize_text,
 )
+from .streaming import (
+    NDJSON_MEDIA_TYPE,
+    SSE_MEDIA_TYPE,
+    STREAM_HEADERS,
+    JsonArrayStreamParser,
+    frame_items,
+    ndjson_line,
+    sse_event,
+    wants_sse,
+)
 from .config import GEMINI_API_KEY
+from .structured import MalformedOutput, coerce, dump_json, generate_typed, generation_config
 
 logger = logging.getLogger("kitchen-ai")
 
-router = APIRouter(prefix="/api")
-
-# The limiter instance is created here but attached to the app in main.py
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(prefix="/api", default_response_class=ORJSONResponse)
 
 
 def _require_api_key() -> None:
@@ -44,80 +108,493 @@ def _safe_diet(diet: Optional[str]) -> str:
     return sanitize_text(str(diet or "none"))[:30]
 
 
-def _clean_json_text(raw: str) -> str:
-    """Strip markdown code fences that models sometimes add."""
-    return raw.replace("```json", "").replace("```", "").strip()
+def _cache_bypassed(request: Request) -> bool:
+    return request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes")
+
+
+async def _lookup(endpoint: str, body: BaseModel, key: str) -> tuple[Optional[bytes], dict[str, str]]:
+    """Exact cache hit, else a near-duplicate one (see similarity.py); plus X-Cache headers."""
+    hit = await response_cache.get(key)
+    if hit is not None:
+        return hit, {"X-Cache": "HIT"}
+    match = similarity_index.find(endpoint, body)
+    if match is None:
+        return None, {}
+    similar_key, score = match
+    hit = await response_cache.get(similar_key, count=False)
+    if hit is None:
+        similarity_index.discard(similar_key)  # expired / evicted from the cache
+        return None, {}
+    return hit, {"X-Cache": "SIMILAR", "X-Cache-Similarity": f"{score:.3f}"}
+
+
+async def _store(endpoint: str, body: BaseModel, key: str, content: bytes) -> None:
+    await response_cache.set(key, content)
+    similarity_index.add(endpoint, body, key)
+
+
+async def _cached_response(request: Request, content: bytes, headers: dict[str, str]) -> Response:
+    """JSON *content* that is (or is now) in the response cache, sent precompressed when accepted."""
+    encoding = negotiate(request.headers.get("accept-encoding", ""))
+    if encoding is not None and len(content) >= COMPRESSION_MIN_SIZE:
+        content = await response_cache.encoded(content, encoding)
+        headers = {**headers, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        HTTP_COMPRESSED_RESPONSES.labels(encoding, "cached").inc()
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+# Dish-title endpoints whose popularity the cache warmer tracks (warmer.py).
+_WARMED_ENDPOINTS = frozenset({"recipe-detail", "drinks", "meal-plan"})
+
+
+def _record_dish(endpoint: str, body: BaseModel) -> None:
+    if endpoint in _WARMED_ENDPOINTS:
+        warmer.record(getattr(body, "title", None), getattr(body, "diet", None))
+
+
+async def _cached(
+    request: Request,
+    endpoint: str,
+    body: BaseModel,
+    produce: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Serve *endpoint* from the response cache, or call *produce* and store its result.
+
+    Send ``X-Cache-Bypass: 1`` to skip the lookup (the fresh result is still stored).
+    """
+    content, headers, cached = await _cached_content(request, endpoint, body, produce)
+    if not cached:
+        return Response(content=content, media_type="application/json", headers=headers)
+    return await _cached_response(request, content, headers)
+
+
+async def _cached_content(
+    request: Request,
+    endpoint: str,
+    body: BaseModel,
+    produce: Callable[[], Awaitable[Any]],
+) -> tuple[bytes, dict[str, str], bool]:
+    """JSON bytes of the answer, X-Cache headers, and whether the answer is (now) cached."""
+    key = cache_key(endpoint, body)
+    _record_dish(endpoint, body)
+    bypass = _cache_bypassed(request)
+    if bypass:
+        response_cache.bypasses += 1
+    else:
+        hit, headers = await _lookup(endpoint, body, key)
+        if hit is not None:
+            return hit, headers, True
+
+    result = await produce()
+    # Serialized once: the same bytes are cached and sent.
+    content = dump_json(result)
+    headers = {"X-Cache": "BYPASS" if bypass else "MISS"}
+    if not result:
+        return content, headers, False
+    await _store(endpoint, body, key, content)
+    return content, headers, True
+
+
+async def _cached_value(
+    endpoint: str,
+    body: BaseModel,
+    produce: Callable[[], Awaitable[Any]],
+    *,
+    bypass: bool,
+) -> Any:
+    """Like ``_cached`` but returns the value as plain JSON data, for composite responses."""
+    key = cache_key(endpoint, body)
+    _record_dish(endpoint, body)
+    if bypass:
+        response_cache.bypasses += 1
+    else:
+        hit, _ = await _lookup(endpoint, body, key)
+        if hit is not None:
+            return json.loads(hit)
+
+    result = await produce()
+    content = dump_json(result)
+    if result:
+        await _store(endpoint, body, key, content)
+    # Decoded from the same bytes as a hit, so streamed sections frame alike.
+    return json.loads(content)
+
+
+# ── Cacheable GET variants ───────────────────────────────────────────────
+# GET /api/recipe-detail, /drinks, /meal-plan and /image take the POST body
+# as query parameters so nginx (see nginx.conf) or a CDN can cache them.
+# Each request has one canonical URL (other spellings are redirected to it).
+# Cached answers carry a strong ETag hashed from their bytes; an answer that
+# was not cached (empty / failed) is sent with no-store and no ETag.
+
+_GET_CACHE_CONTROL = (
+    f"public, max-age={GET_CACHE_MAX_AGE}, "
+    f"stale-while-revalidate={GET_CACHE_STALE}, stale-if-error={GET_CACHE_STALE}"
+)
+
+
+def _canonical_query(body: BaseModel) -> str:
+    """Query string of the validated *body*: fields sorted by name, unset and default values omitted."""
+    fields = type(body).model_fields
+    params = sorted(
+        (name, value)
+        for name, value in body.model_dump().items()
+        if value is not None and value != fields[name].default
+    )
+    return urlencode(params, quote_via=quote)
+
+
+def _content_etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """``If-None-Match`` against *etag*: weak comparison, any content coding of the same bytes."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*" or tag == etag or strip_etag_encoding(tag) == etag:
+            return True
+    return False
+
+
+def _not_modified(request: Request, headers: dict[str, str]) -> Optional[Response]:
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+async def _cached_get(
+    request: Request,
+    endpoint: str,
+    body: BaseModel,
+    produce: Callable[[], Awaitable[Any]],
+) -> Response:
+    """``_cached`` for a GET variant: canonical URL, ETag / 304 and shared-cache headers."""
+    canonical = _canonical_query(body)
+    if request.url.query != canonical:
+        return RedirectResponse(
+            f"{request.url.path}?{canonical}", status_code=301, headers={"Cache-Control": _GET_CACHE_CONTROL}
+        )
+    content, cache_headers, cached = await _cached_content(request, endpoint, body, produce)
+    if not cached:
+        return Response(
+            content=content, media_type="application/json", headers={**cache_headers, "Cache-Control": "no-store"}
+        )
+    headers = {"ETag": _content_etag(content), "Cache-Control": _GET_CACHE_CONTROL}
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+    response = await _cached_response(request, content, {**cache_headers, **headers})
+    encoding = response.headers.get("content-encoding")
+    if encoding:
+        response.headers["ETag"] = etag_for_encoding(headers["ETag"], encoding)
+    return response
+
+
+async def _stream_cached(
+    request: Request,
+    endpoint: str,
+    body: BaseModel,
+    item_type: type[BaseModel],
+    generate: Callable[[], AsyncIterator[str]],
+    error_message: str,
+) -> StreamingResponse:
+    """Stream the elements of a JSON-array answer as SSE events or NDJSON lines.
+
+    Each element is validated as *item_type*; invalid ones are dropped.
+    Shares cache entries with the non-streaming *endpoint*: a hit replays the
+    cached array at once, and a completed stream is stored for both variants.
+    """
+    key = cache_key(endpoint, body)
+    sse = wants_sse(request.headers.get("accept", ""))
+    bypass = _cache_bypassed(request)
+    if bypass:
+        response_cache.bypasses += 1
+    hit, hit_headers = (None, {}) if bypass else await _lookup(endpoint, body, key)
+
+    async def items() -> AsyncIterator[Any]:
+        if hit is not None:
+            for item in json.loads(hit):
+                yield item
+            return
+
+        parser = JsonArrayStreamParser()
+        collected: list[Any] = []
+        try:
+            async for delta in generate():
+                for item in parser.feed(delta):
+                    valid = coerce(item_type, item)
+                    if valid is None:
+                        logger.warning("[/api/%s/stream] Dropped invalid item", endpoint)
+                        continue
+                    collected.append(valid)
+                    yield valid
+        except Exception as exc:
+            logger.error("[/api/%s/stream] Error: %s", endpoint, exc)
+            raise
+        if collected:
+            await _store(endpoint, body, key, dump_json(collected))
+
+    return StreamingResponse(
+        frame_items(items(), sse=sse, error_message=error_message),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers={**STREAM_HEADERS, "X-Cache": "BYPASS" if bypass else "MISS", **hit_headers},
+    )
 
 
 # ── Health ───────────────────────────────────────────────────────────────
 
 @router.get("/health")
 async def health() -> dict[str, Any]:
-    usage = resource.getrusage(resource.RUSAGE_SELF)
-    rss_mb = usage.ru_maxrss / (1024 * 1024)  # macOS returns bytes; Linux returns KB
-    import platform
-    if platform.system() == "Linux":
-        rss_mb = usage.ru_maxrss / 1024  # Linux ru_maxrss is in KB
     return {
         "ok": True,
-        "memory": {
-            "rss": f"{rss_mb:.1f} MB",
-        },
+        **runtime_stats(),
+        "upstream": pool_stats(),
+        "admission": admission.stats(),
+        "cache": response_cache.stats(),
+        "compression": compression_stats(),
+        "similarity": similarity_index.stats(),
+        "visionCache": vision_index.stats(),
+        "coalescing": coalescing_stats(),
+        "imageModels": image_model_stats(),
+        "circuits": circuit_stats(),
+        "apiKeys": key_pool.stats(),
+        "rateLimit": upstream_budget.stats(),
+        "imageJobs": image_jobs.stats(),
+        "warmer": warmer.stats(),
     }
 
 
+@router.get("/health/live")
+async def health_live() -> dict[str, Any]:
+    """Liveness probe: the event loop is running (nothing else is checked)."""
+    return {"ok": True}
+
+
+@router.get("/health/ready")
+async def health_ready() -> Response:
+    """Readiness probe: 503 while starting, draining or with a lagging event loop."""
+    ready, checks = readiness()
+    return ORJSONResponse({"ready": ready, "checks": checks}, status_code=200 if ready else 503)
+
+
+# ── Diagnostics ──────────────────────────────────────────────────────────
+# Off unless DIAGNOSTICS_TOKEN is set; see diagnostics.py.
+
+def _require_diagnostics_token(request: Request) -> None:
+    if not DIAGNOSTICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), DIAGNOSTICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+    interval: float = Query(0.005, ge=0.001, le=1.0),
+) -> Response:
+    """Sample the event loop's stack; folded stacks, most frequent first."""
+    _require_diagnostics_token(request)
+    try:
+        stacks, samples = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds, interval)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    logger.info("[diagnostics] profiled the event loop for %.1fs (%d samples)", seconds, samples)
+    return Response(
+        content=folded(stacks),
+        media_type="text/plain",
+        headers={"X-Profile-Samples": str(samples), "Cache-Control": "no-store"},
+    )
+
+
+@router.post("/debug/tracemalloc")
+async def debug_tracemalloc_start(request: Request) -> dict[str, Any]:
+    """Start tracing allocations (costs memory and CPU until stopped)."""
+    _require_diagnostics_token(request)
+    return {"tracing": True, "started": tracemalloc_start()}
+
+
+@router.get("/debug/tracemalloc")
+async def debug_tracemalloc(request: Request, limit: int = Query(25, ge=1, le=200)) -> dict[str, Any]:
+    """Top allocation sites, and their growth since the previous call."""
+    _require_diagnostics_token(request)
+    return await asyncio.to_thread(tracemalloc_report, limit)
+
+
+@router.delete("/debug/tracemalloc")
+async def debug_tracemalloc_stop(request: Request) -> dict[str, Any]:
+    _require_diagnostics_token(request)
+    return {"tracing": False, "stopped": tracemalloc_stop()}
+
+
 # ── Vision ───────────────────────────────────────────────────────────────
 
+def _vision_prompt(language: Optional[str]) -> str:
+    target = _target_lang(language)
+    return f"List all food items in this photo, in {target}."
+
+
+async def _vision_cached(
+    request: Request,
+    language: Optional[str],
+    fingerprint: Optional[ImageFingerprint],
+    produce: Callable[[], Awaitable[Optional[list[str]]]],
+) -> Response:
+    """Serve a photo's ingredient list from the vision cache (see vision_cache.py), or call *produce*.
+
+    Looks up the exact pixel hash first, then the nearest perceptual hash.
+    """
+    target = _target_lang(language)
+    key = vision_key(target, fingerprint.exact) if fingerprint is not None else None
+    bypass = _cache_bypassed(request)
+    if key is not None and not bypass:
+        hit = await response_cache.get(key, count=False)
+        result, headers = "exact", {"X-Cache": "HIT"}
+        if hit is None:
+            match = vision_index.nearest(target, fingerprint)
+            if match is not None:
+                similar_key, distance = match
+                hit = await response_cache.get(similar_key, count=False)
+                if hit is None:
+                    vision_index.discard(similar_key)  # expired / evicted from the cache
+                result, headers = "similar", {"X-Cache": "SIMILAR", "X-Cache-Distance": str(distance)}
+        if hit is not None:
+            vision_index.record(result)
+            return await _cached_response(request, hit, headers)
+
+    started = time.monotonic()
+    ingredients = await produce()
+    content = dump_json({"ingredients": ingredients or []})
+    headers = {"X-Cache": "BYPASS" if bypass else "MISS"}
+    if key is not None:
+        if not bypass:
+            vision_index.record("miss", time.monotonic() - started)
+        if ingredients:
+            await response_cache.set(key, content)
+            vision_index.add(target, fingerprint)
+            return await _cached_response(request, content, headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
 @router.post("/vision")
 @limiter.limit("30/minute")
-async def vision(request: Request, body: VisionRequest = Body()) -> dict[str, Any]:
+async def vision(request: Request, body: VisionRequest = Body()) -> Response:
     _require_api_key()
-    target = _target_lang(body.language)
-    prompt = f"List all food items in this photo. Return JSON array of strings in {target}."
+    prompt = _vision_prompt(body.language)
+    try:
+        image_base64, mime_type, fingerprint = await preprocess_base64(body.imageBase64, body.mimeType)
+    except ImageDecodeError as exc:
+        logger.error("[/api/vision] Undecodable image: %s", exc)
+        raise HTTPException(status_code=400, detail="Invalid image")
 
+    contents = [{"parts": [{"text": prompt}, {"inlineData": {"mimeType": mime_type, "data": image_base64}}]}]
     try:
-        raw = await generate_text(
-            contents=[
-                {
-                    "parts": [
-                        {"text": prompt},
-                        {"inlineData": {"mimeType": body.mimeType, "data": body.imageBase64}},
-                    ]
-                }
-            ],
-            label="vision",
+        return await _vision_cached(
+            request,
+            body.language,
+            fingerprint,
+            lambda: generate_typed(
+                "vision",
+                list[str],
+                lambda config: generate_text(contents=contents, generation_config=config, label="vision"),
+            ),
         )
-        parsed = json.loads(raw) if raw else []
-        return {"ingredients": parsed if isinstance(parsed, list) else []}
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
     except Exception as exc:
         logger.error("[/api/vision] Error: %s", exc)
         raise HTTPException(status_code=500, detail="Vision request failed")
 
 
+async def _receive_image(request: Request) -> tuple[SpooledImage, Optional[str]]:
+    """Spool a multipart (field ``image``) or raw-body upload; return it and the form language."""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form(max_files=1, max_fields=4)
+            upload = form.get("image")
+            if not isinstance(upload, UploadFile):
+                raise HTTPException(status_code=400, detail="image: field required")
+            language = form.get("language")
+            image = await asyncio.to_thread(inspect_file, upload.file)
+            return image, language if isinstance(language, str) else None
+        return await spool_stream(request.stream()), None
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+@router.post("/vision/upload")
+@limiter.limit("30/minute")
+async def vision_upload(request: Request, language: Optional[str] = "en") -> Response:
+    """Binary variant of /vision: multipart/form-data or a raw image/* body.
+
+    The image type is sniffed from its magic bytes; ``language`` may be sent
+    as a form field or query parameter.
+    """
+    _require_api_key()
+    image, form_language = await _receive_image(request)
+    try:
+        image, fingerprint = await preprocess_upload(image)
+    except ImageDecodeError as exc:
+        image.close()
+        logger.error("[/api/vision/upload] Undecodable image: %s", exc)
+        raise HTTPException(status_code=400, detail="Invalid image")
+
+    language = form_language or language
+    try:
+        return await _vision_cached(
+            request,
+            language,
+            fingerprint,
+            lambda: generate_typed(
+                "vision",
+                list[str],
+                lambda config: generate_text_with_image(
+                    prompt=_vision_prompt(language),
+                    image=image,
+                    generation_config=config,
+                    label="vision-upload",
+                ),
+            ),
+        )
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[/api/vision/upload] Error: %s", exc)
+        raise HTTPException(status_code=500, detail="Vision request failed")
+    finally:
+        image.close()
+
+
 # ── Single recipe ────────────────────────────────────────────────────────
 
-@router.post("/recipe")
+@router.post("/recipe", response_model=Recipe)
 @limiter.limit("30/minute")
-async def recipe(request: Request, body: RecipeRequest = Body()) -> dict[str, Any]:
+async def recipe(request: Request, body: RecipeRequest = Body()) -> Response:
     _require_api_key()
     target = _target_lang(body.language)
-    system_prompt = (
-        f"You are a world-class chef. Create a gourmet recipe in {target}. Return ONLY JSON. "
-        'Schema: { "title": "string", "description": "string", "prepTime": "string", "difficulty": "string", '
-        '"nutrition": { "calories": number, "protein": "string", "fat": "string", "carbs": "string" },'
-        '"ingredientsList": ["string"], "instructions": ["string"] }'
-    )
+    system_prompt = f"You are a world-class chef. Create a gourmet recipe in {target}."
 
-    try:
-        raw = await generate_text(
-            contents=[{"parts": [{"text": f"Ingredients: {', '.join(body.ingredients)}"}]}],
-            system_instruction={"parts": [{"text": system_prompt}]},
-            label="recipe",
+    async def produce() -> Recipe:
+        result = await generate_typed(
+            "recipe",
+            Recipe,
+            lambda config: generate_text(
+                contents=[{"parts": [{"text": f"Ingredients: {', '.join(body.ingredients)}"}]}],
+                system_instruction={"parts": [{"text": system_prompt}]},
+                generation_config=config,
+                label="recipe",
+            ),
         )
-        if not raw:
+        if result is None:
             raise HTTPException(status_code=502, detail="Empty response from AI model")
-        return json.loads(_clean_json_text(raw))
-    except HTTPException:
+        return result
+
+    try:
+        return await _cached(request, "recipe", body, produce)
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
         raise
     except Exception as exc:
         logger.error("[/api/recipe] Error: %s", exc)
@@ -126,127 +603,236 @@ async def recipe(request: Request, body: RecipeRequest = Body()) -> dict[str, An
 
 # ── Multiple recipes ────────────────────────────────────────────────────
 
-@router.post("/recipes")
-@limiter.limit("30/minute")
-async def recipes(request: Request, body: RecipesRequest = Body()) -> list[dict[str, Any]]:
-    _require_api_key()
+def _recipes_request(body: RecipesRequest) -> dict[str, Any]:
     target = _target_lang(body.language)
     safe_diet = _safe_diet(body.diet)
     system_prompt = (
-        "Michelin Chef. Create 3 distinct recipes based on the ingredients provided. "
-        "Respond ONLY with a JSON array of 3 objects.\n"
-        'Schema for each object: { "title": "str", "description": "str", "prepTime": "str", "difficulty": "str", '
-        '"nutrition": {"calories": num, "protein": "str", "fat": "str", "carbs": "str"}, '
-        f'"ingredientsList": ["str"], "instructions": ["str"] }} in {target}. Diet: {safe_diet}.'
+        "Michelin Chef. Create 3 distinct recipes based on the ingredients provided, "
+        f"in {target}. Diet: {safe_diet}."
     )
+    return {
+        "contents": [{"parts": [{"text": f"Ingredients: {', '.join(body.ingredients)}"}]}],
+        "system_instruction": {"parts": [{"text": system_prompt}]},
+    }
 
-    try:
-        raw = await generate_text(
-            contents=[{"parts": [{"text": f"Ingredients: {', '.join(body.ingredients)}"}]}],
-            system_instruction={"parts": [{"text": system_prompt}]},
-            label="recipes",
+
+@router.post("/recipes", response_model=list[Recipe])
+@limiter.limit("30/minute")
+async def recipes(request: Request, body: RecipesRequest = Body()) -> Response:
+    _require_api_key()
+
+    async def produce() -> list[Recipe]:
+        result = await generate_typed(
+            "recipes",
+            list[Recipe],
+            lambda config: generate_text(**_recipes_request(body), generation_config=config, label="recipes"),
         )
-        if not raw:
+        if result is None:
             raise HTTPException(status_code=502, detail="Empty response from AI model")
-        parsed = json.loads(_clean_json_text(raw))
-        return parsed if isinstance(parsed, list) else [parsed]
-    except HTTPException:
+        return result
+
+    try:
+        return await _cached(request, "recipes", body, produce)
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
         raise
     except Exception as exc:
         logger.error("[/api/recipes] Error: %s", exc)
         raise HTTPException(status_code=500, detail="Recipes request failed")
 
 
-# ── Recipe detail ────────────────────────────────────────────────────────
-
-@router.post("/recipe-detail")
+@router.post("/recipes/stream")
 @limiter.limit("30/minute")
-async def recipe_detail(request: Request, body: RecipeDetailRequest = Body()) -> dict[str, Any]:
+async def recipes_stream(request: Request, body: RecipesRequest = Body()) -> StreamingResponse:
+    """Streaming variant of /recipes: one recipe per SSE event / NDJSON line."""
     _require_api_key()
+    return await _stream_cached(
+        request,
+        "recipes",
+        body,
+        Recipe,
+        lambda: stream_text(
+            **_recipes_request(body), generation_config=generation_config(list[Recipe]), label="recipes-stream"
+        ),
+        "Recipes request failed",
+    )
+
+
+# ── Recipe detail ────────────────────────────────────────────────────────
+
+async def _recipe_detail(body: RecipeDetailRequest) -> Recipe:
     target = _target_lang(body.language)
     safe_diet = _safe_diet(body.diet)
     system_prompt = (
-        "Expert Chef. Create a detailed recipe for the dish described by the user. "
-        "Respond ONLY valid JSON object with schema: "
-        '{ "title": "str", "description": "str", "prepTime": "str", "difficulty": "str", '
-        '"nutrition": {"calories": num, "protein": "str", "fat": "str", "carbs": "str"}, '
-        f'"ingredientsList": ["str"], "instructions": ["str"] }} in {target}. Diet: {safe_diet}.'
+        "Expert Chef. Create a detailed recipe for the dish described by the user, "
+        f"in {target}. Diet: {safe_diet}."
     )
-
-    try:
-        raw = await generate_text(
+    result = await generate_typed(
+        "recipe-detail",
+        Recipe,
+        lambda config: generate_text(
             contents=[{"parts": [{"text": f"Recipe for: {body.title}"}]}],
             system_instruction={"parts": [{"text": system_prompt}]},
+            generation_config=config,
             label="recipe-detail",
-        )
-        if not raw:
-            raise HTTPException(status_code=502, detail="Empty response from AI model")
-        parsed = json.loads(_clean_json_text(raw))
-        return parsed if parsed else {}
-    except HTTPException:
+        ),
+    )
+    if result is None:
+        raise HTTPException(status_code=502, detail="Empty response from AI model")
+    return result
+
+
+@router.post("/recipe-detail", response_model=Recipe)
+@limiter.limit("30/minute")
+async def recipe_detail(request: Request, body: RecipeDetailRequest = Body()) -> Response:
+    _require_api_key()
+    try:
+        return await _cached(request, "recipe-detail", body, lambda: _recipe_detail(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
         raise
     except Exception as exc:
         logger.error("[/api/recipe-detail] Error: %s", exc)
         raise HTTPException(status_code=500, detail="Recipe detail request failed")
 
 
-# ── Meal plan ────────────────────────────────────────────────────────────
-
-@router.post("/meal-plan")
+@router.get("/recipe-detail", response_model=Recipe)
 @limiter.limit("30/minute")
-async def meal_plan(request: Request, body: MealPlanRequest = Body()) -> list[dict[str, Any]]:
+async def recipe_detail_get(request: Request, body: Annotated[RecipeDetailRequest, Query()]) -> Response:
+    """Cacheable GET variant of /recipe-detail (``?title=…&language=…&diet=…``)."""
     _require_api_key()
+    try:
+        return await _cached_get(request, "recipe-detail", body, lambda: _recipe_detail(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[GET /api/recipe-detail] Error: %s", exc)
+        raise HTTPException(status_code=500, detail="Recipe detail request failed")
+
+
+# ── Meal plan ────────────────────────────────────────────────────────────
+
+def _meal_plan_request(body: MealPlanRequest) -> dict[str, Any]:
     target = _target_lang(body.language)
     safe_diet = _safe_diet(body.diet)
     diet_ctx = f"Diet: {safe_diet}." if safe_diet != "none" else ""
     prompt = (
-        "Based on the dish described by the user, create a balanced 7-day meal plan. "
-        "Return JSON array of 7 objects. "
-        f'Schema: {{ "day": "Day Name", "breakfast": "Dish", "lunch": "Dish", "dinner": "Dish" }}. '
+        "Based on the dish described by the user, create a balanced 7-day meal plan, one item per day. "
         f"Use {target}. {diet_ctx}"
     )
+    return {
+        "contents": [{"parts": [{"text": f"Dish: {body.title}"}]}],
+        "system_instruction": {"parts": [{"text": prompt}]},
+    }
+
+
+async def _meal_plan(body: MealPlanRequest) -> list[MealPlanItem]:
+    result = await generate_typed(
+        "meal-plan",
+        list[MealPlanItem],
+        lambda config: generate_text(**_meal_plan_request(body), generation_config=config, label="meal-plan"),
+    )
+    if not result:
+        raise HTTPException(status_code=502, detail="Empty response from AI model")
+    return result
 
+
+@router.post("/meal-plan", response_model=list[MealPlanItem])
+@limiter.limit("30/minute")
+async def meal_plan(request: Request, body: MealPlanRequest = Body()) -> Response:
+    _require_api_key()
     try:
-        raw = await generate_text(
-            contents=[{"parts": [{"text": f"Dish: {body.title}"}]}],
-            system_instruction={"parts": [{"text": prompt}]},
-            generation_config={"responseMimeType": "application/json"},
-            label="meal-plan",
-        )
-        parsed = json.loads(raw) if raw else []
-        return parsed if isinstance(parsed, list) else []
+        return await _cached(request, "meal-plan", body, lambda: _meal_plan(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
     except Exception as exc:
         logger.error("[/api/meal-plan] Error: %s", exc)
         raise HTTPException(status_code=500, detail="Meal plan request failed")
 
 
-# ── Drinks ───────────────────────────────────────────────────────────────
+@router.get("/meal-plan", response_model=list[MealPlanItem])
+@limiter.limit("30/minute")
+async def meal_plan_get(request: Request, body: Annotated[MealPlanRequest, Query()]) -> Response:
+    """Cacheable GET variant of /meal-plan."""
+    _require_api_key()
+    try:
+        return await _cached_get(request, "meal-plan", body, lambda: _meal_plan(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[GET /api/meal-plan] Error: %s", exc)
+        raise HTTPException(status_code=500, detail="Meal plan request failed")
+
 
-@router.post("/drinks")
+@router.post("/meal-plan/stream")
 @limiter.limit("30/minute")
-async def drinks(request: Request, body: DrinksRequest = Body()) -> dict[str, Any]:
+async def meal_plan_stream(request: Request, body: MealPlanRequest = Body()) -> StreamingResponse:
+    """Streaming variant of /meal-plan: one day per SSE event / NDJSON line."""
     _require_api_key()
+    return await _stream_cached(
+        request,
+        "meal-plan",
+        body,
+        MealPlanItem,
+        lambda: stream_text(
+            **_meal_plan_request(body),
+            generation_config=generation_config(list[MealPlanItem]),
+            label="meal-plan-stream",
+        ),
+        "Meal plan request failed",
+    )
+
+
+# ── Drinks ───────────────────────────────────────────────────────────────
+
+async def _drinks(body: DrinksRequest) -> DrinkSuggestion:
     target = _target_lang(body.language)
     safe_diet = _safe_diet(body.diet)
     diet_ctx = f"Diet: {safe_diet}." if safe_diet != "none" else ""
     prompt = (
-        f"Suggest drinks for the dish described by the user in {target}. {diet_ctx} "
-        'JSON: {alcohol: "text", nonAlcohol: "text"}.'
+        f"Suggest an alcoholic and a non-alcoholic drink for the dish described by the user, "
+        f"in {target}. {diet_ctx}"
     )
-
-    try:
-        raw = await generate_text(
+    result = await generate_typed(
+        "drinks",
+        DrinkSuggestion,
+        lambda config: generate_text(
             contents=[{"parts": [{"text": f"Dish: {body.title}"}]}],
             system_instruction={"parts": [{"text": prompt}]},
-            generation_config={"responseMimeType": "application/json"},
+            generation_config=config,
             label="drinks",
-        )
-        return json.loads(raw) if raw else {}
+        ),
+    )
+    if result is None or not (result.alcohol or result.nonAlcohol):
+        raise HTTPException(status_code=502, detail="Empty response from AI model")
+    return result
+
+
+@router.post("/drinks", response_model=DrinkSuggestion)
+@limiter.limit("30/minute")
+async def drinks(request: Request, body: DrinksRequest = Body()) -> Response:
+    _require_api_key()
+    try:
+        return await _cached(request, "drinks", body, lambda: _drinks(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
     except Exception as exc:
         logger.error("[/api/drinks] Error: %s", exc)
         raise HTTPException(status_code=500, detail="Drinks request failed")
 
 
+@router.get("/drinks", response_model=DrinkSuggestion)
+@limiter.limit("30/minute")
+async def drinks_get(request: Request, body: Annotated[DrinksRequest, Query()]) -> Response:
+    """Cacheable GET variant of /drinks."""
+    _require_api_key()
+    try:
+        return await _cached_get(request, "drinks", body, lambda: _drinks(body))
+    except (HTTPException, UpstreamUnavailable, MalformedOutput, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[GET /api/drinks] Error: %s", exc)
+        raise HTTPException(status_code=500, detail="Drinks request failed")
+
+
 # ── Image generation ─────────────────────────────────────────────────────
 
 @router.post("/image")
@@ -257,18 +843,342 @@ async def image(request: Request, body: ImageRequest = Body()) -> dict[str, Any]
     if not body.recipeTitle and not body.prompt:
         raise HTTPException(status_code=400, detail="recipeTitle or prompt is required")
 
+    if not body.prompt:
+        warmer.record(body.recipeTitle)
+    try:
+        return await _image_for_prompt(_image_prompt(body))
+    except (HTTPException, UpstreamUnavailable, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[/api/image] Unhandled error for %r: %s", body.recipeTitle, exc)
+        raise HTTPException(status_code=500, detail="Image request failed")
+
+
+@router.get("/image")
+@limiter.limit("10/minute")
+async def image_get(request: Request, body: Annotated[ImageRequest, Query()]) -> Response:
+    """Cacheable GET variant of /image; a failed generation is not cached."""
+    _require_api_key()
+
+    if not body.recipeTitle and not body.prompt:
+        raise HTTPException(status_code=400, detail="recipeTitle or prompt is required")
+
+    canonical = _canonical_query(body)
+    if request.url.query != canonical:
+        return RedirectResponse(
+            f"{request.url.path}?{canonical}", status_code=301, headers={"Cache-Control": _GET_CACHE_CONTROL}
+        )
+    if not body.prompt:
+        warmer.record(body.recipeTitle)
+    final_prompt = _image_prompt(body)
+    try:
+        payload = await _image_for_prompt(final_prompt)
+    except (HTTPException, UpstreamUnavailable, DeadlineExceeded):
+        raise
+    except Exception as exc:
+        logger.error("[GET /api/image] Unhandled error for %r: %s", body.recipeTitle, exc)
+        raise HTTPException(status_code=500, detail="Image request failed")
+    content = dump_json(payload)
+    if not payload.get("imageUrl"):
+        return Response(content=content, media_type="application/json", headers={"Cache-Control": "no-store"})
+    headers = {"ETag": _content_etag(content), "Cache-Control": _GET_CACHE_CONTROL}
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _image_prompt(body: ImageRequest) -> str:
+    if body.prompt:
+        return body.prompt[:MAX_PROMPT_LENGTH]
     safe_title = sanitize_text(str(body.recipeTitle or ""))[:MAX_TITLE_LENGTH]
-    final_prompt = (
-        body.prompt[:MAX_PROMPT_LENGTH]
-        if body.prompt
-        else f"Gourmet cinematic food photography of {safe_title}, exquisite plating, professional lighting, 4k"
-    )
+    return f"Gourmet cinematic food photography of {safe_title}, exquisite plating, professional lighting, 4k"
+
 
+async def _image_for_prompt(final_prompt: str) -> dict[str, Any]:
+    """Return the stored image for *final_prompt*, generating and storing it on a miss."""
+    key = prompt_key(final_prompt)
+    name = await image_store.lookup(key)
+    if name:
+        return await _image_payload(name)
+
+    result = await generate_image(final_prompt)
+    if not result:
+        return {"imageUrl": None, "imageBase64": None}
+    data_uri = f"data:{result['mime']};base64,{result['base64']}"
     try:
-        result = await generate_image(final_prompt)
-        if result:
-            return {"imageBase64": f"data:{result['mime']};base64,{result['base64']}"}
-        return {"imageBase64": None}
+        name = await image_store.put(key, base64.b64decode(result["base64"]), result["mime"])
     except Exception as exc:
-        logger.error("[/api/image] Unhandled error for %r: %s", body.recipeTitle, exc)
+        # Never lose a paid-for image because the store is unavailable.
+        logger.error("[/api/image] Image store write failed: %s", exc)
+        return {"imageUrl": None, "imageBase64": data_uri}
+    return await _image_payload(name, data_uri)
+
+
+async def _image_payload(name: str, data_uri: Optional[str] = None) -> dict[str, Any]:
+    payload: dict[str, Any] = {"imageUrl": image_url(name)}
+    if IMAGE_INLINE_BASE64:
+        if data_uri is None:
+            data = await image_store.read(name)
+            mime = MIME_TYPES[name.rsplit(".", 1)[1]]
+            data_uri = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}" if data else None
+        payload["imageBase64"] = data_uri
+    return payload
+
+
+# ── Cache warmer ─────────────────────────────────────────────────────────
+
+_WARM_PRODUCERS: dict[str, tuple[type[BaseModel], Callable[[Any], Awaitable[Any]]]] = {
+    "recipe-detail": (RecipeDetailRequest, _recipe_detail),
+    "drinks": (DrinksRequest, _drinks),
+    "meal-plan": (MealPlanRequest, _meal_plan),
+}
+
+
+async def warm_dish(endpoint: str, title: str, language: str, diet: str) -> bool:
+    """Warmer handler (started in main.py): make sure an answer is stored; True if one was generated."""
+    if endpoint == "image":
+        prompt = _image_prompt(ImageRequest(recipeTitle=title))
+        if await image_store.lookup(prompt_key(prompt)):
+            return False
+        return bool((await _image_for_prompt(prompt)).get("imageUrl"))
+    model, produce = _WARM_PRODUCERS[endpoint]
+    body = model(title=title, language=language, diet=diet)
+    key = cache_key(endpoint, body)
+    if await response_cache.get(key, count=False) is not None:
+        return False
+    result = await produce(body)
+    if not result:
+        return False
+    await _store(endpoint, body, key, dump_json(result))
+    return True
+
+
+# ── Image jobs ───────────────────────────────────────────────────────────
+
+async def run_image_job(prompt: str) -> dict[str, Any]:
+    """Job handler for ``image_jobs`` (started in main.py); raises ``NoResult`` when no image was generated."""
+    payload = await _image_for_prompt(prompt)
+    if not payload.get("imageUrl") and not payload.get("imageBase64"):
+        raise NoResult("no image model returned an image")
+    return payload
+
+
+def _require_jobs() -> None:
+    if not image_jobs.available:
+        raise HTTPException(status_code=503, detail="Image jobs are unavailable")
+
+
+async def _job_payload(job: dict[str, Any]) -> dict[str, Any]:
+    view = await image_jobs.view(job)
+    view["statusUrl"] = f"/api/image/jobs/{job['id']}"
+    view["eventsUrl"] = f"/api/image/jobs/{job['id']}/events"
+    return view
+
+
+@router.post("/image/jobs", status_code=202)
+@limiter.limit("10/minute")
+async def submit_image_job(request: Request, response: Response, body: ImageJobRequest = Body()) -> dict[str, Any]:
+    """Queue an image generation and return its job at once.
+
+    The same prompt already queued or running returns that job.  A prompt
+    whose image is already stored returns a finished job (200).
+    """
+    _require_api_key()
+    _require_jobs()
+    if not body.recipeTitle and not body.prompt:
+        raise HTTPException(status_code=400, detail="recipeTitle or prompt is required")
+
+    final_prompt = _image_prompt(body)
+    key = prompt_key(final_prompt)
+    try:
+        name = await image_store.lookup(key)
+        stored = await _image_payload(name) if name else None
+        job, _ = await image_jobs.submit(final_prompt, key, PRIORITIES[body.priority], stored)
+        payload = await _job_payload(job)
+    except Exception as exc:
+        logger.error("[/api/image/jobs] Submit failed: %s", exc)
         raise HTTPException(status_code=500, detail="Image request failed")
+    if job["status"] in FINISHED:
+        response.status_code = 200
+    response.headers["Location"] = payload["statusUrl"]
+    return payload
+
+
+@router.get("/image/jobs/{job_id}")
+@limiter.limit("120/minute")
+async def image_job_status(request: Request, job_id: str) -> dict[str, Any]:
+    _require_jobs()
+    job = await image_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await _job_payload(job)
+
+
+_SSE_KEEPALIVE_SECONDS = 15.0
+
+
+@router.get("/image/jobs/{job_id}/events")
+@limiter.limit("30/minute")
+async def image_job_events(request: Request, job_id: str) -> StreamingResponse:
+    """SSE: a ``status`` event whenever the job (or its queue position) changes, then ``done``."""
+    _require_jobs()
+    job = await image_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[bytes]:
+        current = job
+        last: Any = None
+        idle = 0.0
+        while True:
+            view = await _job_payload(current)
+            if current["status"] in FINISHED:
+                yield sse_event("done", view)
+                return
+            state = (view["status"], view.get("queuePosition"))
+            if state != last:
+                last, idle = state, 0.0
+                yield sse_event("status", view)
+            elif idle >= _SSE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield b": keep-alive\n\n"
+            await image_jobs.wait_for_change(IMAGE_JOB_POLL_INTERVAL)
+            idle += IMAGE_JOB_POLL_INTERVAL
+            current = await image_jobs.get(job_id) or current
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=STREAM_HEADERS)
+
+
+_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/images/{name}")
+async def stored_image(request: Request, name: str) -> Response:
+    """Serve a generated image by content hash (ETag, immutable caching, Range)."""
+    match = NAME_RE.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Not found")
+    etag = f'"{match.group(1)}"'
+    headers = {"ETag": etag, "Cache-Control": _IMAGE_CACHE_CONTROL}
+
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+
+    media_type = MIME_TYPES[match.group(2)]
+    path = image_store.local_path(name)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    data = await image_store.read(name)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+# ── Dish bundle ──────────────────────────────────────────────────────────
+
+_SECTION_ERRORS = {
+    "recipe": "Recipe detail request failed",
+    "drinks": "Drinks request failed",
+    "mealPlan": "Meal plan request failed",
+    "image": "Image request failed",
+}
+
+
+def _bundle_sections(body: BundleRequest, bypass: bool) -> dict[str, Callable[[], Awaitable[Any]]]:
+    """One producer per requested section; cache entries are shared with the single endpoints."""
+    common = {"title": body.title, "language": body.language, "diet": body.diet}
+    detail = RecipeDetailRequest(**common)
+    drinks_body = DrinksRequest(**common)
+    plan = MealPlanRequest(**common)
+    image_body = ImageRequest(recipeTitle=body.title, prompt=body.imagePrompt)
+    producers: dict[str, Callable[[], Awaitable[Any]]] = {
+        "recipe": lambda: _cached_value("recipe-detail", detail, lambda: _recipe_detail(detail), bypass=bypass),
+        "drinks": lambda: _cached_value("drinks", drinks_body, lambda: _drinks(drinks_body), bypass=bypass),
+        "mealPlan": lambda: _cached_value("meal-plan", plan, lambda: _meal_plan(plan), bypass=bypass),
+        "image": lambda: _image_for_prompt(_image_prompt(image_body)),
+    }
+    return {name: producers[name] for name in body.sections or BUNDLE_SECTIONS}
+
+
+async def _run_section(
+    name: str, produce: Callable[[], Awaitable[Any]]
+) -> tuple[str, Any, Optional[Exception]]:
+    try:
+        return name, await produce(), None
+    except Exception as exc:
+        logger.error("[/api/bundle] %s failed: %s", name, exc)
+        return name, None, exc
+
+
+def _section_error(name: str, exc: Exception) -> str:
+    if isinstance(exc, UpstreamUnavailable):
+        return "AI service is temporarily unavailable, please retry later"
+    if isinstance(exc, DeadlineExceeded):
+        return "AI service took too long to respond, please retry"
+    return _SECTION_ERRORS[name]
+
+
+@router.post("/bundle")
+@limiter.limit("10/minute")
+async def bundle(request: Request, body: BundleRequest = Body()) -> dict[str, Any]:
+    """Recipe detail, drinks, meal plan and image for one dish, generated concurrently.
+
+    A failed section is returned as ``null`` and listed under ``errors``; the
+    request itself fails only when every section does.
+    """
+    _require_api_key()
+    sections = _bundle_sections(body, _cache_bypassed(request))
+    results = await asyncio.gather(*(_run_section(name, produce) for name, produce in sections.items()))
+
+    failures = [exc for _, _, exc in results if exc is not None]
+    if len(failures) == len(results):
+        unavailable = next(
+            (exc for exc in failures if isinstance(exc, (UpstreamUnavailable, DeadlineExceeded))), None
+        )
+        if unavailable is not None:
+            raise unavailable
+        raise HTTPException(status_code=500, detail="Bundle request failed")
+
+    payload: dict[str, Any] = {name: value for name, value, _ in results}
+    payload["errors"] = {name: _section_error(name, exc) for name, _, exc in results if exc is not None}
+    return payload
+
+
+@router.post("/bundle/stream")
+@limiter.limit("10/minute")
+async def bundle_stream(request: Request, body: BundleRequest = Body()) -> StreamingResponse:
+    """Streaming variant of /bundle: each section is sent as soon as it is ready.
+
+    Frames are ``{"section": name, "data": …}`` or ``{"section": name, "error": …}``
+    as SSE ``section`` events (followed by ``done``) or NDJSON lines.
+    """
+    _require_api_key()
+    sections = _bundle_sections(body, _cache_bypassed(request))
+    sse = wants_sse(request.headers.get("accept", ""))
+
+    async def frames() -> AsyncIterator[bytes]:
+        tasks = [asyncio.ensure_future(_run_section(name, produce)) for name, produce in sections.items()]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, value, exc = await next_done
+                if exc is None:
+                    frame = {"section": name, "data": value}
+                else:
+                    failed += 1
+                    frame = {"section": name, "error": _section_error(name, exc)}
+                yield sse_event("section", frame) if sse else ndjson_line(frame)
+            if sse:
+                yield sse_event("done", {"sections": len(tasks), "failed": failed})
+        finally:
+            # Client went away: stop the sections still generating.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        frames(),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers=STREAM_HEADERS,
+    )
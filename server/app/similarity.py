@@ -0,0 +1,310 @@
+"""Near-duplicate lookup over previously answered requests.
+
+Exact cache keys miss "chicken, rice, onion" vs "Onions, chicken breast, rice"
+or "Borscht" vs "borsch".  For the endpoints in ``FUZZY_FIELDS`` the free-text
+field is normalized (case, punctuation, quantities / units, plurals) and cut
+into shingles — ingredient words for lists, character 3-grams for titles.
+MinHash signatures with LSH banding find candidates in O(bands) dict lookups;
+candidates are then scored by exact Jaccard similarity on their shingles, and
+the best one at or above the endpoint's threshold is served from the response
+cache.  All other request fields (language, diet) must match exactly.
+
+A score alone lets different dishes through ("Chocolate cake" for "Chocolate
+cupcake", a peanut recipe for a list without peanuts), so a candidate must
+also pass a stricter check:
+
+* ingredients — every ingredient word of the cached request is in the new
+  one: an answer may leave an ingredient out, never add one;
+* titles — the same words, numbers exactly, others up to one typo per
+  ``_CHARS_PER_EDIT`` characters ("Borscht" / "borsch").
+
+The index holds cache keys and 64-bit shingle hashes, not answers, and is
+bounded by ``SIMILARITY_MAX_ENTRIES`` (LRU), at roughly 1 KB per entry.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import re
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Any
+
+from pydantic import BaseModel
+
+from .cache import cache_key
+from .config import (
+    SIMILARITY_ENABLED,
+    SIMILARITY_MAX_ENTRIES,
+    SIMILARITY_THRESHOLD_INGREDIENTS,
+    SIMILARITY_THRESHOLD_TITLE,
+)
+from .metrics import SIMILARITY_SCORE
+
+logger = logging.getLogger("kitchen-ai")
+
+# endpoint -> (fuzzy field, threshold)
+FUZZY_FIELDS: dict[str, tuple[str, float]] = {
+    "recipes": ("ingredients", SIMILARITY_THRESHOLD_INGREDIENTS),
+    "recipe-detail": ("title", SIMILARITY_THRESHOLD_TITLE),
+}
+
+# 32 hashes in 8 bands of 4: pairs at Jaccard 0.6 become candidates ~67% of
+# the time, at 0.75 ~95%, at 0.3 ~6%.
+_NUM_HASHES = 32
+_BANDS = 8
+_ROWS = _NUM_HASHES // _BANDS
+_MASK64 = (1 << 64) - 1
+_rng = random.Random(0x6B6169)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(_NUM_HASHES)]
+
+# ── Normalization ────────────────────────────────────────────────────────
+
+_WORD = re.compile(r"\d+|[^\W\d_]+")
+_STOPWORDS = frozenset(
+    """
+    a an and or of with the some fresh freshly chopped diced sliced minced large small medium
+    whole raw boneless skinless g kg mg ml l oz lb lbs cup cups tbsp tsp pinch clove cloves piece pieces
+    и или с со из для свежий свежая свежие г гр кг мл л шт ст ч ложка ложки щепотка
+    """.split()
+)
+_EN_SUFFIXES = (("ies", "y"), ("oes", "o"), ("ches", "ch"), ("shes", "sh"), ("s", ""))
+_RU_SUFFIXES = (
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ов", "ев", "ей", "ах", "ях", "ой", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие",
+    "а", "я", "ы", "и", "о", "е", "у", "ю", "ь",
+)
+
+
+def _stem(word: str) -> str:
+    if word.isascii():
+        if word.endswith(("ss", "us", "is")):
+            return word
+        for suffix, replacement in _EN_SUFFIXES:
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                return word[: -len(suffix)] + replacement
+        return word
+    for suffix in _RU_SUFFIXES:
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def _words(text: str, *, numbers: bool = True) -> list[str]:
+    return [
+        _stem(w) for w in _WORD.findall(text.casefold())
+        if w not in _STOPWORDS and (numbers or not w.isdigit())
+    ]
+
+
+def shingles(value: Any) -> frozenset[str]:
+    """Ingredient lists -> word stems (quantities dropped); titles -> padded character 3-grams."""
+    if isinstance(value, (list, tuple)):
+        return frozenset(w for item in value for w in _words(str(item), numbers=False))
+    grams = set()
+    for word in _words(str(value or "")):
+        padded = f"#{word}#"
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def jaccard(a: frozenset[Any], b: frozenset[Any] | array) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a.intersection(b))
+    return common / (len(a) + len(b) - common)
+
+
+# ── Match checks ─────────────────────────────────────────────────────────
+
+_CHARS_PER_EDIT = 6
+
+
+def title_words(title: str) -> tuple[str, ...]:
+    """Normalized words of a title, sorted so word order doesn't matter."""
+    return tuple(sorted(_words(str(title or ""))))
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def same_title(a: tuple[str, ...], b: tuple[str, ...]) -> bool:
+    """Whether two ``title_words`` name the same dish: same words, up to small typos."""
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if x == y:
+            continue
+        if x.isdigit() or y.isdigit():
+            return False
+        if _edit_distance(x, y) > max(len(x), len(y)) // _CHARS_PER_EDIT:
+            return False
+    return True
+
+
+def covers(query: frozenset[int], cached: array) -> bool:
+    """Whether every ingredient of the cached request is in the new one."""
+    return all(h in query for h in cached)
+
+
+# ── MinHash / LSH ────────────────────────────────────────────────────────
+
+def _hashes(items: frozenset[str]) -> array:
+    """Stable 64-bit hashes of the shingles (stored instead of the strings)."""
+    return array(
+        "Q", sorted({int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in items})
+    )
+
+
+def _band_keys(scope: str, hashes: array) -> list[int]:
+    signature = [min(((a * h + b) & _MASK64) >> 32 for h in hashes) for a, b in _PERMUTATIONS]
+    return [hash((scope, band, tuple(signature[band * _ROWS : (band + 1) * _ROWS]))) for band in range(_BANDS)]
+
+
+class _Entry:
+    __slots__ = ("key", "scope", "hashes", "words")
+
+    def __init__(self, key: str, scope: str, hashes: array, words: tuple[str, ...] | None) -> None:
+        self.key = key
+        self.scope = scope
+        self.hashes = hashes
+        self.words = words  # title_words for titles, None for ingredient lists
+
+
+class SimilarityIndex:
+    def __init__(self, *, max_entries: int, enabled: bool = True) -> None:
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()  # cache key -> entry, LRU order
+        self._buckets: dict[int, _Entry | list[_Entry]] = {}
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _prepare(endpoint: str, body: BaseModel) -> tuple[str, array, float, tuple[str, ...] | None] | None:
+        spec = FUZZY_FIELDS.get(endpoint)
+        if spec is None:
+            return None
+        field, threshold = spec
+        value = getattr(body, field)
+        # Everything but the fuzzy field must match: key of the body with it blanked.
+        # Interned: few distinct scopes, shared by every entry.
+        scope = sys.intern(cache_key(endpoint, body.model_copy(update={field: type(value)()})))
+        words = None if isinstance(value, (list, tuple)) else title_words(value)
+        return scope, _hashes(shingles(value)), threshold, words
+
+    @staticmethod
+    def _same_dish(items: frozenset[int], words: tuple[str, ...] | None, entry: _Entry) -> bool:
+        if words is None:
+            return covers(items, entry.hashes)
+        return entry.words is not None and same_title(words, entry.words)
+
+    def find(self, endpoint: str, body: BaseModel) -> tuple[str, float] | None:
+        """The cache key of the most similar answered request above threshold, and its score."""
+        if not self.enabled or not self._entries:
+            return None
+        prepared = self._prepare(endpoint, body)
+        if prepared is None or not prepared[1]:
+            return None
+        scope, hashes, threshold, words = prepared
+        items = frozenset(hashes)
+        self.lookups += 1
+
+        seen: set[str] = set()
+        best: _Entry | None = None
+        best_score = 0.0
+        for band_key in _band_keys(scope, hashes):
+            bucket = self._buckets.get(band_key)
+            if bucket is None:
+                continue
+            for entry in bucket if isinstance(bucket, list) else (bucket,):
+                if entry.key in seen or entry.scope != scope:
+                    continue
+                seen.add(entry.key)
+                score = jaccard(items, entry.hashes)
+                if score > best_score and self._same_dish(items, words, entry):
+                    best, best_score = entry, score
+        if best is None:
+            return None
+
+        SIMILARITY_SCORE.labels(endpoint).observe(best_score)
+        matched = best_score >= threshold
+        logger.info(
+            "[similarity] %s best=%.3f threshold=%.2f candidates=%d %s",
+            endpoint, best_score, threshold, len(seen), "hit" if matched else "miss",
+        )
+        if not matched:
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best.key)
+        return best.key, best_score
+
+    def add(self, endpoint: str, body: BaseModel, key: str) -> None:
+        """Index the request whose answer was just cached under *key*."""
+        if not self.enabled:
+            return
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        prepared = self._prepare(endpoint, body)
+        if prepared is None or not prepared[1]:
+            return
+        scope, hashes, _, words = prepared
+        entry = _Entry(key, scope, hashes, words)
+        self._entries[key] = entry
+        for band_key in _band_keys(scope, hashes):
+            bucket = self._buckets.get(band_key)
+            if bucket is None:
+                self._buckets[band_key] = entry
+            elif isinstance(bucket, list):
+                bucket.append(entry)
+            else:
+                self._buckets[band_key] = [bucket, entry]
+        while len(self._entries) > self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            self._unlink(oldest)
+            self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        """Forget *key* (its answer is no longer in the cache)."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unlink(entry)
+
+    def _unlink(self, entry: _Entry) -> None:
+        for band_key in _band_keys(entry.scope, entry.hashes):
+            bucket = self._buckets.get(band_key)
+            if bucket is entry:
+                del self._buckets[band_key]
+            elif isinstance(bucket, list):
+                bucket.remove(entry)
+                if len(bucket) == 1:
+                    self._buckets[band_key] = bucket[0]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "buckets": len(self._buckets),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "thresholds": {endpoint: threshold for endpoint, (_, threshold) in FUZZY_FIELDS.items()},
+        }
+
+
+similarity_index = SimilarityIndex(max_entries=SIMILARITY_MAX_ENTRIES, enabled=SIMILARITY_ENABLED)
@@ -0,0 +1,82 @@
+"""Single-flight coalescing of identical concurrent async calls.
+
+The first caller for a key (the leader) starts the work in a shared task;
+callers arriving while it is in flight (followers) await the same task and
+receive its result or exception.  The shared task is cancelled only once
+every waiter has gone away, so one client disconnecting does not fail the
+others.  Each waiter stops waiting when its own request deadline runs out.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, TypeVar
+
+from .deadline import DeadlineExceeded, remaining
+from .metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+
+def flight_key(*parts: Any) -> str:
+    """Hash *parts* (URLs, JSON bodies, …) into a canonical coalescing key."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future[Any]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run *fn* once per *key* across concurrent callers and share its outcome."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, c=call: self._forget(key, c))
+            self.leaders += 1
+            COALESCED_CALLS.labels(self.name, "leader").inc()
+        else:
+            self.collapsed += 1
+            COALESCED_CALLS.labels(self.name, "follower").inc()
+
+        call.waiters += 1
+        try:
+            # The leader's task carries the leader's deadline; followers bound their own wait.
+            async with asyncio.timeout(remaining()):
+                return await asyncio.shield(call.task)
+        except TimeoutError:
+            if call.task.done():
+                raise
+            raise DeadlineExceeded(self.name) from None
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every interested caller was cancelled; stop the upstream work.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "inFlight": len(self._calls),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+        }
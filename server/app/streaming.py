@@ -0,0 +1,118 @@
+"""Incremental JSON parsing and SSE / NDJSON framing for streamed AI output."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Streaming bodies must reach the client unbuffered: tell nginx not to buffer.
+# (CompressionMiddleware and nginx gzip leave SSE / NDJSON alone by media type.)
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+class JsonArrayStreamParser:
+    """Emit the elements of a JSON array as soon as each one is complete.
+
+    Text is fed in arbitrary chunks (as it arrives from the model).  Anything
+    before the opening bracket — e.g. a stray ```json fence — is ignored.  If
+    the model answers with a single object instead of an array, that object is
+    emitted as the only element once it closes.
+    """
+
+    def __init__(self) -> None:
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._root_is_object = False
+        self._element: list[str] | None = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list[Any]:
+        items: list[Any] = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+                elif ch == "{":
+                    self._started = True
+                    self._root_is_object = True
+                    self._depth = 1
+                    self._element = [ch]
+                continue
+
+            if self._element is not None:
+                self._element.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                if self._depth == 1 and self._element is None:
+                    self._element = [ch]
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._element is not None and not self._root_is_object:
+                    items.append(json.loads("".join(self._element)))
+                    self._element = None
+                elif self._depth == 0:
+                    if self._root_is_object and self._element is not None:
+                        items.append(json.loads("".join(self._element)))
+                        self._element = None
+                    self.done = True
+        return items
+
+
+def wants_sse(accept: str) -> bool:
+    return SSE_MEDIA_TYPE in accept
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def ndjson_line(data: Any) -> bytes:
+    return (json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def frame_items(
+    items: AsyncIterator[Any],
+    *,
+    sse: bool,
+    error_message: str,
+) -> AsyncIterator[bytes]:
+    """Frame each item as an SSE ``item`` event or an NDJSON line.
+
+    SSE streams end with a ``done`` event carrying the item count; a failure
+    mid-stream is reported as an ``error`` event (SSE) or ``{"error": …}`` line.
+    """
+    count = 0
+    try:
+        async for item in items:
+            count += 1
+            yield sse_event("item", item) if sse else ndjson_line(item)
+    except Exception:
+        yield sse_event("error", {"error": error_message}) if sse else ndjson_line({"error": error_message})
+        return
+    if sse:
+        yield sse_event("done", {"count": count})
@@ -0,0 +1,197 @@
+"""Structured (schema-constrained) Gemini output decoded into typed models.
+
+Text routes pass a ``responseSchema`` derived from the Pydantic response
+models in ``models.py`` instead of describing the JSON shape in the prompt,
+and decode the answer with pydantic-core's JSON parser straight into those
+models.  Output that still fails validation goes through a cheap local repair
+(code fences, surrounding prose, trailing commas, wrapped/unwrapped arrays)
+and then one targeted text-only repair call before giving up with
+``MalformedOutput``.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, TypeVar
+
+from pydantic import TypeAdapter, ValidationError
+
+from .google_ai import generate_text
+from .metrics import JSON_PARSE_DURATION
+
+logger = logging.getLogger("kitchen-ai")
+
+T = TypeVar("T")
+
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+_REPAIR_INPUT_LIMIT = 16_000  # chars of the bad answer echoed back to the model
+
+
+class MalformedOutput(Exception):
+    """The model's answer could not be decoded into the expected type."""
+
+    def __init__(self, endpoint: str, error: str) -> None:
+        super().__init__(f"{endpoint}: {error}")
+        self.endpoint = endpoint
+        self.error = error
+
+
+# ── Schemas ──────────────────────────────────────────────────────────────
+
+def _to_gemini(node: dict[str, Any], defs: dict[str, Any]) -> dict[str, Any]:
+    """Convert a JSON Schema node to Gemini's OpenAPI-subset schema."""
+    if "$ref" in node:
+        return _to_gemini(defs[node["$ref"].rsplit("/", 1)[1]], defs)
+    if "anyOf" in node:
+        variants = [v for v in node["anyOf"] if v.get("type") != "null"]
+        if {v.get("type") for v in variants} <= {"integer", "number"} and len(variants) > 1:
+            out: dict[str, Any] = {"type": "number"}
+        else:
+            out = _to_gemini(variants[0], defs)
+        if len(variants) < len(node["anyOf"]):
+            out["nullable"] = True
+        return out
+
+    kind = node.get("type", "string")
+    if kind == "object":
+        props = node.get("properties", {})
+        out = {
+            "type": "object",
+            "properties": {name: _to_gemini(sub, defs) for name, sub in props.items()},
+            "propertyOrdering": list(props),
+        }
+        if node.get("required"):
+            out["required"] = list(node["required"])
+    elif kind == "array":
+        out = {"type": "array", "items": _to_gemini(node.get("items", {}), defs)}
+        for key in ("minItems", "maxItems"):
+            if key in node:
+                out[key] = node[key]
+    else:
+        out = {"type": kind}
+        if "enum" in node:
+            out["enum"] = node["enum"]
+    if "description" in node:
+        out["description"] = node["description"]
+    return out
+
+
+@lru_cache(maxsize=None)
+def _adapter(tp: Any) -> TypeAdapter[Any]:
+    return TypeAdapter(tp)
+
+
+@lru_cache(maxsize=None)
+def response_schema(tp: Any) -> dict[str, Any]:
+    schema = _adapter(tp).json_schema()
+    return _to_gemini(schema, schema.get("$defs", {}))
+
+
+def generation_config(tp: Any) -> dict[str, Any]:
+    return {"responseMimeType": "application/json", "responseSchema": response_schema(tp)}
+
+
+# ── Decoding ─────────────────────────────────────────────────────────────
+
+def _repair_candidates(raw: str, tp: Any) -> list[Any]:
+    """Cheap local fixes for the usual ways model JSON goes wrong."""
+    text = raw.replace("```json", "").replace("```", "").strip()
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    end = max(text.rfind("]"), text.rfind("}"))
+    if starts and end > min(starts):
+        text = text[min(starts) : end + 1]
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    candidates: list[Any] = [text]
+
+    try:
+        value = _adapter(Any).validate_json(text)
+    except ValidationError:
+        return candidates
+    if getattr(tp, "__origin__", None) is list:
+        if isinstance(value, dict):
+            # {"recipes": [...]} or a lone object where an array was expected.
+            lists = [v for v in value.values() if isinstance(v, list)]
+            candidates.append(lists[0] if len(lists) == 1 else [value])
+    elif isinstance(value, list) and len(value) == 1:
+        candidates.append(value[0])
+    return candidates
+
+
+def parse_output(endpoint: str, tp: type[T] | Any, raw: str) -> T:
+    """Decode *raw* into *tp*, applying local repairs; raise ``MalformedOutput``."""
+    adapter = _adapter(tp)
+    with JSON_PARSE_DURATION.labels(endpoint).time():
+        try:
+            return adapter.validate_json(raw)
+        except ValidationError as exc:
+            first_error = exc
+        for candidate in _repair_candidates(raw, tp):
+            try:
+                if isinstance(candidate, str):
+                    return adapter.validate_json(candidate)
+                return adapter.validate_python(candidate)
+            except ValidationError:
+                continue
+    errors = "; ".join(
+        f"{'.'.join(str(p) for p in e['loc']) or '<root>'}: {e['msg']}" for e in first_error.errors()[:5]
+    )
+    raise MalformedOutput(endpoint, errors)
+
+
+async def generate_typed(
+    endpoint: str,
+    tp: type[T] | Any,
+    call: Callable[[dict[str, Any]], Awaitable[str]],
+) -> T | None:
+    """Run *call* with a schema-constrained generation config and decode the answer.
+
+    *call* receives the ``generationConfig`` to send.  Returns None when the
+    model gave no answer at all.  A malformed answer gets one text-only repair
+    call (the original inputs are not resent).
+    """
+    config = generation_config(tp)
+    raw = await call(config)
+    if not raw:
+        return None
+    try:
+        return parse_output(endpoint, tp, raw)
+    except MalformedOutput as exc:
+        malformed = exc
+        logger.warning("[generate_typed] %s — malformed output, requesting repair: %s", endpoint, exc.error)
+
+    repaired = await generate_text(
+        contents=[
+            {
+                "parts": [
+                    {
+                        "text": "Rewrite this JSON so it is valid and matches the response schema. "
+                        f"Keep the content; fix only the structure. Problems: {malformed.error}\n\n"
+                        f"{raw[:_REPAIR_INPUT_LIMIT]}"
+                    }
+                ]
+            }
+        ],
+        generation_config=config,
+        label=f"{endpoint}-repair",
+    )
+    if not repaired:
+        raise malformed
+    return parse_output(endpoint, tp, repaired)
+
+
+def coerce(tp: Any, value: Any) -> Any | None:
+    """Validate an already-decoded *value* as *tp*; return it as plain JSON data, or None."""
+    adapter = _adapter(tp)
+    try:
+        return adapter.dump_python(adapter.validate_python(value), mode="json")
+    except ValidationError:
+        return None
+
+
+# ── Encoding ─────────────────────────────────────────────────────────────
+
+def dump_json(value: Any) -> bytes:
+    """Serialize models / plain values to compact UTF-8 JSON (pydantic-core)."""
+    return _adapter(Any).dump_json(value)
@@ -0,0 +1,116 @@
+"""Binary image uploads for /api/vision without base64 round trips.
+
+Uploads are streamed into a ``SpooledTemporaryFile`` (memory up to
+``VISION_SPOOL_MEMORY``, disk beyond), hashed on the way in, and their MIME
+type is taken from the file's magic bytes rather than the client's claim.
+Reads of a spooled file (which may be on disk) happen in a worker thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import tempfile
+from typing import IO, AsyncIterable, AsyncIterator
+
+from .config import ALLOWED_MIME_TYPES, VISION_SPOOL_MEMORY, VISION_UPLOAD_MAX_BYTES
+
+CHUNK_SIZE = 64 * 1024
+# Multiple of 3 so every chunk base64-encodes without padding.
+B64_CHUNK_SIZE = 3 * 16 * 1024
+
+
+class UploadError(ValueError):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_image_mime(head: bytes) -> str | None:
+    """Identify JPEG / PNG / GIF / WebP from the first bytes of a file."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class SpooledImage:
+    """An uploaded image: file handle positioned at 0, plus size, digest and MIME."""
+
+    def __init__(self, file: IO[bytes], size: int, sha256: str, mime: str) -> None:
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.mime = mime
+
+    def close(self) -> None:
+        self.file.close()
+
+    async def iter_base64(self) -> AsyncIterator[bytes]:
+        """Yield the file's base64 encoding chunk by chunk."""
+        self.file.seek(0)
+        while chunk := await asyncio.to_thread(self.file.read, B64_CHUNK_SIZE):
+            yield base64.b64encode(chunk)
+
+    @property
+    def base64_length(self) -> int:
+        return 4 * ((self.size + 2) // 3)
+
+
+def _finish(file: IO[bytes], size: int, digest: hashlib._Hash, head: bytes) -> SpooledImage:
+    if size == 0:
+        file.close()
+        raise UploadError(400, "Image is required")
+    mime = sniff_image_mime(head)
+    if mime is None or mime not in ALLOWED_MIME_TYPES:
+        file.close()
+        raise UploadError(400, "Unsupported image format")
+    file.seek(0)
+    return SpooledImage(file, size, digest.hexdigest(), mime)
+
+
+async def spool_stream(
+    chunks: AsyncIterable[bytes],
+    *,
+    max_bytes: int = VISION_UPLOAD_MAX_BYTES,
+) -> SpooledImage:
+    """Copy a raw request body into a spooled buffer, enforcing *max_bytes*."""
+    file = tempfile.SpooledTemporaryFile(max_size=VISION_SPOOL_MEMORY)
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        size += len(chunk)
+        if size > max_bytes:
+            file.close()
+            raise UploadError(413, "Request body too large")
+        if len(head) < 16:
+            head += chunk[: 16 - len(head)]
+        digest.update(chunk)
+        file.write(chunk)
+    return _finish(file, size, digest, head)
+
+
+def inspect_file(file: IO[bytes], *, max_bytes: int = VISION_UPLOAD_MAX_BYTES) -> SpooledImage:
+    """Wrap an already-spooled file (e.g. a multipart ``UploadFile.file``); blocking, run it in a thread."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    head = file.read(16)
+    file.seek(0)
+    size = 0
+    while chunk := file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            file.close()
+            raise UploadError(413, "Request body too large")
+        digest.update(chunk)
+    return _finish(file, size, digest, head)
@@ -0,0 +1,96 @@
+"""Shared, pooled HTTP client for upstream Google AI calls.
+
+A single ``httpx.AsyncClient`` is created per worker process on startup and
+closed on shutdown (see the lifespan in ``main.py``).  Reusing it keeps TCP/TLS
+connections alive between requests and, with HTTP/2, multiplexes concurrent
+calls over a handful of connections.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+import httpx
+
+from .config import (
+    FETCH_TIMEOUT,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_HTTP2,
+    UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE,
+)
+
+logger = logging.getLogger("kitchen-ai")
+
+_client: httpx.AsyncClient | None = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = UPSTREAM_HTTP2 and _http2_available()
+    if UPSTREAM_HTTP2 and not http2:
+        logger.warning("[upstream] h2 package not installed — falling back to HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(FETCH_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def start_client() -> None:
+    """Create the shared upstream client (idempotent)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_client() -> None:
+    """Close the shared upstream client and drop all pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside of the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def pool_stats() -> dict[str, Any]:
+    """Best-effort snapshot of the connection pool for ``/api/health``."""
+    stats: dict[str, Any] = {
+        "open": _client is not None and not _client.is_closed,
+        "http2": UPSTREAM_HTTP2 and _http2_available(),
+        "maxConnections": UPSTREAM_MAX_CONNECTIONS,
+        "maxKeepalive": UPSTREAM_MAX_KEEPALIVE,
+        "keepaliveExpiry": UPSTREAM_KEEPALIVE_EXPIRY,
+    }
+    if not stats["open"]:
+        return stats
+
+    # httpx does not expose pool internals publicly; read them defensively.
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    stats["connections"] = len(connections)
+    stats["idle"] = sum(1 for c in connections if c.is_idle())
+    stats["active"] = stats["connections"] - stats["idle"]
+    stats["http2Connections"] = sum(1 for c in connections if "HTTP/2" in c.info())
+    stats["inFlightRequests"] = len(getattr(pool, "_requests", []) or [])
+    return stats
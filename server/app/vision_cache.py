@@ -0,0 +1,141 @@
+"""Vision results keyed by what is in the photo, not by its bytes.
+
+The same fridge photo comes back re-encoded, resized or stripped of EXIF by
+the browser.  imaging.py fingerprints every decoded upload; answers are
+stored in the response cache under the exact pixel hash (shared by all
+workers), and this index finds earlier photos whose 64-bit difference hash is
+within ``VISION_CACHE_MAX_DISTANCE`` bits, per language.
+
+Candidates are found by splitting the hash into ``max_distance + 1`` bands:
+two hashes that differ in at most ``max_distance`` bits agree exactly on at
+least one band, so only photos sharing a band are compared.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any
+
+from .cache import KEY_PREFIX
+from .config import VISION_CACHE_ENABLED, VISION_CACHE_MAX_DISTANCE, VISION_CACHE_MAX_ENTRIES
+from .imaging import ImageFingerprint
+from .metrics import VISION_CACHE_DISTANCE, VISION_CACHE_LOOKUPS, VISION_CACHE_SAVED
+
+
+def vision_key(language: str, exact: str) -> str:
+    """Response cache key of the ingredient list for a photo in *language*."""
+    return f"{KEY_PREFIX}:vision:{language.casefold()}:{exact}"
+
+
+class VisionIndex:
+    ALPHA = 0.2
+
+    def __init__(self, *, max_entries: int, max_distance: int, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_distance = max(0, min(max_distance, 63))
+        bands = self.max_distance + 1
+        self._bands = [(i * 64 // bands, (i + 1) * 64 // bands) for i in range(bands)]
+        self._entries: OrderedDict[str, tuple[str, int]] = OrderedDict()  # key -> (language, dhash), LRU
+        self._buckets: dict[tuple[str, int, int], set[str]] = {}
+        self.upstream_time = 0.0  # EWMA of uncached vision calls
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.saved = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, language: str, dhash: int) -> list[tuple[str, int, int]]:
+        return [
+            (language, i, (dhash >> lo) & ((1 << (hi - lo)) - 1)) for i, (lo, hi) in enumerate(self._bands)
+        ]
+
+    def nearest(self, language: str, fingerprint: ImageFingerprint) -> tuple[str, int] | None:
+        """Cache key and distance of the closest indexed photo within the threshold."""
+        if not self.enabled:
+            return None
+        language = language.casefold()
+        best: tuple[str, int] | None = None
+        seen: set[str] = set()
+        for band_key in self._band_keys(language, fingerprint.dhash):
+            for key in self._buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = (self._entries[key][1] ^ fingerprint.dhash).bit_count()
+                if best is None or distance < best[1]:
+                    best = (key, distance)
+        if best is not None:
+            VISION_CACHE_DISTANCE.observe(best[1])
+        if best is None or best[1] > self.max_distance:
+            return None
+        self._entries.move_to_end(best[0])
+        return best
+
+    def add(self, language: str, fingerprint: ImageFingerprint) -> None:
+        if not self.enabled:
+            return
+        key = vision_key(language, fingerprint.exact)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        language = language.casefold()
+        self._entries[key] = (language, fingerprint.dhash)
+        for band_key in self._band_keys(language, fingerprint.dhash):
+            self._buckets.setdefault(band_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, key: str) -> None:
+        """Forget *key* (its answer is no longer in the cache)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        language, dhash = entry
+        for band_key in self._band_keys(language, dhash):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def record(self, result: str, upstream_elapsed: float | None = None) -> None:
+        """Count a lookup; misses report how long the upstream call took."""
+        self.lookups += 1
+        VISION_CACHE_LOOKUPS.labels(result).inc()
+        if result == "miss":
+            if upstream_elapsed is not None:
+                if self.upstream_time == 0.0:
+                    self.upstream_time = upstream_elapsed
+                else:
+                    self.upstream_time += self.ALPHA * (upstream_elapsed - self.upstream_time)
+            return
+        if result == "exact":
+            self.exact_hits += 1
+        else:
+            self.similar_hits += 1
+        self.saved += self.upstream_time
+        VISION_CACHE_SAVED.inc(self.upstream_time)
+
+    def stats(self) -> dict[str, Any]:
+        hits = self.exact_hits + self.similar_hits
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "maxDistance": self.max_distance,
+            "lookups": self.lookups,
+            "exactHits": self.exact_hits,
+            "similarHits": self.similar_hits,
+            "hitRate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "upstreamTime": round(self.upstream_time, 3),
+            "savedSeconds": round(self.saved, 1),
+        }
+
+
+vision_index = VisionIndex(
+    max_entries=VISION_CACHE_MAX_ENTRIES,
+    max_distance=VISION_CACHE_MAX_DISTANCE,
+    enabled=VISION_CACHE_ENABLED,
+)
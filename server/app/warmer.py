@@ -0,0 +1,403 @@
+"""Background cache warmer for popular dishes.
+
+A few hundred dishes make up most traffic.  Every worker counts the dish
+titles asked of /api/recipe-detail, /drinks, /meal-plan and /image
+(normalized title and diet only; no client data, no free-form prompts) and
+flushes the counts every ``WARMER_FLUSH_INTERVAL`` into a SQLite table
+(``WARMER_DB``).  Scores decay with a half-life of ``WARMER_HALF_LIFE``
+(stored as forward-decayed sums, so a flush is one UPSERT per title).
+
+Inside the off-peak window (``WARMER_WINDOW``, server-local hours) one worker
+at a time (a lease in the same database) walks the top ``WARMER_TOP_N``
+dishes seen at least ``WARMER_MIN_COUNT`` times and makes sure every
+endpoint in ``WARMER_ENDPOINTS`` has a cached answer in each of
+``WARMER_LANGUAGES``; expired answers are generated again.  A pass makes at
+most ``WARMER_MAX_GENERATIONS`` upstream generations, ``WARMER_CONCURRENCY``
+at a time, and pauses whenever this worker is serving more than
+``WARMER_MAX_LIVE`` live requests, so it never competes with real traffic.
+
+Run ``python -m app.warmer`` for a one-off pass outside the window (cron).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from .admission import admission
+from .circuit import UpstreamUnavailable
+from .config import (
+    IMAGE_JOB_DEADLINE,
+    MAX_TITLE_LENGTH,
+    WARMER_CONCURRENCY,
+    WARMER_DB,
+    WARMER_ENABLED,
+    WARMER_ENDPOINTS,
+    WARMER_FLUSH_INTERVAL,
+    WARMER_HALF_LIFE,
+    WARMER_LANGUAGES,
+    WARMER_MAX_GENERATIONS,
+    WARMER_MAX_LIVE,
+    WARMER_MIN_COUNT,
+    WARMER_RECORD,
+    WARMER_TOP_N,
+    WARMER_TRACKED_MAX,
+    WARMER_WINDOW,
+)
+from .deadline import deadline_scope
+from .metrics import WARMER_RESULTS
+
+logger = logging.getLogger("kitchen-ai")
+
+# (endpoint, title, language, diet) -> True if an answer had to be generated
+WarmHandler = Callable[[str, str, str, str], Awaitable[bool]]
+
+_WHITESPACE = re.compile(r"\s+")
+# Forward decay: a hit at time t adds 2 ** ((t - _EPOCH) / half_life), so sums
+# taken at different times compare directly and never need rewriting.
+_EPOCH = 1767225600.0  # 2026-01-01 UTC
+_LEASE_SECONDS = 120.0
+_MIN_PASS_INTERVAL = 6 * 60 * 60  # at most one pass per off-peak window
+_BUSY_PAUSE = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dish_popularity (
+    title     TEXT NOT NULL,
+    diet      TEXT NOT NULL,
+    score     REAL NOT NULL,
+    hits      INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (title, diet)
+);
+CREATE INDEX IF NOT EXISTS dish_popularity_score ON dish_popularity (score DESC);
+CREATE TABLE IF NOT EXISTS warmer_lease (
+    id      INTEGER PRIMARY KEY CHECK (id = 1),
+    holder  TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+def normalize_title(title: str) -> str:
+    return _WHITESPACE.sub(" ", title).strip().casefold()[:MAX_TITLE_LENGTH]
+
+
+def parse_window(spec: str) -> tuple[int, int] | None:
+    """``"2-6"`` -> (2, 6): from 02:00 up to 06:00; wraps past midnight (``"23-5"``)."""
+    spec = spec.strip()
+    if not spec:
+        return None
+    start, _, end = spec.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def in_window(window: tuple[int, int] | None, hour: int) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    if start == end:
+        return True
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+class PopularityStore:
+    """SQLite-backed dish counts and warmer lease.  Synchronous; run in threads."""
+
+    def __init__(self, path: str, *, half_life: float) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.half_life = half_life
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _weight(self, now: float) -> float:
+        return 2.0 ** ((now - _EPOCH) / self.half_life)
+
+    def flush(self, counts: Counter[tuple[str, str]], now: float) -> None:
+        weight = self._weight(now)
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO dish_popularity (title, diet, score, hits, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (title, diet) DO UPDATE SET score = score + excluded.score, "
+                "hits = hits + excluded.hits, last_seen = excluded.last_seen",
+                [(title, diet, count * weight, count, now) for (title, diet), count in counts.items()],
+            )
+
+    def top(self, n: int, min_count: float, now: float) -> list[tuple[str, str, float]]:
+        """The *n* highest-scoring dishes as ``(title, diet, decayed count)``."""
+        weight = self._weight(now)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT title, diet, score FROM dish_popularity WHERE score >= ? ORDER BY score DESC LIMIT ?",
+                (min_count * weight, n),
+            ).fetchall()
+        return [(title, diet, score / weight) for title, diet, score in rows]
+
+    def prune(self, keep: int) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM dish_popularity WHERE rowid NOT IN "
+                "(SELECT rowid FROM dish_popularity ORDER BY score DESC LIMIT ?)",
+                (keep,),
+            )
+        return cur.rowcount
+
+    def acquire_lease(self, holder: str, now: float, ttl: float) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO warmer_lease (id, holder, expires) VALUES (1, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET holder = excluded.holder, expires = excluded.expires "
+                "WHERE warmer_lease.expires < ? OR warmer_lease.holder = excluded.holder",
+                (holder, now + ttl, now),
+            )
+        return cur.rowcount > 0
+
+    def release_lease(self, holder: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM warmer_lease WHERE id = 1 AND holder = ?", (holder,))
+
+
+class CacheWarmer:
+    def __init__(
+        self,
+        path: str,
+        *,
+        record: bool,
+        enabled: bool,
+        window: tuple[int, int] | None,
+        endpoints: list[str],
+        languages: list[str],
+    ) -> None:
+        self.path = path
+        self.record_enabled = record
+        self.enabled = enabled
+        self.window = window
+        self.endpoints = endpoints
+        self.languages = languages
+        self.store: PopularityStore | None = None
+        self._counts: Counter[tuple[str, str]] = Counter()
+        self._handler: WarmHandler | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._holder = f"{os.getpid()}@{socket.gethostname()}"
+        self._tripped = False
+        self.passes = 0
+        self.generated = 0
+        self.fresh = 0
+        self.failed = 0
+        self.last_pass: float | None = None
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    async def start(self, handler: WarmHandler) -> None:
+        """Open the store and start the flush (and, if enabled, warming) loops."""
+        if not self.record_enabled:
+            return
+        self._handler = handler
+        try:
+            self.store = await asyncio.to_thread(PopularityStore, self.path, half_life=WARMER_HALF_LIFE)
+        except (OSError, sqlite3.Error) as exc:
+            logger.error("[warmer] popularity store %s unavailable — warmer disabled: %s", self.path, exc)
+            return
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+        if self.enabled:
+            self._tasks.append(asyncio.create_task(self._warm_loop()))
+            logger.info("[warmer] warming %s in window %s", ",".join(self.endpoints), WARMER_WINDOW or "always")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(self._flush)
+                await asyncio.to_thread(self.store.release_lease, self._holder)
+            except sqlite3.Error as exc:
+                logger.error("[warmer] final flush failed: %s", exc)
+            self.store.close()
+            self.store = None
+
+    # ── Recording (request path) ─────────────────────────────────────────
+
+    def record(self, title: str | None, diet: str | None = "none") -> None:
+        """Count one request for a dish.  In-memory only; flushed in the background."""
+        if self.store is None or not title:
+            return
+        key = (normalize_title(title), normalize_title(diet or "none"))
+        if key[0]:
+            self._counts[key] += 1
+
+    def _flush(self) -> None:
+        if self.store is None or not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        self.store.flush(counts, time.time())
+
+    async def _flush_loop(self) -> None:
+        flushes = 0
+        while True:
+            await asyncio.sleep(WARMER_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self._flush)
+                flushes += 1
+                if flushes % 60 == 0:
+                    await asyncio.to_thread(self._require_store().prune, WARMER_TRACKED_MAX)
+            except sqlite3.Error as exc:
+                logger.error("[warmer] flush failed: %s", exc)
+
+    # ── Warming ──────────────────────────────────────────────────────────
+
+    def _quiet(self) -> bool:
+        return admission.active <= WARMER_MAX_LIVE
+
+    async def _warm_loop(self) -> None:
+        while True:
+            await asyncio.sleep(_LEASE_SECONDS / 2)
+            if not in_window(self.window, datetime.now().hour):
+                continue
+            try:
+                if not await asyncio.to_thread(self._require_store().acquire_lease, self._holder, time.time(), _LEASE_SECONDS):
+                    continue
+                if self.last_pass is not None and time.time() - self.last_pass < _MIN_PASS_INTERVAL:
+                    continue
+                await self.run_pass(respect_window=True)
+            except sqlite3.Error as exc:
+                logger.error("[warmer] %s", exc)
+
+    async def run_pass(self, *, respect_window: bool = False) -> dict[str, int]:
+        """Warm the top dishes once; returns counts of generated / fresh / failed answers."""
+        assert self._handler is not None
+        store = self._require_store()
+        await asyncio.to_thread(self._flush)
+        dishes = await asyncio.to_thread(store.top, WARMER_TOP_N, WARMER_MIN_COUNT, time.time())
+        work: asyncio.Queue[tuple[str, str, str, str]] = asyncio.Queue()
+        for title, diet, _ in dishes:
+            for endpoint in self.endpoints:
+                # Images don't depend on the language.
+                for language in self.languages[:1] if endpoint == "image" else self.languages:
+                    work.put_nowait((endpoint, title, language, diet))
+
+        budget = {"left": WARMER_MAX_GENERATIONS, "stop": False}
+        totals = {"generated": 0, "fresh": 0, "failed": 0}
+        started = time.monotonic()
+        logger.info("[warmer] pass over %d dishes (%d answers), budget %d", len(dishes), work.qsize(), budget["left"])
+
+        async def worker() -> None:
+            while not budget["stop"] and budget["left"] > 0:
+                try:
+                    item = work.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                while not self._quiet():
+                    await asyncio.sleep(_BUSY_PAUSE)
+                if respect_window and not in_window(self.window, datetime.now().hour):
+                    budget["stop"] = True
+                    return
+                result = await self._warm_one(item)
+                totals[result] += 1
+                if result == "generated":
+                    budget["left"] -= 1
+                elif self._tripped:
+                    budget["stop"] = True  # out of quota / circuit open: try again next pass
+
+        self._tripped = False
+        lease = asyncio.create_task(self._keep_lease()) if respect_window else None
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, WARMER_CONCURRENCY))))
+        finally:
+            if lease is not None:
+                lease.cancel()
+        self.passes += 1
+        self.last_pass = time.time()
+        logger.info(
+            "[warmer] pass done in %.0fs: %d generated, %d already cached, %d failed",
+            time.monotonic() - started, totals["generated"], totals["fresh"], totals["failed"],
+        )
+        return totals
+
+    async def _warm_one(self, item: tuple[str, str, str, str]) -> str:
+        assert self._handler is not None
+        endpoint = item[0]
+        try:
+            with deadline_scope(IMAGE_JOB_DEADLINE):
+                generated = await self._handler(*item)
+        except UpstreamUnavailable as exc:
+            logger.warning("[warmer] %s %r stopped: %s", endpoint, item[1], exc)
+            self._tripped = True
+            result = "failed"
+        except Exception as exc:
+            logger.error("[warmer] %s %r failed: %s", endpoint, item[1], exc)
+            result = "failed"
+        else:
+            result = "generated" if generated else "fresh"
+        setattr(self, result, getattr(self, result) + 1)
+        WARMER_RESULTS.labels(endpoint, result).inc()
+        return result
+
+    async def _keep_lease(self) -> None:
+        while True:
+            await asyncio.sleep(_LEASE_SECONDS / 3)
+            await asyncio.to_thread(self._require_store().acquire_lease, self._holder, time.time(), _LEASE_SECONDS)
+
+    def _require_store(self) -> PopularityStore:
+        if self.store is None:
+            raise RuntimeError("cache warmer is not running")
+        return self.store
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "recording": self.store is not None,
+            "enabled": self.enabled,
+            "window": WARMER_WINDOW,
+            "pending": sum(self._counts.values()),
+            "passes": self.passes,
+            "generated": self.generated,
+            "fresh": self.fresh,
+            "failed": self.failed,
+            "lastPass": self.last_pass,
+        }
+
+
+warmer = CacheWarmer(
+    WARMER_DB,
+    record=WARMER_RECORD,
+    enabled=WARMER_ENABLED,
+    window=parse_window(WARMER_WINDOW),
+    endpoints=[e.strip() for e in WARMER_ENDPOINTS.split(",") if e.strip()],
+    languages=[lang.strip() for lang in WARMER_LANGUAGES.split(",") if lang.strip()],
+)
+
+
+async def _main() -> None:
+    from .routes import warm_dish
+    from .upstream import close_client, start_client
+
+    await start_client()
+    warmer._handler = warm_dish
+    warmer.store = await asyncio.to_thread(PopularityStore, warmer.path, half_life=WARMER_HALF_LIFE)
+    try:
+        await warmer.run_pass()
+    finally:
+        warmer.store.close()
+        await close_client()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    asyncio.run(_main())
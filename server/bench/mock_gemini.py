@@ -0,0 +1,226 @@
+"""Local stand-in for the Gemini / Imagen REST API, for load tests.
+
+Serves ``:generateContent``, ``:streamGenerateContent`` and ``:predict`` under
+``/v1beta/models/…`` so the backend can be pointed at it with
+``GEMINI_PROXY_URL=http://127.0.0.1:8090``.  Answers are canned but shaped
+like the real ones (recipe objects, recipe arrays, meal plans, drinks,
+ingredient lists, PNG images).
+
+    python -m bench.mock_gemini --port 8090 --text-latency lognormal:0.8,0.5 --rate-429 0.05
+
+``GET /__stats`` returns upstream call counts; ``POST /__reset`` clears them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import struct
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# ── Canned payloads ──────────────────────────────────────────────────────
+
+
+def solid_png(width: int = 64, height: int = 64, rgb: tuple[int, int, int] = (200, 120, 40)) -> bytes:
+    """A valid solid-colour PNG, built without Pillow."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    row = b"\x00" + bytes(rgb) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _recipe(title: str) -> dict[str, Any]:
+    return {
+        "title": title,
+        "description": "A quick weeknight dish with a crisp finish and a bright sauce.",
+        "prepTime": "30 min",
+        "difficulty": "Easy",
+        "nutrition": {"calories": 540, "protein": "32g", "fat": "18g", "carbs": "61g"},
+        "ingredientsList": ["2 tomatoes", "200 g pasta", "1 clove garlic", "olive oil", "salt"],
+        "instructions": [
+            "Boil the pasta in salted water until al dente.",
+            "Soften the garlic in olive oil, add the tomatoes and simmer.",
+            "Toss the pasta with the sauce and serve.",
+        ],
+    }
+
+
+_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def canned_text(body: dict[str, Any]) -> str:
+    """Pick an answer shaped for whichever endpoint built the request.
+
+    The ``responseSchema`` decides when present (it also covers repair
+    calls); otherwise the prompt wording does.
+    """
+    system = " ".join(p.get("text", "") for p in (body.get("systemInstruction") or {}).get("parts", []))
+    parts = [p for c in body.get("contents", []) for p in c.get("parts", [])]
+    user = " ".join(p.get("text", "") for p in parts)
+    schema = (body.get("generationConfig") or {}).get("responseSchema") or {}
+    item = schema.get("items", {}) if schema.get("type") == "array" else schema
+    props = item.get("properties", {})
+
+    if item.get("type") == "string" or (not schema and any("inlineData" in p for p in parts)):
+        answer: Any = ["tomato", "garlic", "pasta", "basil"]
+    elif "day" in props or (not schema and "meal plan" in system):
+        answer = [{"day": d, "breakfast": "Oatmeal", "lunch": "Salad", "dinner": "Pasta"} for d in _DAYS]
+    elif "alcohol" in props or (not schema and "drink" in system):
+        answer = {"alcohol": "Chianti", "nonAlcohol": "Sparkling water with lemon"}
+    elif schema.get("type") == "array" or (not schema and "3 distinct recipes" in system):
+        answer = [_recipe(f"Mock recipe {i}") for i in range(1, 4)]
+    else:
+        answer = _recipe(user.split(":", 1)[-1].strip()[:60] or "Mock recipe")
+    return json.dumps(answer, ensure_ascii=False)
+
+
+# ── Behaviour ────────────────────────────────────────────────────────────
+
+
+def parse_latency(spec: str) -> Any:
+    """``fixed:S`` | ``uniform:A,B`` | ``exp:MEAN`` | ``lognormal:MEDIAN,SIGMA`` (seconds)."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / values[0])
+    if kind == "lognormal":
+        import math
+
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+@dataclass
+class MockConfig:
+    text_latency: str = "lognormal:0.8,0.4"
+    image_latency: str = "lognormal:3.0,0.3"
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: float | None = None
+    rate_malformed: float = 0.0  # fraction of text answers cut short (invalid JSON)
+    stream_chunks: int = 8
+    gemini_image: bool = True  # False: the Gemini image model returns no image
+    calls: Counter = field(default_factory=Counter)
+
+
+def create_app(config: MockConfig) -> Starlette:
+    text_delay = parse_latency(config.text_latency)
+    image_delay = parse_latency(config.image_latency)
+    image_b64 = base64.b64encode(solid_png()).decode("ascii")
+
+    def injected_error() -> Response | None:
+        roll = random.random()
+        if roll < config.rate_429:
+            headers = {"Retry-After": f"{config.retry_after:g}"} if config.retry_after is not None else {}
+            return JSONResponse({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, 429, headers)
+        if roll < config.rate_429 + config.rate_5xx:
+            return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, 503)
+        return None
+
+    async def model_call(request: Request) -> Response:
+        model, _, method = request.path_params["target"].partition(":")
+        config.calls[f"{model}:{method}"] += 1
+        body = await request.json()
+        is_image = method == "predict" or "IMAGE" in (body.get("generationConfig") or {}).get(
+            "responseModalities", []
+        )
+        await asyncio.sleep(image_delay() if is_image else text_delay())
+        error = injected_error()
+        if error is not None:
+            config.calls["injectedErrors"] += 1
+            return error
+
+        if method == "predict":
+            return JSONResponse({"predictions": [{"bytesBase64Encoded": image_b64, "mimeType": "image/png"}]})
+        if is_image:
+            parts = [{"inlineData": {"mimeType": "image/png", "data": image_b64}}] if config.gemini_image else []
+            return JSONResponse({"candidates": [{"content": {"parts": parts or [{"text": "no image"}]}}]})
+        text = canned_text(body)
+        if random.random() < config.rate_malformed:
+            config.calls["malformed"] += 1
+            text = text[: len(text) // 2]
+        if method == "streamGenerateContent":
+            return StreamingResponse(_sse_chunks(text, config.stream_chunks), media_type="text/event-stream")
+        return JSONResponse({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse(dict(config.calls))
+
+    async def reset(request: Request) -> Response:
+        config.calls.clear()
+        return JSONResponse({"ok": True})
+
+    return Starlette(
+        routes=[
+            Route("/v1beta/models/{target}", model_call, methods=["POST"]),
+            Route("/__stats", stats),
+            Route("/__reset", reset, methods=["POST"]),
+        ]
+    )
+
+
+async def _sse_chunks(text: str, chunks: int) -> AsyncIterator[bytes]:
+    step = max(1, len(text) // chunks)
+    for i in range(0, len(text), step):
+        piece = {"candidates": [{"content": {"parts": [{"text": text[i : i + step]}]}}]}
+        yield f"data: {json.dumps(piece, ensure_ascii=False)}\n\n".encode("utf-8")
+        await asyncio.sleep(0.02)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--text-latency", default=MockConfig.text_latency)
+    parser.add_argument("--image-latency", default=MockConfig.image_latency)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of calls answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="fraction of calls answered 503")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds on 429")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="fraction of truncated text answers")
+    parser.add_argument("--no-gemini-image", action="store_true", help="force the Imagen fallback")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        text_latency=args.text_latency,
+        image_latency=args.image_latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        rate_malformed=args.rate_malformed,
+        gemini_image=not args.no_gemini_image,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
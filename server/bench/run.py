@@ -0,0 +1,411 @@
+"""Drive every ``/api/*`` route at a fixed concurrency and record the results.
+
+    python -m bench.run --spawn --concurrency 16 --requests 200
+    python -m bench.run --spawn --rate-429 0.05 --baseline bench/results/base.json
+
+With ``--spawn`` the mock upstream (``bench.mock_gemini``) and the API server
+are started as subprocesses on free ports; otherwise ``--base-url`` and
+``--mock-url`` point at already-running instances.  Per route the report
+holds RPS, latency / time-to-first-byte percentiles, status codes, server RSS
+growth and the upstream calls made.  Results are written as JSON; with
+``--baseline`` the run fails if a route's p95 or error rate regressed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+
+from .mock_gemini import add_arguments as add_mock_arguments
+from .mock_gemini import solid_png
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+# Server settings for spawned runs: no per-IP limits and a client-side
+# upstream quota far above what the mock can serve, so the numbers describe
+# the request path rather than the limiters.  Override with --server-env.
+SPAWN_ENV = {
+    "GEMINI_API_KEY": "bench",
+    "RATE_LIMIT_ENABLED": "0",
+    "UPSTREAM_RATE": "10000",
+    "UPSTREAM_BURST": "10000",
+    "UPSTREAM_GLOBAL_RATE": "0",
+}
+
+# ── Scenarios ────────────────────────────────────────────────────────────
+
+PNG_BYTES = solid_png(256, 256)
+PNG_B64 = base64.b64encode(PNG_BYTES).decode("ascii")
+INGREDIENTS = ["tomato", "garlic", "pasta", "basil", "olive oil", "parmesan", "lemon", "chili"]
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    build: Callable[[int], dict[str, Any]]  # request number -> httpx request kwargs
+
+
+def _title(i: int) -> str:
+    return f"Bench dish {i}"
+
+
+def _ingredients(i: int) -> list[str]:
+    return [*INGREDIENTS[: 3 + i % 5], f"spice {i}"]
+
+
+def scenarios() -> dict[str, Scenario]:
+    dish = lambda i: {"json": {"title": _title(i), "language": "en", "diet": "none"}}  # noqa: E731
+    return {
+        "health": Scenario("GET", "/api/health", lambda i: {}),
+        "vision": Scenario(
+            "POST", "/api/vision",
+            lambda i: {"json": {"imageBase64": PNG_B64, "mimeType": "image/png", "language": "en"}},
+        ),
+        "vision-upload": Scenario(
+            "POST", "/api/vision/upload",
+            lambda i: {"content": PNG_BYTES, "headers": {"Content-Type": "image/png"}},
+        ),
+        "recipe": Scenario("POST", "/api/recipe", lambda i: {"json": {"ingredients": _ingredients(i)}}),
+        "recipes": Scenario("POST", "/api/recipes", lambda i: {"json": {"ingredients": _ingredients(i)}}),
+        "recipes-stream": Scenario(
+            "POST", "/api/recipes/stream",
+            lambda i: {"json": {"ingredients": _ingredients(i)}, "headers": {"Accept": "text/event-stream"}},
+        ),
+        "recipe-detail": Scenario("POST", "/api/recipe-detail", dish),
+        "meal-plan": Scenario("POST", "/api/meal-plan", dish),
+        "meal-plan-stream": Scenario(
+            "POST", "/api/meal-plan/stream",
+            lambda i: {**dish(i), "headers": {"Accept": "application/x-ndjson"}},
+        ),
+        "drinks": Scenario("POST", "/api/drinks", dish),
+        "image": Scenario("POST", "/api/image", lambda i: {"json": {"recipeTitle": _title(i)}}),
+        "bundle": Scenario("POST", "/api/bundle", dish),
+        "bundle-stream": Scenario(
+            "POST", "/api/bundle/stream", lambda i: {**dish(i), "headers": {"Accept": "text/event-stream"}},
+        ),
+        "stored-image": Scenario("GET", "/api/images/{name}", lambda i: {}),
+    }
+
+
+# ── Measurement ──────────────────────────────────────────────────────────
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+    ms = lambda v: round(v * 1000, 2)  # noqa: E731
+    return {
+        "p50": ms(percentile(ordered, 50)),
+        "p95": ms(percentile(ordered, 95)),
+        "p99": ms(percentile(ordered, 99)),
+        "max": ms(ordered[-1]) if ordered else 0.0,
+        "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+    }
+
+
+def rss_kb(pid: int | None) -> int | None:
+    """Current resident set size of *pid* (Linux ``/proc``), or None."""
+    if pid is None:
+        return None
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def upstream_calls(client: httpx.AsyncClient, mock_url: str) -> Counter:
+    try:
+        return Counter((await client.get(f"{mock_url}/__stats")).json())
+    except httpx.HTTPError:
+        return Counter()
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    base_url: str,
+    scenario: Scenario,
+    *,
+    requests: int,
+    concurrency: int,
+    offset: int,
+    vary: bool,
+    headers: dict[str, str],
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    ttfbs: list[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for n in counter:
+            kwargs = scenario.build(offset + n if vary else offset)
+            kwargs["headers"] = {**headers, **kwargs.get("headers", {})}
+            started = time.perf_counter()
+            try:
+                async with client.stream(scenario.method, base_url + scenario.path, **kwargs) as response:
+                    first = None
+                    async for _ in response.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter()
+                    statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+                continue
+            finished = time.perf_counter()
+            latencies.append(finished - started)
+            ttfbs.append((first or finished) - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "requests": requests,
+        "errors": errors,
+        "errorRate": round(errors / requests, 4) if requests else 0.0,
+        "statusCodes": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latencyMs": summarize(latencies),
+        "ttfbMs": summarize(ttfbs),
+    }
+
+
+async def stored_image_name(client: httpx.AsyncClient, base_url: str, headers: dict[str, str]) -> str | None:
+    response = await client.post(f"{base_url}/api/image", json={"recipeTitle": "Bench stored image"}, headers=headers)
+    url = (response.json() or {}).get("imageUrl") if response.status_code == 200 else None
+    return url.rsplit("/", 1)[1] if url else None
+
+
+async def benchmark(args: argparse.Namespace, base_url: str, mock_url: str, server_pid: int | None) -> dict[str, Any]:
+    headers = {} if args.use_cache else {"X-Cache-Bypass": "1"}
+    selected = scenarios()
+    if args.routes:
+        selected = {name: selected[name] for name in args.routes.split(",")}
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    report: dict[str, Any] = {}
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        rss_start = rss_kb(server_pid)
+        for offset, (name, scenario) in enumerate(selected.items()):
+            if name == "stored-image":
+                image_name = await stored_image_name(client, base_url, headers)
+                if image_name is None:
+                    print(f"  {name:<18} skipped (no image generated)")
+                    continue
+                scenario = Scenario("GET", scenario.path.format(name=image_name), scenario.build)
+
+            calls_before = await upstream_calls(client, mock_url)
+            rss_before = rss_kb(server_pid)
+            result = await run_scenario(
+                client,
+                base_url,
+                scenario,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                offset=offset * 1_000_000,
+                vary=not args.same_payload,
+                headers=headers,
+            )
+            calls = await upstream_calls(client, mock_url)
+            calls.subtract(calls_before)
+            result["upstreamCalls"] = {key: count for key, count in calls.items() if count}
+            rss_after = rss_kb(server_pid)
+            result["rssDeltaKb"] = rss_after - rss_before if rss_after and rss_before else None
+            report[name] = result
+            latency = result["latencyMs"]
+            model_calls = sum(count for key, count in calls.items() if ":" in key)
+            print(
+                f"  {name:<18} {result['rps']:>8.1f} rps  p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  "
+                f"p99 {latency['p99']:>8.1f} ms  errors {result['errors']:>4}  upstream {model_calls:>5}"
+            )
+        rss_end = rss_kb(server_pid)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "concurrency": args.concurrency,
+            "requestsPerRoute": args.requests,
+            "varyPayload": not args.same_payload,
+            "useCache": args.use_cache,
+            "spawned": args.spawn,
+            "serverEnv": _server_env(args) if args.spawn else None,
+            "mock": {
+                "textLatency": args.text_latency,
+                "imageLatency": args.image_latency,
+                "rate429": args.rate_429,
+                "rate5xx": args.rate_5xx,
+                "rateMalformed": args.rate_malformed,
+            },
+            "rssStartKb": rss_start,
+            "rssEndKb": rss_end,
+        },
+        "routes": report,
+    }
+
+
+# ── Baseline comparison ──────────────────────────────────────────────────
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Routes whose p95 grew by more than *tolerance* or whose error rate rose."""
+    regressions = []
+    for name, result in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        p95, base_p95 = result["latencyMs"]["p95"], before["latencyMs"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base_p95:.1f} -> {p95:.1f} ms")
+        if result["errorRate"] > before["errorRate"] + 0.01:
+            regressions.append(f"{name}: error rate {before['errorRate']:.2%} -> {result['errorRate']:.2%}")
+    return regressions
+
+
+# ── Process management ───────────────────────────────────────────────────
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_env(args: argparse.Namespace) -> dict[str, str]:
+    env = dict(SPAWN_ENV)
+    env.update(item.split("=", 1) for item in args.server_env)
+    return env
+
+
+async def _wait_ready(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def _spawn(args: argparse.Namespace) -> tuple[list[subprocess.Popen], str, str]:
+    mock_port, server_port = _free_port(), _free_port()
+    mock_cmd = [
+        sys.executable, "-m", "bench.mock_gemini", "--port", str(mock_port),
+        "--text-latency", args.text_latency, "--image-latency", args.image_latency,
+        "--rate-429", str(args.rate_429), "--rate-5xx", str(args.rate_5xx),
+        "--rate-malformed", str(args.rate_malformed),
+    ]
+    if args.retry_after is not None:
+        mock_cmd += ["--retry-after", str(args.retry_after)]
+    if args.no_gemini_image:
+        mock_cmd.append("--no-gemini-image")
+
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    env = {
+        **os.environ,
+        **_server_env(args),
+        "GEMINI_PROXY_URL": mock_url,
+        "IMAGE_STORE_DIR": tempfile.mkdtemp(prefix="kitchen-ai-bench-"),
+    }
+    server_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(server_port), "--log-level", "warning",
+    ]
+    quiet = {"stdout": subprocess.DEVNULL} if not args.verbose else {}
+    procs = [
+        subprocess.Popen(mock_cmd, cwd=SERVER_DIR, **quiet),
+        subprocess.Popen(server_cmd, cwd=SERVER_DIR, env=env, **quiet),
+    ]
+    return procs, f"http://127.0.0.1:{server_port}", mock_url
+
+
+# ── CLI ──────────────────────────────────────────────────────────────────
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spawn", action="store_true", help="start the mock and the API server locally")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5050")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:8090")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID for RSS sampling (without --spawn)")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--routes", default="", help=f"comma-separated subset of: {', '.join(scenarios())}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--same-payload", action="store_true", help="repeat one payload (exercises coalescing)")
+    parser.add_argument("--use-cache", action="store_true", help="do not send X-Cache-Bypass")
+    parser.add_argument("--output", default="", help="result file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default="", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth vs baseline")
+    parser.add_argument("--verbose", action="store_true")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    procs: list[subprocess.Popen] = []
+    base_url, mock_url, server_pid = args.base_url, args.mock_url, args.server_pid
+    try:
+        if args.spawn:
+            procs, base_url, mock_url = _spawn(args)
+            server_pid = procs[1].pid
+            asyncio.run(_wait_ready(f"{mock_url}/__stats"))
+            asyncio.run(_wait_ready(f"{base_url}/api/health"))
+        print(f"Benchmarking {base_url} (upstream mock {mock_url})")
+        result = asyncio.run(benchmark(args, base_url, mock_url, server_pid))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    output = Path(args.output or SERVER_DIR / "bench" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
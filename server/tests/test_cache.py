@@ -0,0 +1,168 @@
+"""Response cache (app/cache.py): tiers, eviction and precompressed copies."""
+
+import asyncio
+
+from app.cache import FakeRedis, MemoryTier, ResponseCache, SharedTier, cache_key, encoded_key
+from app.compression import compress
+from app.models import RecipesRequest
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _settle(cache: ResponseCache) -> None:
+    while cache._precompressing:
+        await asyncio.gather(*cache._precompressing.values())
+
+
+class _BrokenRedis(FakeRedis):
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+# ── Keys ─────────────────────────────────────────────────────────────────
+
+def test_key_ignores_ingredient_order_case_and_duplicates():
+    a = RecipesRequest(ingredients=["Chicken", "rice ", "onion"])
+    b = RecipesRequest(ingredients=["onion", "chicken", "Rice", "rice"])
+    assert cache_key("recipes", a) == cache_key("recipes", b)
+
+
+def test_key_depends_on_endpoint_and_other_fields():
+    body = RecipesRequest(ingredients=["chicken"])
+    assert cache_key("recipes", body) != cache_key("recipe", body)
+    assert cache_key("recipes", body) != cache_key("recipes", RecipesRequest(ingredients=["chicken"], diet="vegan"))
+
+
+# ── Memory tier ──────────────────────────────────────────────────────────
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_entries=2, max_bytes=1 << 20)
+    tier.set("a", b"1", 60)
+    tier.set("b", b"2", 60)
+    assert tier.get("a") == b"1"  # "b" is now the oldest
+    tier.set("c", b"3", 60)
+    assert tier.get("b") is None
+    assert tier.get("a") == b"1" and tier.get("c") == b"3"
+    assert tier.evictions == 1
+
+
+def test_memory_tier_keeps_to_its_byte_budget():
+    tier = MemoryTier(max_entries=100, max_bytes=10)
+    tier.set("a", b"x" * 6, 60)
+    tier.set("b", b"y" * 6, 60)
+    assert tier.get("a") is None
+    assert tier.bytes == 6
+    tier.set("huge", b"z" * 11, 60)  # larger than the whole budget: not stored
+    assert tier.get("huge") is None and tier.get("b") == b"y" * 6
+
+
+def test_memory_tier_expires_entries():
+    tier = MemoryTier(max_entries=10, max_bytes=1 << 20)
+    tier.set("a", b"1", -1)
+    assert tier.get("a") is None
+    assert len(tier) == 0 and tier.bytes == 0
+
+
+# ── Facade ───────────────────────────────────────────────────────────────
+
+def test_hits_and_misses_are_counted_per_lookup():
+    async def scenario():
+        cache = ResponseCache()
+        assert await cache.get("kai:v2:recipes:a") is None
+        await cache.set("kai:v2:recipes:a", b"[]")
+        assert await cache.get("kai:v2:recipes:a") == b"[]"
+        assert await cache.get("kai:v2:recipes:a", count=False) == b"[]"
+        return cache
+
+    cache = _run(scenario())
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_shared_hit_is_copied_into_the_local_tier():
+    async def scenario():
+        shared = SharedTier(FakeRedis())
+        writer = ResponseCache(shared=shared)
+        reader = ResponseCache(shared=shared)  # another worker: empty local tier
+        await writer.set("kai:v2:recipes:a", b"[1]")
+        value = await reader.get("kai:v2:recipes:a")
+        return reader, value
+
+    reader, value = _run(scenario())
+    assert value == b"[1]"
+    assert reader.shared_hits == 1
+    assert reader.local.get("kai:v2:recipes:a") == b"[1]"
+
+
+def test_shared_tier_errors_are_misses():
+    async def scenario():
+        cache = ResponseCache(shared=SharedTier(_BrokenRedis()))
+        await cache.set("kai:v2:recipes:a", b"[1]")
+        cache.local = MemoryTier(max_entries=10, max_bytes=1 << 20)
+        return cache, await cache.get("kai:v2:recipes:a")
+
+    cache, value = _run(scenario())
+    assert value is None
+    assert cache.shared.errors == 2
+
+
+def test_disabled_cache_stores_nothing():
+    async def scenario():
+        cache = ResponseCache(enabled=False)
+        await cache.set("kai:v2:recipes:a", b"[1]")
+        return await cache.get("kai:v2:recipes:a")
+
+    assert _run(scenario()) is None
+
+
+# ── Precompressed copies ─────────────────────────────────────────────────
+
+
+def test_miss_is_compressed_fast_then_best_copy_is_stored():
+    async def scenario():
+        cache = ResponseCache()
+        value = b'{"title": "' + b"borscht " * 4000 + b'"}'
+        first = await cache.encoded(value, "gzip")
+        await _settle(cache)
+        second = await cache.encoded(value, "gzip")
+        await cache.close()
+        return value, first, second, cache
+
+    value, first, second, cache = _run(scenario())
+    assert first == compress(value, "gzip")
+    assert second == compress(value, "gzip", best=True)
+    assert cache.encoded_stored == 1
+
+
+def test_encoded_copies_do_not_evict_answers():
+    async def scenario():
+        cache = ResponseCache(local=MemoryTier(max_entries=2, max_bytes=1 << 20))
+        await cache.set("kai:v2:recipes:a", b"a" * 2000)
+        await cache.set("kai:v2:recipes:b", b"b" * 2000)
+        for i in range(10):
+            await cache.encoded(bytes([i]) * 2000, "gzip")
+        await _settle(cache)
+        answers = [await cache.get(k) for k in ("kai:v2:recipes:a", "kai:v2:recipes:b")]
+        await cache.close()
+        return cache, answers
+
+    cache, answers = _run(scenario())
+    assert all(answers)
+    assert cache.local.evictions == 0
+    assert len(cache.encoded_local) == 10
+
+
+def test_disabled_cache_compresses_without_storing():
+    async def scenario():
+        cache = ResponseCache(enabled=False)
+        encoded = await cache.encoded(b"x" * 2000, "gzip")
+        return cache, encoded
+
+    cache, encoded = _run(scenario())
+    assert encoded == compress(b"x" * 2000, "gzip")
+    assert not cache._precompressing
+    assert cache.encoded_local.get(encoded_key("gzip", b"x" * 2000)) is None
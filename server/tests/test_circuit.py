@@ -0,0 +1,130 @@
+"""Per-model token bucket and circuit breaker (app/circuit.py)."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.circuit import CLOSED, HALF_OPEN, OPEN, ModelGuard, UpstreamUnavailable, backoff_delay, parse_retry_after
+from app.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    UPSTREAM_MAX_QUEUE_WAIT,
+    UPSTREAM_MIN_RATE,
+    UPSTREAM_RATE,
+)
+
+
+def _acquire(guard: ModelGuard) -> None:
+    asyncio.run(guard.acquire())
+
+
+def _trip(guard: ModelGuard, retry_after: float | None = None) -> None:
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        guard.on_failure(retry_after)
+
+
+def _cooldown_over(guard: ModelGuard) -> None:
+    guard.opened_until = time.monotonic() - 0.01
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # in the past
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_never_shorter_than_retry_after():
+    assert all(backoff_delay(attempt, 7.5) >= 7.5 for attempt in range(1, 6))
+
+
+def test_circuit_opens_after_threshold_failures():
+    guard = ModelGuard("m")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        guard.on_failure()
+    assert guard.state == CLOSED
+    guard.on_failure()
+    assert guard.state == OPEN
+    with pytest.raises(UpstreamUnavailable) as info:
+        _acquire(guard)
+    assert info.value.retry_after == pytest.approx(CIRCUIT_OPEN_SECONDS, abs=1)
+
+
+def test_success_resets_the_failure_count():
+    guard = ModelGuard("m")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        guard.on_failure()
+    guard.on_success()
+    guard.on_failure()
+    assert guard.state == CLOSED
+
+
+def test_retry_after_pauses_without_opening_the_circuit():
+    guard = ModelGuard("m")
+    guard.on_throttle(UPSTREAM_MAX_QUEUE_WAIT + 10)
+    assert guard.state == CLOSED
+    with pytest.raises(UpstreamUnavailable) as info:
+        _acquire(guard)  # the pause is longer than callers may queue
+    assert info.value.retry_after > UPSTREAM_MAX_QUEUE_WAIT
+
+
+def test_open_cooldown_follows_retry_after():
+    guard = ModelGuard("m")
+    _trip(guard, retry_after=120)
+    assert guard.state == OPEN
+    assert guard.opened_until - time.monotonic() == pytest.approx(120, abs=1)
+
+
+def test_half_open_allows_a_single_probe():
+    guard = ModelGuard("m")
+    _trip(guard)
+    _cooldown_over(guard)
+    _acquire(guard)  # the probe
+    assert guard.state == HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        _acquire(guard)
+    guard.on_success()
+    assert guard.state == CLOSED
+    _acquire(guard)
+
+
+def test_failed_probe_reopens_the_circuit():
+    guard = ModelGuard("m")
+    _trip(guard)
+    _cooldown_over(guard)
+    _acquire(guard)
+    guard.on_failure()
+    assert guard.state == OPEN
+
+
+def test_released_probe_lets_another_caller_probe():
+    guard = ModelGuard("m")
+    _trip(guard)
+    _cooldown_over(guard)
+    _acquire(guard)
+    guard.release()
+    _acquire(guard)
+    assert guard.state == HALF_OPEN
+
+
+def test_throttles_halve_the_rate_down_to_the_floor():
+    guard = ModelGuard("m")
+    guard.on_throttle(None)
+    assert guard.rate == pytest.approx(UPSTREAM_RATE / 2)
+    for _ in range(50):
+        guard.on_throttle(None)
+    assert guard.rate == UPSTREAM_MIN_RATE
+    guard.on_success()
+    assert guard.rate > UPSTREAM_MIN_RATE
+
+
+def test_caller_is_refused_when_the_next_token_is_too_far_out():
+    guard = ModelGuard("m")
+    guard.tokens = 0.0
+    guard.updated = time.monotonic()
+    guard.rate = 1.0 / (UPSTREAM_MAX_QUEUE_WAIT + 1)  # next token is further out than callers may wait
+    with pytest.raises(UpstreamUnavailable):
+        _acquire(guard)
+    assert guard.tokens == pytest.approx(0.0, abs=0.01)  # nothing was reserved
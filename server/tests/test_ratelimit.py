@@ -0,0 +1,116 @@
+"""Global upstream budget (GCRA) and client addresses (app/ratelimit.py)."""
+
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.circuit import UpstreamUnavailable
+from app.ratelimit import MemoryGcra, UpstreamBudget, client_ip
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _request(peer: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+class _FixedWaitStore:
+    """Answers every reservation with a fixed wait."""
+
+    def __init__(self, wait: float) -> None:
+        self.wait = wait
+
+    async def reserve(self, key, interval, burst, max_wait):
+        return self.wait
+
+    async def close(self) -> None:
+        pass
+
+
+class _BrokenStore(_FixedWaitStore):
+    async def reserve(self, key, interval, burst, max_wait):
+        raise ConnectionError("redis down")
+
+
+# ── GCRA ─────────────────────────────────────────────────────────────────
+
+def test_gcra_allows_the_burst_then_spaces_calls():
+    async def scenario():
+        gcra = MemoryGcra()
+        return [await gcra.reserve("k", 1.0, 3, 10.0) for _ in range(5)]
+
+    waits = _run(scenario())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(1.0, abs=0.05)
+    assert waits[4] == pytest.approx(2.0, abs=0.05)
+
+
+def test_gcra_rejects_without_reserving_past_max_wait():
+    async def scenario():
+        gcra = MemoryGcra()
+        await gcra.reserve("k", 1.0, 1, 0.5)
+        rejected = await gcra.reserve("k", 1.0, 1, 0.5)
+        accepted = await gcra.reserve("k", 1.0, 1, 5.0)
+        return rejected, accepted
+
+    rejected, accepted = _run(scenario())
+    assert rejected == pytest.approx(-1.0, abs=0.05)
+    assert accepted == pytest.approx(1.0, abs=0.05)  # the rejected call took no slot
+
+
+def test_gcra_keys_are_independent():
+    async def scenario():
+        gcra = MemoryGcra()
+        await gcra.reserve("a", 1.0, 1, 10.0)
+        return await gcra.reserve("b", 1.0, 1, 10.0)
+
+    assert _run(scenario()) == 0.0
+
+
+# ── Upstream budget ──────────────────────────────────────────────────────
+
+def test_budget_rejects_when_the_store_says_so():
+    budget = UpstreamBudget(_FixedWaitStore(-3.0), rate=10, burst=1)
+    with pytest.raises(UpstreamUnavailable) as info:
+        _run(budget.acquire())
+    assert info.value.retry_after == 3.0
+    assert budget.rejected == 1
+
+
+def test_budget_waits_for_its_slot():
+    budget = UpstreamBudget(_FixedWaitStore(0.01), rate=10, burst=1)
+    _run(budget.acquire())
+    assert budget.delayed == 1
+
+
+def test_budget_store_outage_lets_calls_through():
+    budget = UpstreamBudget(_BrokenStore(0.0), rate=10, burst=1)
+    _run(budget.acquire())
+    assert budget.errors == 1
+
+
+def test_zero_rate_disables_the_budget():
+    budget = UpstreamBudget(_BrokenStore(0.0), rate=0, burst=1)
+    _run(budget.acquire())
+    assert budget.errors == 0
+
+
+# ── Client address ───────────────────────────────────────────────────────
+
+def test_untrusted_peer_is_the_client():
+    assert client_ip(_request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_forwarded_for_is_read_up_to_the_first_untrusted_hop():
+    # "198.51.100.1" was written by the client and cannot be trusted.
+    request = _request("10.0.0.2", "198.51.100.1, 203.0.113.7, 10.0.0.5")
+    assert client_ip(request) == "203.0.113.7"
+
+
+def test_all_trusted_hops_fall_back_to_the_first():
+    assert client_ip(_request("10.0.0.2", "192.168.1.10, 10.0.0.5")) == "192.168.1.10"
+    assert client_ip(_request("127.0.0.1")) == "127.0.0.1"
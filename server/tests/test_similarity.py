@@ -0,0 +1,84 @@
+"""Near-duplicate matching (app/similarity.py): what may and may not share an answer."""
+
+import pytest
+
+from app.cache import cache_key
+from app.models import RecipeDetailRequest, RecipesRequest
+from app.similarity import SimilarityIndex, same_title, shingles, title_words
+
+
+def _index(endpoint: str, body) -> SimilarityIndex:
+    index = SimilarityIndex(max_entries=100)
+    index.add(endpoint, body, cache_key(endpoint, body))
+    return index
+
+
+def _title_hit(cached: str, asked: str) -> bool:
+    index = _index("recipe-detail", RecipeDetailRequest(title=cached))
+    return index.find("recipe-detail", RecipeDetailRequest(title=asked)) is not None
+
+
+def _ingredients_hit(cached: list[str], asked: list[str]) -> bool:
+    index = _index("recipes", RecipesRequest(ingredients=cached))
+    return index.find("recipes", RecipesRequest(ingredients=asked)) is not None
+
+
+@pytest.mark.parametrize(
+    "cached, asked",
+    [
+        ("Borscht", "borsch"),
+        ("Spaghetti Bolognese", "spaghetti bolognese!"),
+        ("Chicken curry", "Curry, chicken"),
+    ],
+)
+def test_same_title_hits(cached, asked):
+    assert _title_hit(cached, asked)
+
+
+@pytest.mark.parametrize(
+    "cached, asked",
+    [
+        ("Dish 1", "Dish 2"),
+        ("Chocolate cake", "Chocolate cupcake"),
+        ("Apple pie", "Apple"),
+        ("Pasta carbonara", "Carbonara"),
+        ("Beef stew", "Beet stew"),
+    ],
+)
+def test_different_dishes_miss(cached, asked):
+    assert not _title_hit(cached, asked)
+
+
+def test_digits_are_kept_in_titles():
+    assert title_words("Dish 1") != title_words("Dish 2")
+    assert not same_title(title_words("Dish 1"), title_words("Dish 2"))
+
+
+def test_reworded_ingredients_hit():
+    assert _ingredients_hit(["chicken", "rice", "onion"], ["Onions", "chicken breast", "rice"])
+
+
+def test_quantities_are_ignored_in_ingredients():
+    assert shingles(["200 g chicken", "2 onions"]) == shingles(["chicken", "onion"])
+
+
+def test_cached_answer_never_adds_an_ingredient():
+    # chicken/rice/onion must not be answered with a recipe asked for with peanuts.
+    assert not _ingredients_hit(["chicken", "rice", "onion", "peanuts"], ["chicken", "rice", "onion"])
+
+
+def test_cached_answer_may_leave_an_ingredient_out():
+    assert _ingredients_hit(["chicken", "rice", "onion"], ["chicken", "rice", "onion", "peanuts"])
+
+
+def test_other_fields_must_match():
+    index = _index("recipes", RecipesRequest(ingredients=["chicken", "rice"], language="en"))
+    assert index.find("recipes", RecipesRequest(ingredients=["chicken", "rice"], language="ru")) is None
+
+
+def test_discard_forgets_the_entry():
+    body = RecipeDetailRequest(title="Borscht")
+    index = _index("recipe-detail", body)
+    index.discard(cache_key("recipe-detail", body))
+    assert len(index) == 0
+    assert index.find("recipe-detail", RecipeDetailRequest(title="borsch")) is None
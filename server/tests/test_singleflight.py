@@ -0,0 +1,126 @@
+"""Single-flight coalescing (app/singleflight.py)."""
+
+import asyncio
+
+import pytest
+
+from app.deadline import DeadlineExceeded, deadline_scope
+from app.singleflight import SingleFlight, flight_key
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_flight_key_is_canonical():
+    assert flight_key("url", {"a": 1, "b": 2}) == flight_key("url", {"b": 2, "a": 1})
+    assert flight_key("url", {"a": 1}) != flight_key("url", {"a": 2})
+
+
+def test_concurrent_callers_share_one_call():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        return flight, results
+
+    flight, results = _run(scenario())
+    assert calls == 1
+    assert results == [1] * 5
+    assert (flight.leaders, flight.collapsed) == (1, 4)
+    assert flight.stats()["inFlight"] == 0
+
+
+def test_finished_call_is_not_reused():
+    async def scenario():
+        flight = SingleFlight("test")
+        first = await flight.do("k", lambda: asyncio.sleep(0, "first"))
+        second = await flight.do("k", lambda: asyncio.sleep(0, "second"))
+        return first, second
+
+    assert _run(scenario()) == ("first", "second")
+
+
+def test_exception_reaches_every_waiter():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        flight = SingleFlight("test")
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = _run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_one_cancelled_waiter_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("k", work))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert _run(scenario()) == "done"
+
+
+def test_work_is_cancelled_when_every_waiter_is_gone():
+    async def scenario():
+        flight = SingleFlight("test")
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight
+
+    assert _run(scenario()).stats()["inFlight"] == 0
+
+
+def test_follower_gives_up_at_its_own_deadline():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.1)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+
+        async def follower():
+            with deadline_scope(0.01):
+                return await flight.do("k", work)
+
+        with pytest.raises(DeadlineExceeded):
+            await follower()
+        return await leader
+
+    assert _run(scenario()) == "done"
@@ -91,6 +91,8 @@ export const fetchImage = async (prompt: string): Promise<string | null> => {
       signal: controller.signal,
     });
     const data = await res.json().catch(() => ({}));
+    const imageUrl = data?.imageUrl;
+    if (typeof imageUrl === 'string' && imageUrl.startsWith('/api/images/')) return apiUrl(imageUrl);
     const imageBase64 = data?.imageBase64;
     if (typeof imageBase64 === 'string' && imageBase64.startsWith('data:image/')) return imageBase64;
   } catch {